@@ -0,0 +1,68 @@
+"""
+帧编解码基准：典型 PushOicqMsg（入站解码）与 SendOicqMsg（出站编码）负载在各可用后端上的耗时
+
+    python benchmarks/bench_codec.py [--number 50000]
+"""
+import argparse
+import json
+import timeit
+
+from secplugin.codec import JsonCodec, MsgspecCodec, OrjsonCodec, msgspec, orjson
+
+PUSH_OICQ_MSG = {
+    "cmd": "PushOicqMsg",
+    "seq": 0,
+    "data": [
+        {"Account": "3889001234"},
+        {"Group": "Group", "GroupId": "123456789", "GroupName": "测试群"},
+        {"Uin": "1493813167", "UinName": "某群友", "UinNick": "昵称"},
+        {"MsgId": "7281930012", "Time": "1760000000"},
+        {"Reply": "7281930001"},
+        {"AtUin": "3889001234", "AtName": "@机器人"},
+        {"Text": " 天气 北京"},
+        {"Img": "https://example.com/a.png", "Url": "https://example.com/a.png", "Width": "640", "Height": "480"},
+    ],
+}
+
+SEND_OICQ_MSG = {
+    "cmd": "SendOicqMsg",
+    "rsp": True,
+    "seq": 1024,
+    "data": [
+        {"Account": "3889001234", "Group": "Group", "GroupId": "123456789", "Reply": "7281930012"},
+        {"Text": "北京 今天 晴 12~24℃ 东北风 3 级，空气质量 良。"},
+    ],
+}
+
+
+def codecs() -> list[JsonCodec]:
+    result = [JsonCodec()]
+    if orjson is not None:
+        result.append(OrjsonCodec())
+    if msgspec is not None:
+        result.append(MsgspecCodec())
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=50000)
+    args = parser.parse_args()
+    n = args.number
+
+    # 基线：改造前 Plugin 的写法（str 进出，ensure_ascii 默认开启）
+    push_text = json.dumps(PUSH_OICQ_MSG)
+    baseline_decode = min(timeit.repeat(lambda: json.loads(push_text), number=n, repeat=3)) / n
+    baseline_encode = min(timeit.repeat(lambda: json.dumps(SEND_OICQ_MSG), number=n, repeat=3)) / n
+    print(f"{'codec':>10} {'decode Push us':>15} {'encode Send us':>15} {'Push bytes':>11}")
+    print(f"{'baseline':>10} {baseline_decode * 1e6:>15.2f} {baseline_encode * 1e6:>15.2f} {len(push_text.encode()):>11}")
+    for codec in codecs():
+        push_bytes = codec.dumps(PUSH_OICQ_MSG)
+        assert codec.loads(push_bytes) == PUSH_OICQ_MSG
+        decode = min(timeit.repeat(lambda: codec.loads(push_bytes), number=n, repeat=3)) / n
+        encode = min(timeit.repeat(lambda: codec.dumps(SEND_OICQ_MSG), number=n, repeat=3)) / n
+        print(f"{codec.name:>10} {decode * 1e6:>15.2f} {encode * 1e6:>15.2f} {len(push_bytes):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+on_msg 分发开销基准：逐条 fullmatch 与 RegexDispatcher 索引的每条消息耗时随处理器数量的变化
+
+    python benchmarks/bench_dispatch.py [--messages 20000]
+"""
+import argparse
+import random
+import re
+import time
+
+from secplugin.dispatcher import HandlerEntry, RegexDispatcher
+
+
+def _handler(messenger, matches):
+    pass
+
+
+def build_patterns(n: int) -> list[str]:
+    patterns = []
+    for i in range(n):
+        kind = i % 10
+        if kind < 5:
+            patterns.append(f"命令{i}")  # 完整字面量
+        elif kind < 7:
+            patterns.append(f"查询{i} (.+)")  # 字面量前缀
+        elif kind < 9:
+            patterns.append(f"(?:签到{i}|打卡{i})")  # 字面量分支
+        else:
+            patterns.append(f"(.+)是什么{i}")  # 无法索引
+    return patterns
+
+
+def build_messages(n_handlers: int, count: int) -> list[str]:
+    rng = random.Random(0)
+    chat = ["哈哈哈", "今天吃什么", "好的", "收到", "有人吗", "早上好啊各位", "0"]
+    messages = []
+    for _ in range(count):
+        # 大部分消息不命中任何处理器
+        if rng.random() < 0.9:
+            messages.append(rng.choice(chat))
+        else:
+            i = rng.randrange(n_handlers)
+            messages.append(rng.choice([f"命令{i}", f"查询{i} 北京", f"签到{i}", f"这个是什么{i}"]))
+    return messages
+
+
+def bench(n_handlers: int, count: int) -> tuple[float, float]:
+    compiled = [re.compile(p) for p in build_patterns(n_handlers)]
+    linear = [(p, HandlerEntry(_handler, 2)) for p in compiled]
+    dispatcher = RegexDispatcher()
+    for p in compiled:
+        dispatcher.add(p, HandlerEntry(_handler, 2))
+    messages = build_messages(n_handlers, count)
+
+    for text in messages[:200]:
+        expected = [p.pattern for p, _ in linear if re.fullmatch(p, text)]
+        got = [p.pattern for p in compiled if any(m.re is p for _, m in dispatcher.match(text))]
+        assert expected == got, (text, expected, got)
+
+    start = time.perf_counter()
+    for text in messages:
+        for pattern, entry in linear:
+            re.fullmatch(pattern, text)
+    linear_cost = (time.perf_counter() - start) / count
+
+    start = time.perf_counter()
+    for text in messages:
+        dispatcher.match(text)
+    indexed_cost = (time.perf_counter() - start) / count
+    return linear_cost, indexed_cost
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+    print(f"{'handlers':>8} {'linear us/msg':>14} {'indexed us/msg':>15} {'speedup':>8}")
+    for n in (10, 50, 100, 300, 1000):
+        linear_cost, indexed_cost = bench(n, args.messages)
+        print(f"{n:>8} {linear_cost * 1e6:>14.2f} {indexed_cost * 1e6:>15.2f} {linear_cost / indexed_cost:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+分片模式端到端吞吐基准：本地 websocket 替身推送 PushOicqMsg，CPU 密集的处理器计算后回复，统计全部回复送达的耗时
+
+    python benchmarks/bench_shard.py [--messages 2000] [--groups 64] [--work 20000] [--shards 0 1 2 4]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import websockets
+
+from secplugin import Plugin
+
+
+def cpu_work(n: int) -> int:
+    total = 0
+    for i in range(n):
+        total += i * i % 7
+    return total
+
+
+class MockServer:
+    """
+    替身服务端：对接成功后一次性推送 messages 条消息，收到同样数量的 SendOicqMsg 后记录耗时并停止插件
+    """
+    def __init__(self, messages: int, groups: int) -> None:
+        self.messages = messages
+        self.groups = groups
+        self.replies = 0
+        self.started = 0.0
+        self.elapsed = 0.0
+        self.port = 0
+        self.on_done = None
+        self._ready = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        self._ready.wait()
+
+    async def _serve(self) -> None:
+        async with websockets.serve(self._handler, "127.0.0.1", 0) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await asyncio.Future()
+
+    async def _push(self, ws) -> None:
+        self.started = time.perf_counter()
+        for i in range(self.messages):
+            await ws.send(json.dumps({"cmd": "PushOicqMsg", "seq": 0, "data": [
+                {"Account": "10000"},
+                {"Group": "Group", "GroupId": str(100000 + i % self.groups)},
+                {"Uin": "20000", "MsgId": str(i)},
+                {"Text": f"work {i}"},
+            ]}))
+
+    async def _handler(self, ws) -> None:
+        async for raw in ws:
+            msg = json.loads(raw)
+            if msg["cmd"] == "SyncOicq":
+                await ws.send(json.dumps({"cmd": "Response", "seq": msg["seq"], "data": {"status": True}}))
+                asyncio.create_task(self._push(ws))
+                continue
+            if msg.get("rsp"):
+                await ws.send(json.dumps({"cmd": "Response", "seq": msg["seq"], "data": ["1"]}))
+            if msg["cmd"] == "SendOicqMsg":
+                self.replies += 1
+                if self.replies == self.messages:
+                    self.elapsed = time.perf_counter() - self.started
+                    self.on_done()
+
+
+def run_case(shards: int, messages: int, groups: int, work: int, results) -> None:
+    server = MockServer(messages, groups)
+    server.start()
+
+    class BenchPlugin(Plugin):
+        async def on_create(self, websocket):
+            loop = asyncio.get_running_loop()
+            server.on_done = lambda: loop.call_soon_threadsafe(self.stop)
+
+    plugin = BenchPlugin(f"ws://127.0.0.1:{server.port}", reload=False, max_retry=0, log_path=os.devnull)
+    plugin.get_logger().logger.setLevel(logging.WARNING)
+    sender = plugin.get_sender()
+
+    @plugin.on_msg(r"work (\d+)")
+    async def handle(messenger, matches):
+        await sender.send_msg(messenger, str(cpu_work(work)))
+
+    plugin.run(shards=shards)
+    results.put((shards, server.replies, server.elapsed))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=64)
+    parser.add_argument("--work", type=int, default=20000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    print(f"cpu={os.cpu_count()} messages={args.messages} groups={args.groups} work={args.work}")
+    print(f"{'shards':>6} {'replies':>8} {'seconds':>8} {'msgs/s':>9}")
+    # 每组配置在独立进程中运行，互不影响
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    for shards in args.shards:
+        process = ctx.Process(target=run_case, args=(shards, args.messages, args.groups, args.work, results))
+        process.start()
+        process.join()
+        _, replies, elapsed = results.get()
+        rate = replies / elapsed if elapsed else 0
+        print(f"{shards:>6} {replies:>8} {elapsed:>8.2f} {rate:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
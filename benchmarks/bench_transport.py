@@ -0,0 +1,61 @@
+"""
+传输编码基准：JSON 与 msgpack（tag 编号化）在开启/关闭 permessage-deflate 时的每条消息字节数与解码耗时
+
+    python benchmarks/bench_transport.py [--messages 2000] [--number 20000]
+
+deflate 按 permessage-deflate 的默认行为模拟：保留压缩上下文，每条消息以 Z_SYNC_FLUSH 结束并去掉末尾 4 字节
+"""
+import argparse
+import timeit
+import zlib
+
+from secplugin.codec import JsonCodec, MsgpackCodec, get_codec, msgpack
+
+from bench_codec import PUSH_OICQ_MSG
+
+
+def stream(messages: int) -> list[dict]:
+    frames = []
+    for i in range(messages):
+        data = [dict(item) for item in PUSH_OICQ_MSG["data"]]
+        data[1]["GroupId"] = str(123456789 + i % 64)
+        data[3]["MsgId"] = str(7281930012 + i)
+        data[6]["Text"] = f" 天气 北京 {i}"
+        frames.append({"cmd": "PushOicqMsg", "seq": 0, "data": data})
+    return frames
+
+
+def deflated_sizes(frames: list[bytes]) -> int:
+    encoder = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15, 8)
+    total = 0
+    for frame in frames:
+        total += len(encoder.compress(frame) + encoder.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    frames = stream(args.messages)
+    codecs: list[JsonCodec] = [JsonCodec(), get_codec()]
+    if msgpack is not None:
+        codecs.append(MsgpackCodec(get_codec()))
+    else:
+        print("msgpack is not installed, skipping the binary encoding")
+
+    print(f"{'encoding':>10} {'bytes/msg':>10} {'deflate B/msg':>14} {'decode us':>10}")
+    for codec in codecs:
+        encoded = [codec.dumps(f) for f in frames]
+        assert codec.loads(encoded[0]) == frames[0]
+        raw = sum(map(len, encoded)) / len(encoded)
+        deflated = deflated_sizes(encoded) / len(encoded)
+        sample = encoded[len(encoded) // 2]
+        decode = min(timeit.repeat(lambda: codec.loads(sample), number=args.number, repeat=3)) / args.number
+        print(f"{codec.name:>10} {raw:>10.1f} {deflated:>14.1f} {decode * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 
 __version__ = "1.2.6"
-__all__ = ["Plugin", "Messenger", "Cmd", "Msg", "Sender"]
+__all__ = ["Plugin", "Messenger", "Cmd", "Msg", "Sender", "Priority", "RateLimit", "LogRotation"]
 
 from .plugin import Plugin
 from .messenger import Messenger
 from .cmd import Cmd
 from .msg import Msg
 from .sender import Sender
+from .scheduler import Priority, RateLimit
+from .logger import LogRotation
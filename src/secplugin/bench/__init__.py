@@ -0,0 +1,10 @@
+"""
+吞吐与延迟基准：本地 Secluded 替身 + 负载模型 + 场景
+
+    python -m secplugin.bench [--scenario send_msg] [--profile burst steady] [--json out.json] [--baseline old.json]
+"""
+__all__ = ["LoadProfile", "PROFILES", "MockSecluded", "SCENARIOS", "run_scenario", "run_isolated"]
+
+from .profiles import LoadProfile, PROFILES
+from .server import MockSecluded
+from .runner import SCENARIOS, run_isolated, run_scenario
@@ -0,0 +1,87 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from typing import Any, Optional
+
+from .profiles import PROFILES
+from .runner import SCENARIOS, run_isolated
+
+
+def _fmt(value: Optional[float], spec: str) -> str:
+    return format(value, spec) if value is not None else "-"
+
+
+def _regressions(results: list[dict[str, Any]], baseline: list[dict[str, Any]], tolerance: float) -> list[str]:
+    """
+    与基线比较：吞吐下降或 p99 上升超过 tolerance（比例）即视为回退
+    """
+    previous = {(r["scenario"], r["profile"]): r for r in baseline if "error" not in r}
+    found = []
+    for result in results:
+        old = previous.get((result["scenario"], result["profile"]))
+        if old is None or "error" in result:
+            continue
+        name = f"{result['scenario']}/{result['profile']}"
+        if old["msgs_per_sec"] and result["msgs_per_sec"] < old["msgs_per_sec"] * (1 - tolerance):
+            found.append(f"{name}: msgs/s {old['msgs_per_sec']:.0f} -> {result['msgs_per_sec']:.0f}")
+        if old.get("p99_ms") and result.get("p99_ms") and result["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            found.append(f"{name}: p99 {old['p99_ms']:.2f}ms -> {result['p99_ms']:.2f}ms")
+    return found
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m secplugin.bench", description="SecPlugin throughput / latency benchmark")
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--profile", nargs="+", choices=sorted(PROFILES), default=list(PROFILES))
+    parser.add_argument("--messages", type=int, help="override the message count of every profile")
+    parser.add_argument("--latency", type=float, default=0, help="mock server response latency in seconds")
+    parser.add_argument("--timeout", type=float, default=60, help="per case timeout in seconds")
+    parser.add_argument("--encoding", choices=("json", "msgpack"), default="json", help="frame encoding offered by the plugin")
+    parser.add_argument("--no-compression", action="store_true", help="disable permessage-deflate")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a previous --json output")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression (default 0.1)")
+    args = parser.parse_args(argv)
+
+    plugin_options = {"encoding": args.encoding}
+    if args.no_compression:
+        plugin_options["compression"] = None
+    print(f"cpu={os.cpu_count()} python={sys.version.split()[0]} latency={args.latency}s encoding={args.encoding} "
+          f"compression={'off' if args.no_compression else 'deflate'}")
+    print(f"{'scenario':<16} {'profile':<12} {'done':>9} {'seconds':>8} {'msgs/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'rss MB':>7} {'peak MB':>8} {'B/in':>6} {'B/out':>6}")
+    results = []
+    for scenario in args.scenario:
+        for name in args.profile:
+            profile = PROFILES[name]
+            if args.messages:
+                profile = profile.scaled(args.messages)
+            result = run_isolated(scenario, profile, args.latency, args.timeout, plugin_options)
+            results.append(result)
+            if "error" in result:
+                print(f"{scenario:<16} {name:<12} error: {result['error']}")
+                continue
+            print(
+                f"{scenario:<16} {name:<12} {result['completed']:>4}/{result['messages']:<4} {result['seconds']:>8.2f} "
+                f"{result['msgs_per_sec']:>9.0f} {_fmt(result['p50_ms'], '>8.2f')} {_fmt(result['p99_ms'], '>8.2f')} "
+                f"{_fmt(result['rss_mb'], '>7.1f')} {_fmt(result['rss_peak_mb'], '>8.1f')} "
+                f"{result['bytes_in_per_frame']:>6.0f} {result['bytes_out_per_frame']:>6.0f}"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = _regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
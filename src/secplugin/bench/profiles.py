@@ -0,0 +1,37 @@
+from __future__ import annotations
+from typing import Optional
+
+
+class LoadProfile:
+    """
+    推送负载：messages 条消息分布在 groups 个群中；rate 为每秒推送条数，None 表示一次性全部推送
+    """
+    __slots__ = ("name", "messages", "rate", "groups")
+
+    def __init__(self, name: str, messages: int = 2000, rate: Optional[float] = None, groups: int = 16) -> None:
+        if messages < 1:
+            raise ValueError("messages must be >= 1")
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be > 0")
+        if groups < 1:
+            raise ValueError("groups must be >= 1")
+        self.name: str = name
+        self.messages: int = messages
+        self.rate: Optional[float] = rate
+        self.groups: int = groups
+
+    def scaled(self, messages: int) -> LoadProfile:
+        return LoadProfile(self.name, messages, self.rate, self.groups)
+
+    def __repr__(self) -> str:
+        return f"LoadProfile({self.name!r}, messages={self.messages}, rate={self.rate}, groups={self.groups})"
+
+
+PROFILES: dict[str, LoadProfile] = {
+    # 突发：连接建立后一次性推送
+    "burst": LoadProfile("burst", 2000, None, 16),
+    # 稳态：按固定速率推送，延迟反映排队以外的处理开销
+    "steady": LoadProfile("steady", 2000, 1000, 16),
+    # 大量群：分片键、路由与缓存键分散
+    "many_groups": LoadProfile("many_groups", 2000, None, 1000),
+}
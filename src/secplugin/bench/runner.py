@@ -0,0 +1,137 @@
+from __future__ import annotations
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+from typing import Any, Optional
+
+from ..plugin import Plugin
+from .profiles import LoadProfile
+from .server import MockSecluded
+
+# do_msg_handler：只经过解析、分发与匹配，处理器直接记录完成
+# send_msg：处理器回复一条消息，替身收到回复时记录完成
+# is_operator：处理器先查询群管理员（请求-响应 + 缓存），再回复
+SCENARIOS = ("do_msg_handler", "send_msg", "is_operator")
+
+
+def rss_bytes() -> tuple[Optional[int], Optional[int]]:
+    """
+    (当前 RSS, 峰值 RSS)，平台不支持时为 None
+    """
+    current = peak = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    return current, peak
+
+
+def _register(plugin: Plugin, scenario: str, server: MockSecluded) -> None:
+    sender = plugin.get_sender()
+    if scenario == "do_msg_handler":
+        @plugin.on_msg(r"bench (\d+)")
+        async def handle(messenger, matches):
+            server.complete(int(matches.group(1)))
+    elif scenario == "send_msg":
+        @plugin.on_msg(r"bench (\d+)")
+        async def handle(messenger, matches):
+            await sender.send_msg(messenger, matches.group(0))
+    elif scenario == "is_operator":
+        @plugin.on_msg(r"bench (\d+)")
+        async def handle(messenger, matches):
+            if await sender.is_operator(messenger):
+                await sender.send_msg(messenger, matches.group(0))
+    else:
+        raise ValueError(f"Unknown scenario '{scenario}', expected one of {', '.join(SCENARIOS)}")
+
+
+def run_scenario(scenario: str,
+                 profile: LoadProfile,
+                 latency: float = 0,
+                 timeout: float = 60,
+                 plugin_options: Optional[dict[str, Any]] = None
+) -> dict[str, Any]:
+    """
+    在当前进程中运行一组基准：启动替身服务端与 Plugin，全部消息完成或超时后返回结果
+    plugin_options 中的 encoding 同时决定替身是否接受二进制编码
+    """
+    server = MockSecluded(profile, latency=latency, encoding=(plugin_options or {}).get("encoding"))
+    server.start()
+
+    class BenchPlugin(Plugin):
+        async def on_create(self, websocket):
+            loop = asyncio.get_running_loop()
+            # 最后一批回复的响应仍在路上，稍后再停止以免记录连接断开错误；计时以完成时刻为准
+            server.on_done = lambda: loop.call_soon_threadsafe(loop.call_later, latency + 0.1, self.stop)
+            loop.call_later(timeout, self.stop)
+
+    options = {"reload": False, "max_retry": 0, "log_path": os.devnull, "log_level": logging.WARNING}
+    options.update(plugin_options or {})
+    plugin = BenchPlugin(server.url, **options)
+    _register(plugin, scenario, server)
+    try:
+        plugin.run()
+    finally:
+        server.stop()
+
+    elapsed = server.elapsed()
+    p50, p99 = server.latency_percentile(0.5), server.latency_percentile(0.99)
+    rss, rss_peak = rss_bytes()
+    return {
+        "scenario": scenario,
+        "profile": profile.name,
+        "messages": profile.messages,
+        "completed": server.completed,
+        "seconds": elapsed,
+        "msgs_per_sec": server.completed / elapsed if elapsed > 0 else 0,
+        "p50_ms": p50 * 1000 if p50 is not None else None,
+        "p99_ms": p99 * 1000 if p99 is not None else None,
+        "rss_mb": rss / 1048576 if rss is not None else None,
+        "rss_peak_mb": rss_peak / 1048576 if rss_peak is not None else None,
+        "bytes_in_per_frame": server.bytes_in / server.frames_in if server.frames_in else 0,
+        "bytes_out_per_frame": server.bytes_out / server.frames_out if server.frames_out else 0,
+    }
+
+
+def _run_child(scenario: str,
+               profile: LoadProfile,
+               latency: float,
+               timeout: float,
+               plugin_options: Optional[dict[str, Any]],
+               results: Any
+) -> None:
+    try:
+        results.put(run_scenario(scenario, profile, latency, timeout, plugin_options))
+    except Exception as e:
+        results.put({"scenario": scenario, "profile": profile.name, "error": repr(e)})
+
+
+def run_isolated(scenario: str,
+                 profile: LoadProfile,
+                 latency: float = 0,
+                 timeout: float = 60,
+                 plugin_options: Optional[dict[str, Any]] = None
+) -> dict[str, Any]:
+    """
+    在独立的 spawn 子进程中运行，RSS 与各组之间互不影响
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_child, args=(scenario, profile, latency, timeout, plugin_options, results))
+    process.start()
+    try:
+        return results.get(timeout=timeout + 30)
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
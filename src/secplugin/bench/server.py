@@ -0,0 +1,212 @@
+from __future__ import annotations
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+import websockets
+
+from ..cmd import Cmd
+from ..codec import JsonCodec, MsgpackCodec
+from ..msg import Msg
+from .profiles import LoadProfile
+
+# 推送消息的文本为 "bench <序号>"，回复中带回同样的文本即可关联到推送时间
+TEXT_PREFIX = "bench "
+
+
+def _items(data: Any) -> Iterator[tuple[str, Any]]:
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                yield from item.items()
+
+
+class MockSecluded:
+    """
+    本地 Secluded 替身：在独立线程的事件循环中运行，支持 SyncOicq / Heartbeat / PushOicqMsg / SendOicqMsg / Response
+    - latency：对需要响应的请求延迟多久回复（秒）
+    - respond=False 时从不回复 rsp 请求；drop_rate 为随机丢弃响应的比例，用于测试超时路径
+    - 群管理员查询（GroupMemberListGetAdmin）返回 admins
+    - encoding="msgpack" 时接受 SyncOicq 中提议的二进制编码（使用对端发来的 tag 编号表），否则始终使用 JSON
+    收到带 "bench <序号>" 文本的 SendOicqMsg，或处理器直接调用 complete() 时记录一次完成
+    """
+    def __init__(self,
+                 profile: LoadProfile,
+                 latency: float = 0,
+                 respond: bool = True,
+                 drop_rate: float = 0,
+                 admins: tuple[str, ...] = ("20000",),
+                 account: str = "10000",
+                 uin: str = "20000",
+                 encoding: Optional[str] = None,
+                 seed: int = 0
+    ) -> None:
+        self.profile: LoadProfile = profile
+        self.latency: float = latency
+        self.respond: bool = respond
+        self.drop_rate: float = drop_rate
+        self.admins: list[str] = list(admins)
+        self.account: str = account
+        self.uin: str = uin
+        self.encoding: Optional[str] = encoding
+        # 收发帧的字节数（压缩前），用于比较编码的体积
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+        self.frames_in: int = 0
+        self.frames_out: int = 0
+        self.port: int = 0
+        self.on_done: Optional[Callable[[], None]] = None
+        self.requests: int = 0
+        self.completed: int = 0
+        self.started: float = 0
+        self.finished: float = 0
+        self.latencies: list[float] = []
+        self._pushed_at: list[float] = [0.0] * profile.messages
+        self._seen: bytearray = bytearray(profile.messages)
+        self._lock: threading.Lock = threading.Lock()
+        self._random: random.Random = random.Random(seed)
+        self._ready: threading.Event = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop: Optional[asyncio.Future] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), name="mock-secluded", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self) -> None:
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(lambda: self._stop.done() or self._stop.set_result(None))
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = self._loop.create_future()
+        async with websockets.serve(self._handler, "127.0.0.1", 0) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stop
+
+    def frame(self, index: int) -> dict[str, Any]:
+        return {"cmd": Cmd.PushOicqMsg.value, "seq": 0, "data": [
+            {Msg.Account: self.account},
+            {Msg.Group: Msg.Group, Msg.GroupId: str(100000 + index % self.profile.groups)},
+            {Msg.Uin: self.uin, Msg.MsgId: str(index)},
+            {Msg.Text: f"{TEXT_PREFIX}{index}"},
+        ]}
+
+    async def _send(self, ws: Any, obj: dict[str, Any], codec: Optional[MsgpackCodec]) -> None:
+        frame: bytes | str = codec.dumps(obj) if codec is not None else json.dumps(obj, ensure_ascii=False)
+        self.bytes_out += len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8"))
+        self.frames_out += 1
+        await ws.send(frame)
+
+    async def _push(self, ws: Any, codec: Optional[MsgpackCodec]) -> None:
+        profile = self.profile
+        self.started = time.perf_counter()
+        for i in range(profile.messages):
+            if profile.rate is not None:
+                # 按绝对时间表推送，避免 sleep 误差累积
+                delay = self.started + i / profile.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self._pushed_at[i] = time.perf_counter()
+            await self._send(ws, self.frame(i), codec)
+
+    def complete(self, index: int) -> None:
+        """
+        记录第 index 条推送已处理完成；可在任意线程调用，每条只计一次
+        """
+        now = time.perf_counter()
+        with self._lock:
+            if not 0 <= index < len(self._seen) or self._seen[index]:
+                return
+            self._seen[index] = 1
+            self.latencies.append(now - self._pushed_at[index])
+            self.completed += 1
+            done = self.completed == self.profile.messages
+            if done:
+                self.finished = now
+        if done and self.on_done is not None:
+            self.on_done()
+
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def _response_data(self, data: Any) -> Any:
+        for key, _ in _items(data):
+            if key == Msg.GroupMemberListGetAdmin:
+                return list(self.admins)
+        return ["1"]
+
+    async def _reply(self, ws: Any, seq: Any, data: Any, codec: Optional[MsgpackCodec]) -> None:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        try:
+            await self._send(ws, {"cmd": Cmd.Response.value, "seq": seq, "data": data}, codec)
+        except websockets.ConnectionClosed:
+            pass
+
+    def _negotiate(self, data: Any) -> Optional[MsgpackCodec]:
+        if self.encoding != MsgpackCodec.name or not isinstance(data, dict):
+            return None
+        if MsgpackCodec.name not in (data.get("encodings") or []) or not isinstance(data.get("tags"), list):
+            return None
+        return MsgpackCodec(tags=data["tags"])
+
+    async def _handler(self, ws: Any) -> None:
+        tasks: set[asyncio.Task] = set()
+        decoder: JsonCodec | MsgpackCodec = JsonCodec()
+        codec: Optional[MsgpackCodec] = None
+
+        def spawn(coro: Any) -> None:
+            task = asyncio.get_running_loop().create_task(coro)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        try:
+            async for raw in ws:
+                self.bytes_in += len(raw) if isinstance(raw, bytes) else len(raw.encode("utf-8"))
+                self.frames_in += 1
+                msg = decoder.loads(raw)
+                cmd = msg.get("cmd")
+                self.requests += 1
+                if cmd == Cmd.SyncOicq:
+                    negotiated = self._negotiate(msg.get("data"))
+                    status: dict[str, Any] = {"status": True}
+                    if negotiated is not None:
+                        status["encoding"] = negotiated.name
+                    await self._reply(ws, msg.get("seq"), status, None)
+                    if negotiated is not None:
+                        decoder = codec = negotiated
+                    spawn(self._push(ws, codec))
+                    continue
+                if cmd == Cmd.SendOicqMsg:
+                    for key, value in _items(msg.get("data")):
+                        if key == Msg.Text and isinstance(value, str) and value.startswith(TEXT_PREFIX):
+                            index = value[len(TEXT_PREFIX):]
+                            if index.isdigit():
+                                self.complete(int(index))
+                if msg.get("rsp") and self.respond and self._random.random() >= self.drop_rate:
+                    data = {"status": True} if cmd == Cmd.Heartbeat else self._response_data(msg.get("data"))
+                    spawn(self._reply(ws, msg.get("seq"), data, codec))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
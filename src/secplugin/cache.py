@@ -0,0 +1,113 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+_MISS: Any = object()
+# 加载方被取消时交给等待方的结果：等待方重新查询，由其中一个接手加载
+_RETRY: Any = object()
+
+
+class TTLCache:
+    """
+    带 TTL 的 LRU 缓存；get_or_load 对同一 key 的并发加载只发起一次（single-flight）
+    loader 返回 None 或抛出异常时不写入缓存
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 60) -> None:
+        self._maxsize: int = maxsize
+        self._ttl: float = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._loading: dict[Hashable, asyncio.Future] = {}
+        # 加载期间发生失效时丢弃加载结果，避免把旧数据写回缓存
+        self._generation: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.collapsed: int = 0
+
+    def enabled(self) -> bool:
+        return self._ttl > 0 and self._maxsize > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled():
+            return
+        self._data[key] = (time.monotonic() + self._ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        self._generation += 1
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        self._generation += 1
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled():
+            return await loader()
+        while True:
+            value = self.get(key, _MISS)
+            if value is not _MISS:
+                self.hits += 1
+                return value
+            future = self._loading.get(key)
+            if future is None:
+                break
+            self.collapsed += 1
+            value = await asyncio.shield(future)
+            if value is not _RETRY:
+                return value
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                # 只取消加载方自己，不把 CancelledError 传给其他等待方
+                future.set_result(_RETRY)
+            else:
+                future.set_exception(e)
+                # 没有其他等待方时避免 "exception was never retrieved"
+                future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if value is not None and generation == self._generation:
+                self.set(key, value)
+            return value
+        finally:
+            self._loading.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": len(self._data),
+            "maxsize": self._maxsize,
+            "ttl": self._ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collapsed": self.collapsed,
+        }
@@ -0,0 +1,195 @@
+from __future__ import annotations
+import importlib
+import json
+import types
+from typing import Any, Optional
+
+try:
+    orjson: Optional[types.ModuleType] = importlib.import_module("orjson")
+except Exception:
+    orjson = None
+
+try:
+    msgspec: Optional[types.ModuleType] = importlib.import_module("msgspec")
+except Exception:
+    msgspec = None
+
+try:
+    msgpack: Optional[types.ModuleType] = importlib.import_module("msgpack")
+except Exception:
+    msgpack = None
+
+from .msg import TAGS
+
+
+class JsonCodec:
+    """
+    websocket 帧编解码：dumps 输出 UTF-8 bytes，loads 同时接受 bytes 与 str，解码失败统一抛出 ValueError
+    """
+    name = "json"
+    # 二进制编码以 binary 帧发送
+    binary = False
+
+    # 带参数的 json.dumps 每次都会新建 JSONEncoder，这里预先构造
+    _text_encoder = json.JSONEncoder(ensure_ascii=False)
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode("ascii")
+
+    def dumps_text(self, obj: Any) -> str:
+        return self._text_encoder.encode(obj)
+
+    def loads(self, data: bytes | str) -> Any:
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    orjson 不支持的对象（非 str 键、超过 64 位的整数等）回退到标准库，输出与 JsonCodec 一致
+    """
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("Missing dependency 'orjson'. Please install it via 'pip install orjson'.")
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return self._dumps(obj)
+        except TypeError:
+            return super().dumps(obj)
+
+    def dumps_text(self, obj: Any) -> str:
+        try:
+            return self._dumps(obj).decode("utf-8")
+        except TypeError:
+            return super().dumps_text(obj)
+
+    def loads(self, data: bytes | str) -> Any:
+        return self._loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+    """
+    msgspec 不支持的对象回退到标准库，同 OrjsonCodec
+    """
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        if msgspec is None:
+            raise ImportError("Missing dependency 'msgspec'. Please install it via 'pip install msgspec'.")
+        self._encode = msgspec.json.Encoder().encode
+        self._decode = msgspec.json.Decoder().decode
+        self._error = msgspec.DecodeError
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return self._encode(obj)
+        except (TypeError, OverflowError):
+            return super().dumps(obj)
+
+    def dumps_text(self, obj: Any) -> str:
+        try:
+            return self._encode(obj).decode("utf-8")
+        except (TypeError, OverflowError):
+            return super().dumps_text(obj)
+
+    def loads(self, data: bytes | str) -> Any:
+        try:
+            return self._decode(data)
+        except self._error as e:
+            raise ValueError(str(e)) from e
+
+
+def tag_table() -> list[str]:
+    """
+    Msg 中定义的全部 tag（见 msg.TAGS）；下标即 msgpack 编码中的 tag 编号
+    """
+    return list(TAGS)
+
+
+class MsgpackCodec(JsonCodec):
+    """
+    紧凑二进制编码：msgpack，data 列表中各项的 tag 键替换为 tag_table() 中的编号，未收录的 tag 保留字符串
+    编号表在 SyncOicq 中随 encodings 一并发给对端，协商成功后才启用
+    loads 按首字节区分：'{' 或 str 交给 JSON 后端，其余按 msgpack 解码，因此协商前后的帧都能解析
+    """
+    name = "msgpack"
+    binary = True
+
+    def __init__(self, json_codec: Optional[JsonCodec] = None, tags: Optional[list[str]] = None) -> None:
+        if msgpack is None:
+            raise ImportError("Missing dependency 'msgpack'. Please install it via 'pip install msgpack'.")
+        self._json: JsonCodec = json_codec or JsonCodec()
+        self.tags: list[str] = tags if tags is not None else tag_table()
+        self._codes: dict[str, int] = {tag: i for i, tag in enumerate(self.tags)}
+        self._names: dict[int, str] = dict(enumerate(self.tags))
+        self._packb = msgpack.Packer(use_bin_type=True).pack
+        self._unpackb = msgpack.unpackb
+
+    def _intern(self, data: Any) -> Any:
+        if not isinstance(data, list):
+            return data
+        codes = self._codes
+        return [
+            {codes.get(k, k): v for k, v in item.items()} if isinstance(item, dict) else item
+            for item in data
+        ]
+
+    def _restore(self, data: Any) -> Any:
+        if not isinstance(data, list):
+            return data
+        names = self._names.get
+        return [
+            {names(k, k): v for k, v in item.items()} if isinstance(item, dict) else item
+            for item in data
+        ]
+
+    def dumps(self, obj: Any) -> bytes:
+        if isinstance(obj, dict) and "data" in obj:
+            obj = {**obj, "data": self._intern(obj["data"])}
+        return self._packb(obj)
+
+    def dumps_text(self, obj: Any) -> str:
+        return self._json.dumps_text(obj)
+
+    def loads(self, data: bytes | str) -> Any:
+        if isinstance(data, str) or data[:1] == b"{":
+            return self._json.loads(data)
+        try:
+            obj = self._unpackb(data, raw=False, strict_map_key=False)
+        except Exception as e:
+            raise ValueError(str(e)) from e
+        if isinstance(obj, dict) and "data" in obj:
+            obj["data"] = self._restore(obj["data"])
+        return obj
+
+
+_CODECS: dict[str, type[JsonCodec]] = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgspecCodec.name: MsgspecCodec,
+}
+
+
+def get_codec(codec: Optional[JsonCodec | str] = None) -> JsonCodec:
+    """
+    codec 为 None 时使用标准库 json；第三方后端需显式指定，"auto" 按 orjson > msgspec > json 选择已安装的后端
+    """
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec is None:
+        return JsonCodec()
+    if codec == "auto":
+        if orjson is not None:
+            return OrjsonCodec()
+        if msgspec is not None:
+            return MsgspecCodec()
+        return JsonCodec()
+    if codec not in _CODECS:
+        raise ValueError(f"Unknown codec '{codec}', expected one of {[*_CODECS, 'auto']}")
+    return _CODECS[codec]()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import asyncio
+import inspect
+import time
+from typing import Any, Optional
+
+from .codec import JsonCodec
+from .heartbeat import LatencyMonitor
+from .rpc import RpcChannel
+
+
+class Connection:
+    """
+    单个 websocket 连接的状态：独立的 seq 空间与等待响应表、重连计数，以及经由该连接收到消息的账号
+    断开期间的出站消息在 wait_ready 中排队，SyncOicq 完成后按原顺序发出
+    """
+    def __init__(self, url: str, max_in_flight: int = 64) -> None:
+        self.url: str = url
+        self.ws: Any = None
+        self.rpc: RpcChannel = RpcChannel(max_in_flight)
+        # websockets>=14 可直接以 bytes 发送文本帧、按 bytes 接收，省去一次 str 转换
+        self.send_text_bytes: bool = False
+        self.recv_bytes: bool = False
+        self.retry_cnt: int = 0
+        self.connects: int = 0
+        self.connected_at: float = 0
+        self.accounts: set[str] = set()
+        self._ready: asyncio.Event = asyncio.Event()
+        self.buffered: int = 0
+        self.replayed: int = 0
+        # 从断开到重新对接完成的耗时
+        self.disconnected_at: Optional[float] = None
+        self.recoveries: int = 0
+        self.recover_last: float = 0
+        self.recover_max: float = 0
+        self.recover_total: float = 0
+        self.latency: LatencyMonitor = LatencyMonitor()
+        # SyncOicq 协商出的二进制编码，None 表示使用 Plugin 的 JSON 编码；每次重连重新协商
+        self.codec: Optional[JsonCodec] = None
+        self.extensions: list[str] = []
+
+    def attach(self, ws: Any) -> None:
+        self.ws = ws
+        self.send_text_bytes = "text" in inspect.signature(ws.send).parameters
+        self.recv_bytes = "decode" in inspect.signature(ws.recv).parameters
+        self.retry_cnt = 0
+        self.connects += 1
+        self.connected_at = time.monotonic()
+        # 握手协商出的扩展（如 permessage-deflate）；新旧两套 websockets 接口位置不同
+        protocol = getattr(ws, "protocol", None)
+        extensions = getattr(protocol, "extensions", None) or getattr(ws, "extensions", None) or []
+        self.extensions = [getattr(ext, "name", str(ext)) for ext in extensions]
+
+    def detach(self) -> None:
+        if self.ws is not None:
+            self.disconnected_at = time.monotonic()
+        self.ws = None
+        self.codec = None
+        self._ready.clear()
+        # 已发出的请求无法确认对端是否处理，不重发以免重复消息
+        self.rpc.fail_all(ConnectionError(f"WebSocket connection lost: {self.url}"))
+
+    def connected(self) -> bool:
+        return self.ws is not None
+
+    def abort(self) -> None:
+        """
+        半开连接上关闭握手可能一直等不到回应，直接断开传输层，读循环随即退出并触发重连
+        """
+        ws = self.ws
+        if ws is None:
+            return
+        transport = getattr(ws, "transport", None)
+        if transport is not None:
+            transport.abort()
+        else:
+            asyncio.ensure_future(ws.close())
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def mark_ready(self) -> None:
+        if self.disconnected_at is not None:
+            recover = time.monotonic() - self.disconnected_at
+            self.disconnected_at = None
+            self.recoveries += 1
+            self.recover_last = recover
+            self.recover_max = max(self.recover_max, recover)
+            self.recover_total += recover
+        self._ready.set()
+
+    async def wait_ready(self, timeout: float, max_buffered: int) -> None:
+        if self._ready.is_set():
+            return
+        if self.buffered >= max_buffered:
+            raise RuntimeError(f"Send buffer full ({max_buffered}) while disconnected: {self.url}")
+        self.buffered += 1
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Connection not recovered within {timeout}s: {self.url}")
+        finally:
+            self.buffered -= 1
+        self.replayed += 1
+
+    async def send_payload(self, payload: dict[str, Any], codec: JsonCodec) -> None:
+        negotiated = self.codec
+        if negotiated is not None:
+            await self.send_frame(negotiated.dumps(payload), binary=True)
+        else:
+            await self.send_frame(codec.dumps(payload))
+
+    async def send_frame(self, frame: bytes, binary: bool = False) -> None:
+        ws = self.ws
+        if ws is None:
+            raise RuntimeError("WebSocket is not connected")
+        if binary:
+            await ws.send(frame)
+        elif self.send_text_bytes:
+            await ws.send(frame, text=True)
+        else:
+            await ws.send(frame.decode("utf-8"))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "url": self.url,
+            "connected": self.connected(),
+            "connects": self.connects,
+            "retry": self.retry_cnt,
+            "in_flight": self.rpc.in_flight(),
+            "buffered": self.buffered,
+            "replayed": self.replayed,
+            "recoveries": self.recoveries,
+            "recover_last": self.recover_last,
+            "recover_max": self.recover_max,
+            "recover_avg": self.recover_total / self.recoveries if self.recoveries else 0,
+            "accounts": sorted(self.accounts),
+            "encoding": self.codec.name if self.codec is not None else "json",
+            "extensions": list(self.extensions),
+        }
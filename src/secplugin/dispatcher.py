@@ -0,0 +1,223 @@
+from __future__ import annotations
+import asyncio
+import re
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+try:
+    from re import _parser as _sre_parse  # type: ignore  # python>=3.11
+    from re import _constants as _sre_constants  # type: ignore
+except ImportError:
+    import sre_parse as _sre_parse  # type: ignore
+    import sre_constants as _sre_constants  # type: ignore
+
+from .msg import CHAT_TAGS, CHAT_TYPES
+from .routing import RoutingInfo
+
+_LITERAL = _sre_constants.LITERAL
+_SUBPATTERN = _sre_constants.SUBPATTERN
+_BRANCH = _sre_constants.BRANCH
+
+# 含反向引用的正则合并后组号会偏移，不参与合并预筛
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def _as_set(value: Optional[str | int | Iterable[str | int]]) -> Optional[frozenset[str]]:
+    if value is None:
+        return None
+    if isinstance(value, (str, int)):
+        return frozenset((str(value),))
+    return frozenset(str(v) for v in value)
+
+
+class HandlerEntry:
+    __slots__ = ("func", "rn", "is_coroutine", "order", "limiter", "executor", "timeout", "msg_types", "groups")
+
+    def __init__(self,
+                 func: Callable[..., Any],
+                 rn: int,
+                 order: int = 0,
+                 max_concurrency: Optional[int] = None,
+                 executor: Optional[str] = None,
+                 timeout: Optional[float] = None,
+                 msg_type: Optional[str | Iterable[str]] = None,
+                 group: Optional[str | int | Iterable[str | int]] = None
+    ) -> None:
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        if executor not in (None, "thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'process'")
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be > 0")
+        msg_types = _as_set(msg_type)
+        if msg_types is not None and not msg_types <= CHAT_TAGS:
+            raise ValueError(f"Unknown msg_type {sorted(msg_types - CHAT_TAGS)}, expected some of {list(CHAT_TYPES)}")
+        self.func: Callable[..., Any] = func
+        self.rn: int = rn
+        self.is_coroutine: bool = asyncio.iscoroutinefunction(func)
+        self.order: int = order
+        self.limiter: Optional[asyncio.Semaphore] = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.executor: Optional[str] = executor
+        self.timeout: Optional[float] = timeout
+        # 会话类型 / 群号过滤，None 为不限；在构建 Messenger 之前按 RoutingInfo 判断
+        self.msg_types: Optional[frozenset[str]] = msg_types
+        self.groups: Optional[frozenset[str]] = _as_set(group)
+
+    def accepts(self, route: RoutingInfo) -> bool:
+        if self.msg_types is not None and route.msg_type not in self.msg_types:
+            return False
+        if self.groups is not None and route.group_id not in self.groups:
+            return False
+        return True
+
+
+class _TrieNode:
+    __slots__ = ("children", "entries")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.entries: list[tuple[re.Pattern, HandlerEntry]] = []
+
+
+def _analyze(items: list) -> list[tuple[str, bool]]:
+    """
+    返回 [(字面量前缀, 是否为完整字面量)]，前缀为空串且非完整字面量表示无法索引
+    """
+    head: list[str] = []
+    for i, (op, av) in enumerate(items):
+        if op is _LITERAL:
+            head.append(chr(av))
+            continue
+        prefix = "".join(head)
+        last = i == len(items) - 1
+        if op is _SUBPATTERN:
+            # (group, add_flags, del_flags, pattern)
+            if av[1] or av[2]:
+                return [(prefix, False)]
+            subs = _analyze(list(av[3]))
+        elif op is _BRANCH:
+            subs = []
+            for branch in av[1]:
+                subs.extend(_analyze(list(branch)))
+        else:
+            return [(prefix, False)]
+        return [(prefix + sub, exact and last) for sub, exact in subs]
+    return [("".join(head), True)]
+
+
+def literal_prefixes(pattern: re.Pattern) -> Optional[list[tuple[str, bool]]]:
+    if not isinstance(pattern.pattern, str) or pattern.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = _sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+    result = _analyze(list(parsed))
+    if any(not prefix and not exact for prefix, exact in result):
+        return None
+    return result
+
+
+class RegexDispatcher:
+    """
+    on_msg 正则分发索引：
+    完整字面量走哈希表，字面量前缀走前缀树，其余正则线性匹配（可合并的先用一条合并正则预筛）
+    候选项最终仍以 fullmatch 确认，回调收到的 match 与逐条匹配完全一致
+    """
+    def __init__(self) -> None:
+        self._handlers: dict[re.Pattern, HandlerEntry] = {}
+        self._order: int = 0
+        self._built: bool = False
+        self._exact: dict[str, list[tuple[re.Pattern, HandlerEntry]]] = {}
+        self._trie: _TrieNode = _TrieNode()
+        self._fallback: list[tuple[re.Pattern, HandlerEntry]] = []
+        self._screened: list[tuple[re.Pattern, HandlerEntry]] = []
+        self._screen: Optional[re.Pattern] = None
+
+    def add(self, pattern: re.Pattern, entry: HandlerEntry) -> None:
+        if pattern in self._handlers:
+            raise AttributeError("Repeat regex")
+        self._order += 1
+        entry.order = self._order
+        self._handlers[pattern] = entry
+        self._built = False
+
+    def remove(self, pattern: re.Pattern) -> Optional[HandlerEntry]:
+        entry = self._handlers.pop(pattern, None)
+        if entry is not None:
+            self._built = False
+        return entry
+
+    def __contains__(self, pattern: re.Pattern) -> bool:
+        return pattern in self._handlers
+
+    def __len__(self) -> int:
+        return len(self._handlers)
+
+    def items(self) -> Iterator[tuple[re.Pattern, HandlerEntry]]:
+        return iter(list(self._handlers.items()))
+
+    def _build(self) -> None:
+        self._exact = {}
+        self._trie = _TrieNode()
+        self._fallback = []
+        self._screened = []
+        for pattern, entry in self._handlers.items():
+            prefixes = literal_prefixes(pattern)
+            if prefixes is None:
+                if pattern.flags == re.UNICODE and not pattern.groupindex \
+                        and not _BACKREF_RE.search(pattern.pattern):
+                    self._screened.append((pattern, entry))
+                else:
+                    self._fallback.append((pattern, entry))
+                continue
+            for prefix, exact in prefixes:
+                if exact:
+                    self._exact.setdefault(prefix, []).append((pattern, entry))
+                else:
+                    node = self._trie
+                    for ch in prefix:
+                        node = node.children.setdefault(ch, _TrieNode())
+                    node.entries.append((pattern, entry))
+        self._screen = None
+        if self._screened:
+            try:
+                self._screen = re.compile("|".join(f"(?:{p.pattern})" for p, _ in self._screened))
+            except re.error:
+                self._fallback.extend(self._screened)
+                self._fallback.sort(key=lambda item: item[1].order)
+                self._screened = []
+        self._built = True
+
+    def match(self, text: str) -> list[tuple[HandlerEntry, re.Match]]:
+        if not self._built:
+            self._build()
+        candidates: list[tuple[re.Pattern, HandlerEntry]] = []
+        exact = self._exact.get(text)
+        if exact:
+            candidates.extend(exact)
+        node = self._trie
+        for ch in text:
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.entries:
+                candidates.extend(node.entries)
+        if self._fallback:
+            candidates.extend(self._fallback)
+        if self._screened and self._screen.fullmatch(text):
+            candidates.extend(self._screened)
+        if not candidates:
+            return []
+
+        result: list[tuple[HandlerEntry, re.Match]] = []
+        seen: set[int] = set()
+        for pattern, entry in candidates:
+            if entry.order in seen:
+                continue
+            seen.add(entry.order)
+            matches = pattern.fullmatch(text)
+            if matches:
+                result.append((entry, matches))
+        if len(result) > 1:
+            result.sort(key=lambda item: item[0].order)
+        return result
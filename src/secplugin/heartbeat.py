@@ -0,0 +1,58 @@
+from __future__ import annotations
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Optional
+
+# 直方图桶上界（秒），最后一个桶收纳超出部分
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class LatencyMonitor:
+    """
+    心跳往返延迟统计：最近 window 个样本的分位数、累计直方图与连续丢失次数
+    """
+    def __init__(self, window: int = 256) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self._buckets: list[int] = [0] * (len(_BUCKETS) + 1)
+        self.count: int = 0
+        self.misses: int = 0
+        self.consecutive_misses: int = 0
+        self.last: Optional[float] = None
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+        self._buckets[bisect_left(_BUCKETS, latency)] += 1
+        self.count += 1
+        self.consecutive_misses = 0
+        self.last = latency
+
+    def record_miss(self) -> int:
+        self.misses += 1
+        self.consecutive_misses += 1
+        return self.consecutive_misses
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def histogram(self) -> dict[str, int]:
+        labels = [f"<={b * 1000:g}ms" for b in _BUCKETS] + [f">{_BUCKETS[-1] * 1000:g}ms"]
+        return dict(zip(labels, self._buckets))
+
+    def stats(self) -> dict[str, Any]:
+        samples = self._samples
+        return {
+            "count": self.count,
+            "misses": self.misses,
+            "consecutive_misses": self.consecutive_misses,
+            "last": self.last,
+            "min": min(samples) if samples else None,
+            "max": max(samples) if samples else None,
+            "avg": sum(samples) / len(samples) if samples else None,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "histogram": self.histogram(),
+        }
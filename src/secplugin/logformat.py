@@ -0,0 +1,174 @@
+from __future__ import annotations
+import gzip
+import json
+import logging
+import math
+import mmap
+import struct
+from typing import Any, Iterator, Optional
+
+from .codec import get_codec
+
+_codec = get_codec()
+
+# 结构化日志的固定字段，logger.log(..., account=..., group=..., seq=..., elapsed=...) 传入
+FIELDS = ("account", "group", "seq", "elapsed")
+
+# 二进制记录：总长度 u32 | 时间戳 f64 | 级别 u8 | elapsed f64（NaN 表示无）| seq i64 | 各字符串长度 | 字符串
+_HEADER = struct.Struct("<IdBdqHHHHI")
+_NO_SEQ = -(1 << 63)
+
+
+def _fields(record: logging.LogRecord) -> tuple[str, str, str, dict[str, Any]]:
+    """
+    取出 (main_tag, tag, 正文, 字段)；非 Logger 产生的记录以 logger 名作为 tag
+    """
+    msg = record.msg
+    body = getattr(msg, "body", None)
+    if body is None:
+        return "", record.name, record.getMessage(), {}
+    return msg.main_tag, msg.tag, body(), msg.fields
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    每条记录一行 JSON：ts, level, main_tag, tag, account, group, seq, elapsed, msg
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        main_tag, tag, body, fields = _fields(record)
+        line = {
+            "ts": record.created,
+            "level": record.levelname,
+            "main_tag": main_tag,
+            "tag": tag,
+            **{k: fields.get(k) for k in FIELDS},
+            "msg": body,
+        }
+        return _codec.dumps_text(line)
+
+
+class BinaryFormatter(logging.Formatter):
+    """
+    紧凑二进制记录，format 返回 bytes，需配合以二进制模式打开的文件 handler
+    """
+    def format(self, record: logging.LogRecord) -> bytes:  # type: ignore[override]
+        main_tag, tag, body, fields = _fields(record)
+        strings = [
+            main_tag.encode("utf-8")[:0xFFFF],
+            tag.encode("utf-8")[:0xFFFF],
+            _field_bytes(fields.get("account")),
+            _field_bytes(fields.get("group")),
+        ]
+        msg = body.encode("utf-8", "replace")
+        elapsed = fields.get("elapsed")
+        seq = fields.get("seq")
+        if not isinstance(seq, int):
+            seq = int(seq) if isinstance(seq, str) and seq.lstrip("-").isdigit() else None
+        size = _HEADER.size + sum(map(len, strings)) + len(msg)
+        header = _HEADER.pack(
+            size,
+            record.created,
+            min(record.levelno, 255),
+            math.nan if elapsed is None else float(elapsed),
+            _NO_SEQ if seq is None else int(seq),
+            *map(len, strings),
+            len(msg),
+        )
+        return b"".join((header, *strings, msg))
+
+
+def _field_bytes(value: Any) -> bytes:
+    return b"" if value is None else str(value).encode("utf-8")[:0xFFFF]
+
+
+def create_formatter(fmt: str) -> Optional[logging.Formatter]:
+    """
+    text 返回 None，由调用方沿用默认文本格式
+    """
+    if fmt == "text":
+        return None
+    if fmt == "jsonl":
+        return JsonLinesFormatter()
+    if fmt == "binary":
+        return BinaryFormatter()
+    raise ValueError(f"Unknown log format '{fmt}', expected 'text', 'jsonl' or 'binary'")
+
+
+def _open_buffer(path: str) -> Any:
+    """
+    普通文件使用 mmap 只读映射；轮转后的 .gz 文件只能整体解压到内存
+    """
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            return f.read()
+    with open(path, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            return b""
+
+
+def _iter_binary(buf: Any) -> Iterator[dict[str, Any]]:
+    unpack = _HEADER.unpack_from
+    offset, end = 0, len(buf)
+    while offset + _HEADER.size <= end:
+        size, ts, levelno, elapsed, seq, n_main, n_tag, n_account, n_group, n_msg = unpack(buf, offset)
+        if size < _HEADER.size or offset + size > end:
+            # 写入中途截断的尾部记录
+            break
+        pos = offset + _HEADER.size
+        values = []
+        for n in (n_main, n_tag, n_account, n_group, n_msg):
+            values.append(buf[pos:pos + n].decode("utf-8", "replace"))
+            pos += n
+        main_tag, tag, account, group, msg = values
+        yield {
+            "ts": ts,
+            "level": logging.getLevelName(levelno),
+            "main_tag": main_tag,
+            "tag": tag,
+            "account": account or None,
+            "group": group or None,
+            "seq": None if seq == _NO_SEQ else seq,
+            "elapsed": None if math.isnan(elapsed) else elapsed,
+            "msg": msg,
+        }
+        offset += size
+
+
+def _iter_jsonl(buf: Any, needles: tuple[bytes, ...] = ()) -> Iterator[dict[str, Any]]:
+    offset, end = 0, len(buf)
+    while offset < end:
+        newline = buf.find(b"\n", offset)
+        if newline < 0:
+            newline = end
+        line = buf[offset:newline]
+        offset = newline + 1
+        # 先以字节子串粗筛，命中后再解析 JSON
+        if not line or any(n not in line for n in needles):
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def iter_records(path: str, fmt: str = "auto", needles: tuple[bytes, ...] = ()) -> Iterator[dict[str, Any]]:
+    """
+    逐条读取结构化日志；fmt 为 auto 时按首字节判断（'{' 为 jsonl，否则为二进制）
+    needles 仅对 jsonl 生效：不包含全部子串的行直接跳过
+    """
+    buf = _open_buffer(path)
+    try:
+        if fmt == "auto":
+            fmt = "jsonl" if buf[:1] in (b"{", b"") else "binary"
+        if fmt == "jsonl":
+            yield from _iter_jsonl(buf, needles)
+        elif fmt == "binary":
+            yield from _iter_binary(buf)
+        else:
+            raise ValueError(f"Unknown log format '{fmt}'")
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
@@ -1,18 +1,31 @@
-import json
+import glob
+import gzip
 import logging
+import os
+import shutil
+import time
 import traceback
-from typing import Optional, Self, TYPE_CHECKING
-from logging.handlers import QueueHandler, QueueListener
-from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Self, TYPE_CHECKING
+from logging.handlers import QueueHandler
+from queue import Empty, Queue
 import importlib
+import threading
 import types
+import weakref
 
 try:
     colorlog: Optional[types.ModuleType] = importlib.import_module("colorlog")
 except Exception:
     colorlog = None
 
+from .codec import get_codec
+from .logformat import create_formatter
 from .messenger import Messenger
+
+_codec = get_codec()
+# 日志系统自身的故障（如后台压缩失败）；未配置 handler 时由 logging.lastResort 输出到 stderr
+_internal_logger = logging.getLogger("secplugin.logger")
 _console_handler = logging.StreamHandler()
 _console_handler.setLevel(logging.DEBUG)
 
@@ -32,24 +45,329 @@ else:
         '[%(asctime)s.%(msecs)03d] %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'))
 
-def _create_file_handler(path: str) -> logging.FileHandler:
-     handler = logging.FileHandler(path, encoding="utf-8")
-     handler.setLevel(logging.DEBUG)
-     handler.setFormatter(logging.Formatter(
+class _BatchFileHandler(logging.FileHandler):
+    """
+    emit 只写入缓冲区，由监听线程在一批记录处理完后统一 flush
+    """
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class LogRotation:
+    """
+    日志轮转配置：文件超过 max_bytes 或距上次轮转超过 interval 秒时切换到新文件
+    保留 backup_count 个旧文件（path.1 最新），compress 时在后台线程中 gzip 为 path.N.gz
+    分片模式下子进程的记录转交父进程写入，文件只由父进程打开与轮转
+    """
+    __slots__ = ("max_bytes", "interval", "backup_count", "compress")
+
+    def __init__(self,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 interval: Optional[float] = None,
+                 backup_count: int = 5,
+                 compress: bool = False
+    ) -> None:
+        if max_bytes < 0:
+            raise ValueError("max_bytes must be >= 0")
+        if interval is not None and interval <= 0:
+            raise ValueError("interval must be > 0")
+        if backup_count < 1:
+            raise ValueError("backup_count must be >= 1")
+        self.max_bytes: int = max_bytes
+        self.interval: Optional[float] = interval
+        self.backup_count: int = backup_count
+        self.compress: bool = compress
+
+
+class _RotatingFileHandler(_BatchFileHandler):
+    """
+    按大小或时间轮转；写入量在内存中累计，不在每条记录上 tell()/stat()
+    压缩失败留下的 .pending 文件在下一次轮转（或启动）时重试
+    """
+    def __init__(self, path: str, rotation: LogRotation, mode: str = "a", encoding: Optional[str] = "utf-8") -> None:
+        super().__init__(path, mode=mode, encoding=encoding)
+        self._rotation: LogRotation = rotation
+        self._size: int = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+        self._rollover_at: Optional[float] = time.time() + rotation.interval if rotation.interval else None
+        # 改名与压缩都在同一个后台线程中串行执行，保证编号顺序
+        self._compressor: Optional[ThreadPoolExecutor] = None
+        if rotation.compress:
+            self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compress")
+        # 已提交给后台线程、尚未处理完的 .pending 文件
+        self._pending: set[str] = set()
+        self._lock_pending: threading.Lock = threading.Lock()
+        self._retry_pending()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            text = self.format(record) + self.terminator
+            # max_bytes 按 UTF-8 字节数计；纯 ASCII 时字符数即字节数，免去一次编码
+            size = len(text) if isinstance(text, bytes) or text.isascii() else len(text.encode("utf-8"))
+            rotation = self._rotation
+            if ((rotation.max_bytes and self._size > 0 and self._size + size > rotation.max_bytes)
+                    or (self._rollover_at is not None and record.created >= self._rollover_at)):
+                self._rollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(text)
+            self._size += size
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _backup_name(self, index: int) -> str:
+        name = f"{self.baseFilename}.{index}"
+        return name + ".gz" if self._rotation.compress else name
+
+    def _shift(self, source: str) -> None:
+        count = self._rotation.backup_count
+        oldest = self._backup_name(count)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for i in range(count - 1, 0, -1):
+            name = self._backup_name(i)
+            if os.path.exists(name):
+                os.replace(name, self._backup_name(i + 1))
+        if not self._rotation.compress:
+            os.replace(source, self._backup_name(1))
+            return
+        with open(source, "rb") as src, gzip.open(self._backup_name(1), "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.remove(source)
+
+    def _safe_shift(self, source: str) -> None:
+        try:
+            self._shift(source)
+        except OSError as e:
+            # 后台线程中无法走 handleError；保留 .pending 文件，下一次轮转时重试
+            _internal_logger.error("日志轮转压缩失败，将在下次轮转时重试：%s（%s）", source, e)
+        finally:
+            with self._lock_pending:
+                self._pending.discard(source)
+
+    def _submit(self, source: str) -> None:
+        with self._lock_pending:
+            self._pending.add(source)
+        self._compressor.submit(self._safe_shift, source)
+
+    def _retry_pending(self) -> None:
+        """
+        重新提交上次失败（或进程中途退出）遗留的 .pending 文件，按时间顺序先于本次轮转的文件
+        """
+        if self._compressor is None:
+            return
+        with self._lock_pending:
+            leftover = [p for p in glob.glob(glob.escape(self.baseFilename) + ".*.pending") if p not in self._pending]
+        # 文件名中的 time_ns 位数相同，按名称排序即按时间排序
+        for path in sorted(leftover):
+            self._submit(path)
+
+    def _rollover(self) -> None:
+        if self.stream is not None:
+            self.stream.flush()
+            self.stream.close()
+            self.stream = None
+        self._size = 0
+        if self._rotation.interval:
+            self._rollover_at = time.time() + self._rotation.interval
+        if not os.path.exists(self.baseFilename):
+            return
+        if self._compressor is None:
+            self._shift(self.baseFilename)
+            return
+        self._retry_pending()
+        # 先改名腾出日志文件，压缩交给后台线程
+        pending = f"{self.baseFilename}.{time.time_ns()}.pending"
+        os.replace(self.baseFilename, pending)
+        self._submit(pending)
+
+    def after_fork(self) -> None:
+        # 父进程的压缩线程不会随 fork 复制
+        if self._compressor is not None:
+            self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compress")
+            self._pending = set()
+            self._lock_pending = threading.Lock()
+
+    def close(self) -> None:
+        super().close()
+        if self._compressor is not None:
+            self._compressor.shutdown(wait=True)
+
+
+def _create_file_handler(path: str,
+                         rotation: Optional[LogRotation] = None,
+                         level: int = logging.DEBUG,
+                         fmt: str = "text"
+) -> logging.FileHandler:
+     formatter = create_formatter(fmt)
+     # 二进制格式的 formatter 直接产出 bytes
+     mode, encoding = ("ab", None) if fmt == "binary" else ("a", "utf-8")
+     if rotation is not None:
+         handler = _RotatingFileHandler(path, rotation, mode=mode, encoding=encoding)
+     else:
+         handler = _BatchFileHandler(path, mode=mode, encoding=encoding)
+     if fmt == "binary":
+         handler.terminator = b""
+     handler.setLevel(level)
+     handler.setFormatter(formatter or logging.Formatter(
          '[%(asctime)s.%(msecs)03d] %(message)s',
          datefmt='%Y-%m-%d %H:%M:%S'))
      return handler
 
-import threading
-import weakref
+
+def _format_exception(e: BaseException) -> str:
+    return ''.join(traceback.format_exception(type(e), e, e.__traceback__)).strip()
+
+
+def _format_piece(m: Any) -> str:
+    if m is None:
+        return "null"
+    if isinstance(m, (dict, list)):
+        return _codec.dumps_text(m)
+    if isinstance(m, Messenger):
+        return _codec.dumps_text(m.list)
+    if isinstance(m, bytes):
+        return m.decode("utf-8", "replace")
+    if isinstance(m, BaseException):
+        return _format_exception(m)
+    return str(m)
+
+
+class _LazyMessage:
+    """
+    日志参数原样入队，在监听线程中首次使用时才序列化；多个 handler 共用同一结果
+    调用方在记录日志后不应再修改传入的 dict/list/Messenger
+    """
+    __slots__ = ("main_tag", "tag", "fields", "_pieces", "_end", "_body")
+
+    def __init__(self, main_tag: str, tag: str, pieces: tuple, end: str, fields: dict[str, Any]) -> None:
+        self.main_tag: str = main_tag
+        self.tag: str = tag
+        self.fields: dict[str, Any] = fields
+        self._pieces: tuple = pieces
+        self._end: str = end
+        self._body: Optional[str] = None
+
+    def body(self) -> str:
+        if self._body is None:
+            self._body = self._end.join(map(_format_piece, self._pieces))
+            self._pieces = ()
+        return self._body
+
+    def __str__(self) -> str:
+        return f"[{self.main_tag}::{self.tag}] {self.body()}"
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler.prepare 会在调用方线程格式化消息；同进程队列无需 pickle，直接入队原始记录
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _ForwardHandler(logging.Handler):
+    """
+    分片子进程使用：正文在本进程序列化后交给 forward（发往父进程），由父进程的监听线程写入控制台与文件
+    """
+    def __init__(self, forward: Callable[[dict[str, Any]], None]) -> None:
+        super().__init__()
+        self._forward: Callable[[dict[str, Any]], None] = forward
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = record.msg
+            body = getattr(msg, "body", None)
+            self._forward({
+                "name": record.name,
+                "levelno": record.levelno,
+                "levelname": record.levelname,
+                "created": record.created,
+                "msecs": record.msecs,
+                "process": record.process,
+                "main_tag": msg.main_tag if body is not None else None,
+                "tag": msg.tag if body is not None else None,
+                "fields": msg.fields if body is not None else {},
+                "body": body() if body is not None else record.getMessage(),
+            })
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class _BatchQueueListener:
+    """
+    监听线程：一次取出队列中已有的全部记录（至多 batch_size 条）依次处理，再统一 flush，减少文件写入的系统调用
+    接口与 logging.handlers.QueueListener 相同（start / stop / handlers），但自行维护线程，不依赖其私有实现
+    """
+    batch_size: int = 256
+    _sentinel: None = None
+
+    def __init__(self, queue: Queue, *handlers: logging.Handler, respect_handler_level: bool = False) -> None:
+        self.queue: Queue = queue
+        self.handlers: tuple[logging.Handler, ...] = handlers
+        self.respect_handler_level: bool = respect_handler_level
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            raise RuntimeError("Listener already started")
+        self._thread = threading.Thread(target=self._run, name="log-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        处理完队列中已有的记录后退出
+        """
+        if self._thread is not None:
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+    def handle(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            if not self.respect_handler_level or record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _run(self) -> None:
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except Empty:
+                    break
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+            for handler in self.handlers:
+                try:
+                    handler.flush()
+                except Exception:
+                    pass
+            if stop:
+                break
 
 class Logger:
     _lock = threading.Lock()
-    _listener: Optional[QueueListener] = None
+    _listener: Optional[_BatchQueueListener] = None
     _queue: Optional[Queue] = None
     _instances: weakref.WeakValueDictionary[str, "Logger"] = weakref.WeakValueDictionary()
     
-    def __new__(cls, name: str = __name__, path: str = "app.log"):
+    def __new__(cls, name: str = __name__, path: str = "app.log", **kwargs):
         with cls._lock:
             if name in cls._instances:
                 return cls._instances[name]
@@ -57,25 +375,93 @@ class Logger:
             cls._instances[name] = instance
             return instance
     
-    def __init__(self, name: str = __name__, path: str = "app.log"):
+    def __init__(self,
+                 name: str = __name__,
+                 path: str = "app.log",
+                 *,
+                 rotation: Optional[LogRotation] = None,
+                 console_level: int = logging.DEBUG,
+                 file_level: int = logging.DEBUG,
+                 fmt: str = "text"):
+        """
+        监听线程与输出 handler 由第一个创建的 Logger 决定，rotation、fmt 与各 handler 的级别仅在此时生效
+        fmt 只作用于文件：text 为原有文本行，jsonl / binary 为结构化记录，可用 python -m secplugin.logquery 查询
+        """
         if hasattr(self, '_initialized'):
             return
         self._initialized = True
         
         with Logger._lock:
             if Logger._queue is None:
+                _console_handler.setLevel(console_level)
                 Logger._queue = Queue()
-                Logger._listener = QueueListener(
+                Logger._listener = _BatchQueueListener(
                     Logger._queue, 
                     _console_handler, 
-                    _create_file_handler(path)
+                    _create_file_handler(path, rotation, file_level, fmt),
+                    respect_handler_level=True
                 )
                 Logger._listener.start()
         
         self.logger = logging.getLogger(name)
         self.logger.setLevel(logging.DEBUG)
-        self.logger.addHandler(QueueHandler(Logger._queue))
+        self.logger.addHandler(_DeferredQueueHandler(Logger._queue))
     
+    @classmethod
+    def after_fork(cls, forward: Optional[Callable[[dict[str, Any]], None]] = None):
+        """
+        fork 出的子进程中没有监听线程，换用新队列并重新启动监听
+        传入 forward 时子进程不再直接写控制台与文件，记录交给 forward 发往父进程（见 handle_forwarded），
+        避免多个进程各自轮转同一个文件、交错写入二进制记录
+        """
+        cls._lock = threading.Lock()
+        listener = cls._listener
+        if listener is None:
+            return
+        old_queue = cls._queue
+        cls._queue = Queue()
+        for instance in list(cls._instances.values()):
+            for handler in instance.logger.handlers:
+                if isinstance(handler, QueueHandler) and handler.queue is old_queue:
+                    handler.queue = cls._queue
+        if forward is not None:
+            cls._listener = _BatchQueueListener(cls._queue, _ForwardHandler(forward))
+            cls._listener.start()
+            return
+        for handler in listener.handlers:
+            if isinstance(handler, _RotatingFileHandler):
+                handler.after_fork()
+        cls._listener = _BatchQueueListener(cls._queue, *listener.handlers, respect_handler_level=True)
+        cls._listener.start()
+
+    @classmethod
+    def handle_forwarded(cls, item: dict[str, Any]) -> None:
+        """
+        父进程中写入子进程转发来的记录，可在任意线程调用
+        """
+        q = cls._queue
+        if q is None:
+            return
+        item = dict(item)
+        main_tag, tag, fields, body = item.pop("main_tag"), item.pop("tag"), item.pop("fields"), item.pop("body")
+        record = logging.makeLogRecord(item)
+        record.msg = body if main_tag is None else _LazyMessage(main_tag, tag, (body,), "", fields)
+        q.put_nowait(record)
+
+    @classmethod
+    def pause(cls) -> None:
+        """
+        处理完已入队的记录后停止监听线程，之后的记录留在队列中，resume() 后继续写出；供 fork 前调用
+        """
+        if cls._listener is not None:
+            cls._listener.stop()
+
+    @classmethod
+    def resume(cls) -> None:
+        listener = cls._listener
+        if listener is not None and listener._thread is None:
+            listener.start()
+
     @classmethod
     def shutdown(cls):
         if cls._listener:
@@ -84,39 +470,37 @@ class Logger:
     
     @staticmethod
     def _format_exception(e: Exception) -> str:
-        return ''.join(traceback.format_exception(type(e), e, e.__traceback__)).strip()
+        return _format_exception(e)
     
     @staticmethod
     def get_logger(name: str) -> Self:
         pass
 
-    def log(self, *msg, level=logging.INFO, main_tag="SecPlugin", tag=None, end=" "):
-        if tag is None:
-            tag = f"on{logging.getLevelName(level).capitalize()}Message"
+    def set_level(self, level: int) -> None:
+        self.logger.setLevel(level)
 
-        pieces = []
-        for m in msg:
-            if m is None:
-                pieces.append("null")
-            elif isinstance(m, (dict, list)):
-                pieces.append(json.dumps(m, ensure_ascii=False))
-            elif isinstance(m, Messenger):
-                pieces.append(json.dumps(m.get_list(), ensure_ascii=False))
-            elif isinstance(m, Exception):
-                pieces.append(self._format_exception(m))
-            else:
-                pieces.append(str(m))
+    def is_enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
 
-        self.logger.log(level, f"[{main_tag}::{tag}] {end.join(pieces)}")
+    def log(self, *msg, level=logging.INFO, main_tag="SecPlugin", tag=None, end=" ", **fields):
+        """
+        fields 为结构化字段（account / group / seq / elapsed），文本格式下不输出
+        """
+        # 级别未启用时不做任何格式化；参数序列化推迟到监听线程
+        if not self.logger.isEnabledFor(level):
+            return
+        if tag is None:
+            tag = f"on{logging.getLevelName(level).capitalize()}Message"
+        self.logger.log(level, _LazyMessage(main_tag, tag, msg, end, fields))
 
-    def info(self, *msg, main_tag="SecPlugin", tag=None):
-        self.log(*msg, level=logging.INFO, main_tag=main_tag, tag=tag)
+    def info(self, *msg, main_tag="SecPlugin", tag=None, **fields):
+        self.log(*msg, level=logging.INFO, main_tag=main_tag, tag=tag, **fields)
 
-    def error(self, *msg, main_tag="SecPlugin", tag=None):
-        self.log(*msg, level=logging.ERROR, main_tag=main_tag, tag=tag)
+    def error(self, *msg, main_tag="SecPlugin", tag=None, **fields):
+        self.log(*msg, level=logging.ERROR, main_tag=main_tag, tag=tag, **fields)
 
-    def warning(self, *msg, main_tag="SecPlugin", tag=None):
-        self.log(*msg, level=logging.WARNING, main_tag=main_tag, tag=tag)
+    def warning(self, *msg, main_tag="SecPlugin", tag=None, **fields):
+        self.log(*msg, level=logging.WARNING, main_tag=main_tag, tag=tag, **fields)
 
-    def debug(self, *msg, main_tag="SecPlugin", tag=None):
-        self.log(*msg, level=logging.DEBUG, main_tag=main_tag, tag=tag)
+    def debug(self, *msg, main_tag="SecPlugin", tag=None, **fields):
+        self.log(*msg, level=logging.DEBUG, main_tag=main_tag, tag=tag, **fields)
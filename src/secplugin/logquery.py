@@ -0,0 +1,143 @@
+"""
+结构化日志（jsonl / binary）查询工具
+
+    python -m secplugin.logquery app.log app.log.1.gz --tag-prefix handler: --stats elapsed --by tag
+    python -m secplugin.logquery app.log --level ERROR --count-by group
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import sys
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from .logformat import iter_records
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _parse_level(name: str) -> int:
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise argparse.ArgumentTypeError(f"unknown level '{name}'")
+    return level
+
+
+def _build_filter(args: argparse.Namespace) -> tuple[Callable[[dict[str, Any]], bool], tuple[bytes, ...]]:
+    """
+    返回逐条判断函数，以及可供 jsonl 粗筛的字节子串（只取无需 JSON 转义的值）
+    """
+    exact = {k: v for k, v in (("tag", args.tag), ("account", args.account), ("group", args.group)) if v is not None}
+    needles = tuple(
+        v.encode("utf-8") for v in [*exact.values(), args.tag_prefix or "", args.contains or ""]
+        if v and v.isprintable() and '"' not in v and "\\" not in v
+    )
+
+    def match(record: dict[str, Any]) -> bool:
+        for key, value in exact.items():
+            if str(record.get(key)) != value:
+                return False
+        if args.tag_prefix and not str(record.get("tag", "")).startswith(args.tag_prefix):
+            return False
+        if args.level is not None and _parse_level(record.get("level", "NOTSET")) < args.level:
+            return False
+        if args.seq is not None and record.get("seq") != args.seq:
+            return False
+        ts = record.get("ts") or 0
+        if args.since is not None and ts < args.since:
+            return False
+        if args.until is not None and ts >= args.until:
+            return False
+        if args.contains and args.contains not in record.get("msg", ""):
+            return False
+        return True
+
+    return match, needles
+
+
+def _records(paths: Iterable[str], fmt: str, args: argparse.Namespace) -> Iterator[dict[str, Any]]:
+    match, needles = _build_filter(args)
+    for path in paths:
+        for record in iter_records(path, fmt, needles):
+            if match(record):
+                yield record
+
+
+def _count_by(records: Iterable[dict[str, Any]], field: str) -> list[tuple[str, int]]:
+    counts: dict[str, int] = {}
+    for record in records:
+        key = str(record.get(field))
+        counts[key] = counts.get(key, 0) + 1
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)
+
+
+def _stats_by(records: Iterable[dict[str, Any]], field: str, by: Optional[str]) -> list[dict[str, Any]]:
+    groups: dict[str, list[float]] = {}
+    for record in records:
+        value = record.get(field)
+        if not isinstance(value, (int, float)):
+            continue
+        groups.setdefault(str(record.get(by)) if by else "*", []).append(value)
+    rows = []
+    for key, values in groups.items():
+        values.sort()
+        rows.append({
+            "key": key,
+            "count": len(values),
+            "avg": sum(values) / len(values),
+            "p50": _percentile(values, 0.5),
+            "p90": _percentile(values, 0.9),
+            "p99": _percentile(values, 0.99),
+            "max": values[-1],
+        })
+    rows.sort(key=lambda row: row["p99"], reverse=True)
+    return rows
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m secplugin.logquery", description="Filter and aggregate structured SecPlugin logs")
+    parser.add_argument("paths", nargs="+", help="log files (.gz segments are decompressed in memory)")
+    parser.add_argument("--format", default="auto", choices=("auto", "jsonl", "binary"))
+    parser.add_argument("--tag")
+    parser.add_argument("--tag-prefix")
+    parser.add_argument("--level", type=_parse_level, help="minimum level, e.g. WARNING")
+    parser.add_argument("--account")
+    parser.add_argument("--group")
+    parser.add_argument("--seq", type=int)
+    parser.add_argument("--since", type=float, help="unix timestamp")
+    parser.add_argument("--until", type=float, help="unix timestamp")
+    parser.add_argument("--contains", help="substring of the message")
+    parser.add_argument("--limit", type=int, default=0, help="stop after N matching records (0 = no limit)")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--count-by", metavar="FIELD", help="count matching records per FIELD")
+    action.add_argument("--stats", metavar="FIELD", help="count/avg/p50/p90/p99/max of a numeric FIELD")
+    parser.add_argument("--by", metavar="FIELD", help="group --stats by FIELD")
+    args = parser.parse_args(argv)
+
+    records = _records(args.paths, args.format, args)
+    if args.limit > 0:
+        records = (r for i, r in zip(range(args.limit), records))
+    out = sys.stdout
+    if args.count_by:
+        for key, count in _count_by(records, args.count_by):
+            out.write(f"{count:>10}  {key}\n")
+    elif args.stats:
+        out.write(f"{'key':<32} {'count':>8} {'avg':>10} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}\n")
+        for row in _stats_by(records, args.stats, args.by):
+            out.write(
+                f"{row['key']:<32} {row['count']:>8} {row['avg']:>10.4f} {row['p50']:>10.4f} "
+                f"{row['p90']:>10.4f} {row['p99']:>10.4f} {row['max']:>10.4f}\n"
+            )
+    else:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except BrokenPipeError:
+        sys.exit(0)
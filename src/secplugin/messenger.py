@@ -1,20 +1,30 @@
 from __future__ import annotations
 import json
+from bisect import insort
 from typing import Any, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .sender import Sender
 
-from .msg import Msg
+from .msg import Msg, MENTION_TAGS, MENTION_TARGET_TAGS, MULTI_TAGS, chat_type
 
 class Messenger:
+    __slots__ = ("list", "_sender", "_in_with", "_index", "_index_len", "_shared")
+
     def __init__(self, data: Optional[str | Messenger | list[dict[str, str]]] = None, sender: Optional[Sender] = None) -> None:
         self.list: list[dict[str, str]] = []
+        # tag -> 含该 tag 的段下标（升序），按 tag 首次查询时扫描并缓存，修改时增量维护或失效
+        # 段字典与其他 Messenger 共享或经 get_list() 交给调用方后可能被外部修改，此后不再缓存，每次重新扫描
+        self._index: Optional[dict[str, list[int]]] = None
+        self._index_len: int = 0
+        self._shared: bool = False
         if data is not None:
             if isinstance(data, str):
                 self.add_msg(data)
             elif isinstance(data, Messenger):
                 self.list.extend(data.list)
+                self._share()
+                data._share()
             elif isinstance(data, list):
                 if data is not None:
                     self.list.extend(data)
@@ -27,13 +37,65 @@ class Messenger:
         else:
             return self._get_by_tag(tag, default)
 
+    def _share(self) -> None:
+        self._shared = True
+        self._index = None
+
+    def _positions(self, tag: str) -> list[int]:
+        msg_list = self.list
+        if self._shared:
+            return [i for i, map_dict in enumerate(msg_list) if tag in map_dict]
+        index = self._index
+        # 构造时传入的 list 仍可能被来源修改：长度变化时整体失效，命中时逐个校验
+        if index is None or self._index_len != len(msg_list):
+            index = self._index = {}
+            self._index_len = len(msg_list)
+        positions = index.get(tag)
+        if positions:
+            for i in positions:
+                if tag not in msg_list[i]:
+                    positions = None
+                    break
+        if not positions:
+            positions = index[tag] = []
+            i = 0
+            for map_dict in msg_list:
+                if tag in map_dict:
+                    positions.append(i)
+                i += 1
+        return positions
+
+    def _index_add(self, tag: str, position: int, appended: bool = False) -> None:
+        index = self._index
+        if index is None:
+            return
+        if self._index_len != len(self.list) - appended:
+            self._index = None
+            return
+        self._index_len = len(self.list)
+        positions = index.get(tag)
+        if positions is None:
+            return
+        if not positions or positions[-1] < position:
+            positions.append(position)
+        else:
+            insort(positions, position)
+
     def _get_by_tag(self, tag: str, default: Any = "0") -> Any:
-        data = ""
-        msg_list = self.get_list(tag)
-        for msg in msg_list:
-            if isinstance(msg, dict):
-                msg = json.dumps(msg)
-            data += msg
+        positions = self._positions(tag)
+        if not positions:
+            return default
+        msg_list = self.list
+        if len(positions) == 1:
+            data = msg_list[positions[0]][tag]
+            if isinstance(data, dict):
+                data = json.dumps(data)
+        else:
+            values = [msg_list[i][tag] for i in positions]
+            try:
+                data = "".join(values)
+            except TypeError:
+                data = "".join([json.dumps(v) if isinstance(v, dict) else v for v in values])
         return data if len(data) > 0 else default
 
     def _get_by_index(self, index: int, tag: str, default: Any = "0") -> Any:
@@ -47,13 +109,12 @@ class Messenger:
 
     def get_list(self, tag: Optional[str] = None) -> list[dict[str, str]] | list[str]:
         if tag is None:
+            # 调用方可能原地修改返回的段
+            self._share()
             return self.list
         else:
-            result_list = []
-            for map_dict in self.list:
-                if tag in map_dict:
-                    result_list.append(map_dict[tag])
-            return result_list
+            msg_list = self.list
+            return [msg_list[i][tag] for i in self._positions(tag)]
 
     def size(self, tag: Optional[str] = None, all = False) -> int:
         if tag is None:
@@ -65,13 +126,15 @@ class Messenger:
             else:
                 return len(self.list)
         else:
-            count = 0
-            for map_dict in self.list:
-                if tag in map_dict:
-                    count += 1
-            return count
+            return len(self._positions(tag))
 
     def has_msg(self, tag: str) -> bool:
+        index = self._index
+        if index is not None and self._index_len == len(self.list):
+            positions = index.get(tag)
+            if positions and tag in self.list[positions[0]]:
+                return True
+        # 未缓存时提前退出的扫描比完整建位置表更便宜
         for map_dict in self.list:
             if tag in map_dict:
                 return True
@@ -79,7 +142,11 @@ class Messenger:
 
     def insert(self, index: int, tag: str, value: str) -> Messenger:
         if 0 <= index < len(self.list):
-            self.list[index][tag] = value
+            map_dict = self.list[index]
+            is_new = tag not in map_dict
+            map_dict[tag] = value
+            if is_new:
+                self._index_add(tag, index)
         return self
 
     def add_msg(self,
@@ -92,9 +159,12 @@ class Messenger:
         if isinstance(tag, Messenger):
             if tag is not None:
                 self.add_msg(tag.list)
+                tag._share()
             return self
         elif isinstance(tag, list):
+            # 段字典可能仍被来源持有
             self.list.extend(tag)
+            self._share()
             return self
         elif isinstance(tag, dict):
             if tag is not None:
@@ -107,41 +177,41 @@ class Messenger:
         tag = str(tag)
         value = str(value) if value is not None else ""
 
-        if tag == Msg.AtUin or tag == Msg.AtName or tag == Msg.AtAll:
-            if tag == Msg.AtAll:
-                pass
-            else:
+        if tag in MENTION_TAGS:
+            # AtUin 与 AtName 合并到只含其一的段中，AtAll 总是单独成段
+            if tag != Msg.AtAll:
                 for map_dict in self.list:
-                    if len(map_dict) == 1 and (Msg.AtUin in map_dict or Msg.AtName in map_dict):
+                    if len(map_dict) == 1 and not MENTION_TARGET_TAGS.isdisjoint(map_dict):
                         if tag not in map_dict:
                             map_dict[tag] = value
+                            self._index = None
                             return self
-        else:
-            if tag == Msg.Text or tag == Msg.Img or tag == Msg.Gif or tag == Msg.Emoid:
-                pass
-            else:
-                for map_dict in self.list:
-                    if tag not in map_dict:
-                        map_dict[tag] = value
-                        return self
+        elif tag not in MULTI_TAGS:
+            for map_dict in self.list:
+                if tag not in map_dict:
+                    map_dict[tag] = value
+                    self._index = None
+                    return self
 
         map_dict = {tag: value}
         self.list.append(map_dict)
+        if self._index is not None:
+            self._index_add(tag, len(self.list) - 1, appended=True)
         return self
 
     def add_args(self, tag: str, *values) -> Messenger:
-        append = ""
-        for s in values:
-            append += str(s)
-        return self.add_msg(tag, append)
+        return self.add_msg(tag, "".join(str(s) for s in values))
 
     def del_msg(self, tag: Optional[str] = None) -> Messenger:
         if tag is None:
             self.list.clear()
+            self._index = None if self._shared else {}
+            self._index_len = 0
         else:
-            for map_dict in self.list:
-                if tag in map_dict:
-                    del map_dict[tag]
+            positions = self._positions(tag)
+            for i in positions:
+                del self.list[i][tag]
+            positions.clear()
         return self
 
     @staticmethod
@@ -168,17 +238,21 @@ class Messenger:
 
     @staticmethod
     def get_msg_type(messenger: Messenger) -> Optional[str]:
-        type = None
-        if messenger and isinstance(messenger, Messenger) and messenger.get_list():
-            if messenger.has_msg(Msg.Group):
-                type = Msg.Group
-            elif messenger.has_msg(Msg.Friend):
-                type = Msg.Friend
-            elif messenger.has_msg(Msg.Temp):
-                type = Msg.Temp
-            elif messenger.has_msg(Msg.Guild):
-                type = Msg.Guild
-        return type
+        if messenger and isinstance(messenger, Messenger):
+            return chat_type(messenger.list)
+        return None
+
+    def __getstate__(self) -> list[dict[str, str]]:
+        # 跨进程传递时只保留消息内容，不携带 sender 与索引
+        return self.list
+
+    def __setstate__(self, state: list[dict[str, str]]) -> None:
+        self.list = state
+        self._sender = None
+        self._in_with = False
+        self._index = None
+        self._index_len = 0
+        self._shared = False
 
     def __len__(self) -> int:
         return self.size()
@@ -0,0 +1,342 @@
+from __future__ import annotations
+import abc
+import asyncio
+from bisect import bisect_left
+from typing import Any, Callable, Iterator, Optional
+
+# 默认耗时桶（秒）
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    kind: str = ""
+
+    def __init__(self, name: str, help: str = "", labelnames: tuple[str, ...] = ()) -> None:
+        self.name: str = name
+        self.help: str = help
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+        self._children: dict[tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"Expected {len(self.labelnames)} label values for '{self.name}'")
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self) -> Any:
+        ...
+
+    def _series(self) -> Iterator[tuple[tuple[str, ...], Any]]:
+        if self.labelnames:
+            yield from list(self._children.items())
+        else:
+            yield (), self
+
+    @abc.abstractmethod
+    def collect(self) -> Any:
+        ...
+
+    @abc.abstractmethod
+    def expose(self) -> list[str]:
+        ...
+
+    def take(self) -> list[tuple]:
+        """
+        取出自上次 take 以来的增量并清零，供分片子进程上报给父进程
+        """
+        return []
+
+    def merge(self, items: list[tuple]) -> None:
+        pass
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = "", labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.value: float = 0
+
+    def _new_child(self) -> Counter:
+        return Counter(self.name)
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def collect(self) -> Any:
+        if self.labelnames:
+            return {",".join(values): child.value for values, child in self._children.items()}
+        return self.value
+
+    def take(self) -> list[tuple]:
+        items = []
+        for values, child in self._series():
+            if child.value:
+                items.append((values, child.value))
+                child.value = 0
+        return items
+
+    def merge(self, items: list[tuple]) -> None:
+        for values, value in items:
+            (self.labels(*values) if self.labelnames else self).inc(value)
+
+    def expose(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self._series()
+        ]
+
+
+class Gauge(_Metric):
+    """
+    拉取时才调用 func 取值，不在热路径上产生任何开销
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str = "", func: Optional[Callable[[], float]] = None) -> None:
+        super().__init__(name, help)
+        self._func: Optional[Callable[[], float]] = func
+        self.value: float = 0
+
+    def labels(self, *values: str) -> Any:
+        raise TypeError(f"Gauge '{self.name}' does not support labels")
+
+    def _new_child(self) -> Any:
+        raise TypeError(f"Gauge '{self.name}' does not support labels")
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def get(self) -> float:
+        return self._func() if self._func is not None else self.value
+
+    def collect(self) -> Any:
+        return self.get()
+
+    def expose(self) -> list[str]:
+        return [f"{self.name} {_format_value(self.get())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self,
+                 name: str,
+                 help: str = "",
+                 labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0
+        self.count: int = 0
+
+    def _new_child(self) -> Histogram:
+        return Histogram(self.name, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def _summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0,
+            "buckets": dict(zip([*self.buckets, float("inf")], self.counts)),
+        }
+
+    def collect(self) -> Any:
+        if self.labelnames:
+            return {",".join(values): child._summary() for values, child in self._children.items()}
+        return self._summary()
+
+    def take(self) -> list[tuple]:
+        items = []
+        for values, child in self._series():
+            if child.count:
+                items.append((values, child.counts, child.sum, child.count))
+                child.counts = [0] * len(child.counts)
+                child.sum = 0
+                child.count = 0
+        return items
+
+    def merge(self, items: list[tuple]) -> None:
+        for values, counts, total, count in items:
+            child = self.labels(*values) if self.labelnames else self
+            child.counts = [a + b for a, b in zip(child.counts, counts)]
+            child.sum += total
+            child.count += count
+
+    def expose(self) -> list[str]:
+        lines = []
+        for values, child in self._series():
+            cumulative = 0
+            for bound, count in zip([*child.buckets, float("inf")], child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "secplugin") -> None:
+        self._prefix: str = prefix
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric '{metric.name}'")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str = "", labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(f"{self._prefix}_{name}_total", help, labelnames))
+
+    def gauge(self, name: str, help: str = "", func: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(f"{self._prefix}_{name}", help, func))
+
+    def histogram(self,
+                  name: str,
+                  help: str = "",
+                  labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(f"{self._prefix}_{name}", help, labelnames, buckets))
+
+    def take(self, names: tuple[str, ...]) -> dict[str, list[tuple]]:
+        """
+        取出指定指标的增量（可 pickle），names 为注册后的完整指标名
+        """
+        taken = {}
+        for name in names:
+            items = self._metrics[name].take()
+            if items:
+                taken[name] = items
+        return taken
+
+    def merge(self, taken: dict[str, list[tuple]]) -> None:
+        """
+        累加其他进程 take() 的结果，未注册的指标忽略
+        """
+        for name, items in taken.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(items)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {name: metric.collect() for name, metric in self._metrics.items()}
+
+    def to_prometheus(self) -> str:
+        """
+        Prometheus 文本格式（0.0.4）
+        """
+        lines = []
+        for metric in self._metrics.values():
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+class PluginMetrics:
+    """
+    Plugin 分发链路上的指标；未启用时 Plugin 不持有该对象，热路径上只多一次 None 判断
+    """
+    def __init__(self, registry: Optional[MetricsRegistry] = None) -> None:
+        self.registry: MetricsRegistry = registry or MetricsRegistry()
+        r = self.registry
+        self.frames_received: Counter = r.counter("frames_received", "Frames received from the backend", ("cmd",))
+        self.frames_invalid: Counter = r.counter("frames_invalid", "Frames that failed to decode")
+        self.decode_seconds: Histogram = r.histogram("decode_seconds", "Frame decode time")
+        self.match_seconds: Histogram = r.histogram("match_seconds", "Handler regex matching time per message")
+        self.handler_seconds: Histogram = r.histogram("handler_seconds", "Handler run time", ("handler",))
+        self.handler_errors: Counter = r.counter("handler_errors", "Handler failures", ("handler",))
+        self.frames_sent: Counter = r.counter("frames_sent", "Frames sent to the backend", ("cmd",))
+        self.send_timeouts: Counter = r.counter("send_timeouts", "Requests without a response in time", ("cmd",))
+        self.response_seconds: Histogram = r.histogram("response_seconds", "Request to response latency", ("cmd",))
+        self.responses_unmatched: Counter = r.counter("responses_unmatched", "Responses with no waiting request")
+
+    def take_shard(self) -> dict[str, list[tuple]]:
+        """
+        分片子进程中记录的指标（匹配与处理器）增量，随心跳上报父进程后由 merge_shard 累加
+        """
+        return self.registry.take((self.match_seconds.name, self.handler_seconds.name, self.handler_errors.name))
+
+    def merge_shard(self, taken: dict[str, list[tuple]]) -> None:
+        self.registry.merge(taken)
+
+
+class MetricsExporter:
+    """
+    以本地 HTTP 端点提供 Prometheus 文本格式：GET /metrics
+    """
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464) -> None:
+        self._registry: MetricsRegistry = registry
+        self._host: str = host
+        self._port: int = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self._host, self._port)
+
+    def port(self) -> Optional[int]:
+        if self._server is None or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    def url(self) -> str:
+        return f"http://{self._host}:{self.port()}/metrics"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", self._registry.to_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"Not Found\n", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -1,3 +1,6 @@
+from enum import IntFlag
+from typing import Any, Iterable, Optional
+
 
 class Msg:
     AtAll = "AtAll"  # 艾特全体成员
@@ -215,3 +218,82 @@ class Msg:
 
     CM_WH = "WH"  # 官方人机 回调模式 WebHook
     CM_WS = "WS"  # 官方人机 回调模式 WebSocket
+
+
+# ---- tag 注册表 ----
+# Msg 保持纯字符串常量（与协议一致），下面的表在导入时一次性构建，供热路径做 O(1) 判断
+
+class TagCategory(IntFlag):
+    Chat = 1  # 会话类型：Group / Friend / Temp / Guild
+    Mention = 2  # 艾特
+    Media = 4  # 图片、语音、视频等媒体
+    Multi = 8  # 可重复出现，每次单独成段
+
+
+# 编号 -> tag：Msg 中定义的全部 tag，按定义顺序去重；上线类型（GM_*）与回调模式（CM_*）是取值而非 tag，不编号
+# 编号表在 SyncOicq 中随 encodings 发给对端，只在协商它的连接内生效；
+# 新增 tag 须追加在 Msg 末尾（tests/test_msg.py 固定了现有编号），否则之后的编号整体后移
+TAGS: tuple[str, ...] = tuple(dict.fromkeys(
+    value for name, value in vars(Msg).items()
+    if not name.startswith(("_", "GM_", "CM_")) and isinstance(value, str)
+))
+# tag -> 编号
+TAG_CODES: dict[str, int] = {tag: code for code, tag in enumerate(TAGS)}
+
+# 会话类型，按优先级排列：同一条消息出现多种时取靠前的
+CHAT_TYPES: tuple[str, ...] = (Msg.Group, Msg.Friend, Msg.Temp, Msg.Guild)
+CHAT_TAGS: frozenset[str] = frozenset(CHAT_TYPES)
+MENTION_TAGS: frozenset[str] = frozenset({Msg.AtUin, Msg.AtName, Msg.AtAll})
+# AtUin 与 AtName 合并在同一段中
+MENTION_TARGET_TAGS: frozenset[str] = frozenset({Msg.AtUin, Msg.AtName})
+MEDIA_TAGS: frozenset[str] = frozenset({
+    Msg.Img, Msg.Gif, Msg.Flash, Msg.Ptt, Msg.Audio, Msg.Video, Msg.File,
+})
+MULTI_TAGS: frozenset[str] = frozenset({Msg.Text, Msg.Img, Msg.Gif, Msg.Emoid})
+
+
+def _categories() -> dict[str, TagCategory]:
+    categories: dict[str, TagCategory] = {}
+    for category, tags in (
+        (TagCategory.Chat, CHAT_TAGS),
+        (TagCategory.Mention, MENTION_TAGS),
+        (TagCategory.Media, MEDIA_TAGS),
+        (TagCategory.Multi, MULTI_TAGS),
+    ):
+        for tag in tags:
+            categories[tag] = categories.get(tag, TagCategory(0)) | category
+    return categories
+
+
+TAG_CATEGORIES: dict[str, TagCategory] = _categories()
+
+
+def tag_code(tag: str) -> Optional[int]:
+    """
+    tag 的编号，未收录时为 None
+    """
+    return TAG_CODES.get(tag)
+
+
+def tag_category(tag: str) -> TagCategory:
+    """
+    tag 所属的分类，可按位组合判断，如 tag_category(Msg.Img) & TagCategory.Media
+    """
+    return TAG_CATEGORIES.get(tag, TagCategory(0))
+
+
+def chat_type(data: Iterable[dict[str, Any]]) -> Optional[str]:
+    """
+    消息段列表的会话类型，一次遍历；多种并存时按 CHAT_TYPES 的优先级取
+    """
+    found = len(CHAT_TYPES)
+    for map_dict in data:
+        if CHAT_TAGS.isdisjoint(map_dict):
+            continue
+        for rank in range(found):
+            if CHAT_TYPES[rank] in map_dict:
+                found = rank
+                break
+        if found == 0:
+            break
+    return CHAT_TYPES[found] if found < len(CHAT_TYPES) else None
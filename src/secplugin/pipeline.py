@@ -0,0 +1,96 @@
+from __future__ import annotations
+import asyncio
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Optional
+
+
+class Backpressure(str, Enum):
+    Block = "block"  # 队列满时读循环等待（有请求等待响应时除外，见 DispatchQueue.put）
+    DropOldest = "drop_oldest"  # 丢弃最早入队的消息
+    Shed = "shed"  # 丢弃新消息并计数
+
+
+class DispatchQueue:
+    def __init__(self, maxsize: int = 1024, policy: Backpressure | str = Backpressure.Block) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._policy: Backpressure = Backpressure(policy)
+        # Block 策略下队列已满时新消息按序暂存于此，由 _feed 依次放入队列
+        self._overflow: deque = deque()
+        self._feeder: Optional[asyncio.Task] = None
+        self._moved: asyncio.Event = asyncio.Event()
+        self.enqueued: int = 0
+        self.dropped: int = 0
+        self.shed: int = 0
+
+    def get_policy(self) -> Backpressure:
+        return self._policy
+
+    async def put(self, item: Any, awaiting: Optional[Callable[[], Any]] = None) -> bool:
+        """
+        返回 False 表示该消息被丢弃（Shed 策略下队列已满）
+        Block 策略下队列满时消息先进入暂存区，暂存区也满时才等待；awaiting() 为真（读循环所在连接上有请求在等待响应）
+        时不等待，否则响应帧排在推送帧之后读不到，等待响应的处理器与队列互相等待
+        """
+        queue = self._queue
+        if self._policy is Backpressure.Block and (queue.full() or self._overflow):
+            self._overflow.append(item)
+            self.enqueued += 1
+            if self._feeder is None or self._feeder.done():
+                self._feeder = asyncio.get_running_loop().create_task(self._feed(), name="dispatch-overflow")
+            while len(self._overflow) >= queue.maxsize and not (awaiting is not None and awaiting()):
+                self._moved.clear()
+                try:
+                    # 定期醒来检查 awaiting()：等待期间处理器可能发出新的请求
+                    await asyncio.wait_for(self._moved.wait(), 0.05)
+                except asyncio.TimeoutError:
+                    pass
+            return True
+        if queue.full():
+            if self._policy is Backpressure.Shed:
+                self.shed += 1
+                return False
+            if self._policy is Backpressure.DropOldest:
+                try:
+                    queue.get_nowait()
+                    queue.task_done()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+        queue.put_nowait(item)
+        self.enqueued += 1
+        return True
+
+    async def _feed(self) -> None:
+        overflow, queue = self._overflow, self._queue
+        while overflow:
+            await queue.put(overflow[0])
+            overflow.popleft()
+            self._moved.set()
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+    def task_done(self) -> None:
+        self._queue.task_done()
+
+    def qsize(self) -> int:
+        return self._queue.qsize() + len(self._overflow)
+
+    async def join(self) -> None:
+        while self._overflow and self._feeder is not None and not self._feeder.done():
+            await asyncio.shield(self._feeder)
+        await self._queue.join()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "policy": self._policy.value,
+            "size": self._queue.qsize(),
+            "overflow": len(self._overflow),
+            "maxsize": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "shed": self.shed,
+        }
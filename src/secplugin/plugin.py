@@ -1,14 +1,13 @@
 from __future__ import annotations
 from concurrent.futures import ThreadPoolExecutor
-import json
 import asyncio
-from typing import Any, Callable, Optional, TYPE_CHECKING
+from typing import Any, Callable, Iterable, Optional, TYPE_CHECKING
 try:
     import websockets # type: ignore
 except ImportError:
     raise ImportError("Missing dependency 'websockets'. Please install it via 'pip install websockets'.")
 
-from websockets.exceptions import ConnectionClosedError
+from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
 if TYPE_CHECKING:
     try:
         # websockets>=10
@@ -18,19 +17,36 @@ if TYPE_CHECKING:
         from websockets.client import WebSocketClientProtocol  # type: ignore
 
 import re
+import importlib
 import inspect
+import logging
+import os
 import random
+import signal
+import sys
+import time
 
 from .cmd import Cmd
+from .codec import JsonCodec, MsgpackCodec, get_codec
+from .connection import Connection
+from .dispatcher import HandlerEntry, RegexDispatcher
 from .messenger import Messenger
+from .metrics import MetricsExporter, PluginMetrics
 from .msg import Msg
-from .logger import Logger
-from .reload import HotReload
-from .sender import Sender
+from .logger import LogRotation, Logger
+from .pipeline import Backpressure, DispatchQueue
+from .process import ProcessRunner
+from .profiler import HandlerProfiler
+from .reload import DEFAULT_EXCLUDE, DEFAULT_INCLUDE, HotReload
+from .routing import RoutingInfo
+from .scheduler import Priority, RateLimit, SendScheduler
+from .sender import Sender, invalidates_cache
+from .shard import ShardLink, ShardPool
+from .tasks import HandlerTaskGroup
 
 class Plugin:
     def __init__(self,
-                 url: str = "ws://127.0.0.1:24804",
+                 url: str | list[str] = "ws://127.0.0.1:24804",
                  pid: str = "io.github.sumaroder.secplugin",
                  name: str = "SecPlugin",
                  token: str = "SecretToken",
@@ -38,97 +54,410 @@ class Plugin:
                  max_workers: int = 4,
                  allow_thread: bool = False,
                  reload: bool = True,
+                 reload_mode: str = "restart",
+                 reload_include: Optional[tuple[str, ...]] = None,
+                 reload_exclude: Optional[tuple[str, ...]] = None,
                  max_retry: int = 5,
-                 log_path: Optional[str] = "app.log"
+                 reconnect_base: float = 1,
+                 reconnect_max: float = 60,
+                 send_buffer_size: int = 1024,
+                 send_buffer_timeout: float = 30,
+                 heartbeat_interval: Optional[float] = None,
+                 heartbeat_timeout: Optional[float] = None,
+                 heartbeat_max_misses: int = 3,
+                 metrics: bool = False,
+                 metrics_host: str = "127.0.0.1",
+                 metrics_port: Optional[int] = None,
+                 profile: bool = False,
+                 slow_handler_threshold: float = 1.0,
+                 profile_report_interval: Optional[float] = None,
+                 profile_top: int = 10,
+                 max_in_flight: int = 64,
+                 dispatch_queue_size: int = 1024,
+                 backpressure: Backpressure | str = Backpressure.Block,
+                 max_pending_tasks: int = 1024,
+                 drain_timeout: float = 5,
+                 codec: Optional[JsonCodec | str] = None,
+                 encoding: Optional[str] = None,
+                 compression: Optional[str] = "deflate",
+                 compression_options: Optional[dict[str, Any]] = None,
+                 lazy_decode: bool = True,
+                 cache_ttl: float = 60,
+                 account_rate_limit: Optional[RateLimit] = None,
+                 target_rate_limit: Optional[RateLimit] = None,
+                 coalesce_text: bool = False,
+                 shards: int = 0,
+                 shard_by: str = Msg.GroupId,
+                 shard_heartbeat: float = 5,
+                 shard_heartbeat_timeout: float = 30,
+                 process_workers: Optional[int] = None,
+                 process_initializer: Optional[Callable[..., Any]] = None,
+                 process_initargs: tuple = (),
+                 log_path: Optional[str] = "app.log",
+                 log_level: int = logging.DEBUG,
+                 log_rotation: Optional[LogRotation] = None,
+                 log_console_level: int = logging.DEBUG,
+                 log_file_level: int = logging.DEBUG,
+                 log_format: str = "text",
+                 log_handler_time: bool = False,
+                 frame_log_sample: int = 1
     ) -> None:
         self._reload: bool = reload
+        # inprocess：只重新导入变化的处理器模块并重新注册其处理器，失败时回退到重启进程
+        if reload_mode not in ("restart", "inprocess"):
+            raise ValueError(f"Unknown reload_mode '{reload_mode}', expected 'restart' or 'inprocess'")
+        self._reload_mode: str = reload_mode
+        self._reload_include: tuple[str, ...] = reload_include or DEFAULT_INCLUDE
+        self._reload_exclude: tuple[str, ...] = reload_exclude or DEFAULT_EXCLUDE
         self._max_retry: int = max_retry
+        self._reconnect_base: float = reconnect_base
+        self._reconnect_max: float = reconnect_max
+        self._send_buffer_size: int = send_buffer_size
+        self._send_buffer_timeout: float = send_buffer_timeout
+        # 应用层心跳，默认关闭；连续 heartbeat_max_misses 次超时视为半开连接并强制重连
+        self._heartbeat_interval: Optional[float] = heartbeat_interval
+        self._heartbeat_timeout: Optional[float] = heartbeat_timeout
+        self._heartbeat_max_misses: int = heartbeat_max_misses
         self._allow_thread: bool = allow_thread
         self._max_workers: int = max_workers
 
-        self._ws_url: str = url
+        # 可同时连接多个后端，出站消息按 Msg.Account 路由到收到该账号消息的连接
+        self._ws_urls: list[str] = [url] if isinstance(url, str) else list(url)
+        if not self._ws_urls:
+            raise ValueError("At least one url is required")
+        self._ws_url: str = self._ws_urls[0]
         self._plugin_pid: str = pid
         self._plugin_name: str = name
         self._plugin_token: str = token
         
         self._running: bool = False
-        self._ws: Optional[WebSocketClientProtocol] = None
-        self._seq: int = 0
-        self._pending_responses: dict[int, asyncio.Future] = {}
+        self._stopped: bool = False
+        self._max_in_flight: int = max_in_flight
+        self._connections: list[Connection] = [Connection(u, max_in_flight) for u in self._ws_urls]
+        self._account_routes: dict[str, Connection] = {}
+        self._codec: JsonCodec = get_codec(codec)
+        # encoding="msgpack" 时在 SyncOicq 中提议二进制编码，对端不支持时继续使用 JSON
+        if encoding not in (None, "json", "msgpack"):
+            raise ValueError(f"Unknown encoding '{encoding}', expected 'json' or 'msgpack'")
+        self._binary_codec: Optional[MsgpackCodec] = MsgpackCodec(self._codec) if encoding == "msgpack" else None
+        # permessage-deflate：compression=None 关闭；compression_options 为 ClientPerMessageDeflateFactory 的参数
+        if compression not in (None, "deflate"):
+            raise ValueError(f"Unknown compression '{compression}', expected 'deflate' or None")
+        self._connect_options: dict[str, Any] = {"compression": compression}
+        if compression is not None and compression_options is not None:
+            from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+            self._connect_options = {
+                "compression": None,
+                "extensions": [ClientPerMessageDeflateFactory(**compression_options)],
+            }
         self._executor: Optional[ThreadPoolExecutor] = None
-        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(self._max_workers)
+        self._max_pending_tasks: int = max_pending_tasks
+        self._task_group: HandlerTaskGroup = HandlerTaskGroup(self._max_workers, max_pending_tasks, self._on_handler_error)
+        self._drain_timeout: float = drain_timeout
         self._on_msg_handler_lock: asyncio.Lock = asyncio.Lock()
-        self._on_send_wait_lock: asyncio.Lock = asyncio.Lock()
+        self._dispatch_queue_size: int = dispatch_queue_size
+        self._backpressure: Backpressure = Backpressure(backpressure)
+        self._dispatch_queue: DispatchQueue = DispatchQueue(dispatch_queue_size, backpressure)
+        self._dispatch_workers: list[asyncio.Task] = []
+        self._lazy_decode: bool = lazy_decode
         self._log_path: Optional[str] = log_path
+        # 两个输出都不要的级别在 Logger 上直接过滤，避免构造记录后再被 handler 丢弃
+        self._log_level: int = max(log_level, min(log_console_level, log_file_level))
+        self._log_options: dict[str, Any] = {
+            "rotation": log_rotation,
+            "console_level": log_console_level,
+            "file_level": log_file_level,
+            "fmt": log_format,
+        }
+        # 每次处理器调用记录一条 tag 为 handler:<名称> 的 DEBUG 日志（含 elapsed/account/group），配合结构化格式查询
+        self._log_handler_time: bool = log_handler_time
+        # 每 frame_log_sample 帧记录一次原始入站帧（DEBUG），0 为不记录
+        if frame_log_sample < 0:
+            raise ValueError("frame_log_sample must be >= 0")
+        self._frame_log_sample: int = frame_log_sample
+        self._frame_log_count: int = 0
         if log_path is not None:
-            self._logger: Logger = Logger(name = __name__, path = log_path)
+            self._logger: Logger = Logger(name = __name__, path = log_path, **self._log_options)
+            self._logger.set_level(self._log_level)
         self._sender: Optional[Sender] = None
-        self._on_msg_regex_handlers: dict[re.Pattern, tuple[Callable[..., Any], int]] = {}
-        self._on_all_msg_handlers: list[tuple[Callable[..., Any], int]] = []
+        self._cache_ttl: float = cache_ttl
+        self._scheduler: Optional[SendScheduler] = None
+        if account_rate_limit is not None or target_rate_limit is not None or coalesce_text:
+            self._scheduler = SendScheduler(
+                lambda messenger, rsp, timeout: self._send_ws_msg(Cmd.SendOicqMsg, messenger, rsp, timeout),
+                account_rate_limit,
+                target_rate_limit,
+                coalesce_text=coalesce_text,
+            )
+        # 分片模式：父进程持有连接并按 shard_by 把推送消息分发到 shards 个子进程
+        self._shards: int = shards
+        self._shard_by: str = shard_by
+        self._shard_heartbeat: float = shard_heartbeat
+        self._shard_heartbeat_timeout: float = shard_heartbeat_timeout
+        self._shard_pool: Optional[ShardPool] = None
+        self._shard_link: Optional[ShardLink] = None
+        # main() 所在的事件循环，供 stop() 从其他线程调用
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # executor="process" 的处理器共用的进程池，首次注册此类处理器时创建
+        self._process_runner: Optional[ProcessRunner] = None
+        self._process_workers: Optional[int] = process_workers
+        self._process_initializer: Optional[Callable[..., Any]] = process_initializer
+        self._process_initargs: tuple = process_initargs
+        self._dispatcher: RegexDispatcher = RegexDispatcher()
+        self._on_all_msg_handlers: list[HandlerEntry] = []
+        # 有处理器设置了 msg_type / group 过滤时才逐个判断，否则分发路径不变
+        self._route_filters: bool = False
         self._local_send_wait_timeout: float = 15
+        # 指标默认关闭，关闭时各埋点只多一次 None 判断；设置 metrics_port 时同时提供 Prometheus 端点
+        # 分片模式下子进程的匹配与处理器指标随心跳累加到父进程（最多滞后 shard_heartbeat 秒），
+        # 各分片的队列与任务数见 get_shard_stats()，父进程的对应 gauge 不含子进程
+        self._metrics: Optional[PluginMetrics] = None
+        self._metrics_exporter: Optional[MetricsExporter] = None
+        if metrics or metrics_port is not None:
+            self._metrics = PluginMetrics()
+            registry = self._metrics.registry
+            registry.gauge("dispatch_queue_depth", "Messages waiting for dispatch", lambda: self._dispatch_queue.qsize())
+            registry.gauge("handler_tasks_queued", "Handler tasks waiting for a slot", lambda: self._task_group.queued)
+            registry.gauge("handler_tasks_running", "Handler tasks running", lambda: self._task_group.running)
+            registry.gauge("pending_responses", "Requests waiting for a response", self.get_in_flight)
+            registry.gauge(
+                "send_queue_depth", "Messages waiting in the send scheduler",
+                lambda: self._scheduler.depth() if self._scheduler is not None else 0,
+            )
+            if metrics_port is not None:
+                self._metrics_exporter = MetricsExporter(registry, metrics_host, metrics_port)
+        # 处理器级性能分析，默认关闭
+        self._profiler: Optional[HandlerProfiler] = None
+        self._profile_report_interval: Optional[float] = profile_report_interval
+        self._profile_report_task: Optional[asyncio.Task] = None
+        if profile:
+            self._profiler = HandlerProfiler(self.get_logger, slow_handler_threshold, profile_top)
     
     async def main(self):
+        self._loop = asyncio.get_running_loop()
         if self._reload:
             try:
-                HotReload.enable()
-                self._logger.info(f"热重载服务启动成功", tag="reload")
+                HotReload.enable(
+                    on_change=self._reload_changed if self._reload_mode == "inprocess" else None,
+                    include=self._reload_include,
+                    exclude=self._reload_exclude,
+                )
+                self._logger.info(f"热重载服务启动成功，监听 {len(HotReload.directories)} 个目录", tag="reload")
             except Exception as e:
                 self._logger.error(f"热重载服务启动失败", e, tag="reload")
         
-        self._logger.debug(f"开始连接 {self._ws_url}", tag="connect")
-        retry_cnt = 0
-        while retry_cnt <= self._max_retry:
+        if self._process_runner is not None and self._shard_pool is None:
+            await self._start_process_runner()
+        
+        if self._metrics_exporter is not None:
+            try:
+                await self._metrics_exporter.start()
+                self._logger.info(f"指标端点已启动 {self._metrics_exporter.url()}", tag="metrics")
+            except OSError as e:
+                self._logger.error("指标端点启动失败", e, tag="metrics")
+        
+        self._start_dispatch_workers()
+        if self._shard_pool is not None:
+            self._shard_pool.attach(asyncio.get_running_loop())
+        if self._profiler is not None and self._profile_report_interval:
+            self._profile_report_task = asyncio.create_task(self._profile_report_loop(), name="profile-report")
+        try:
+            await asyncio.gather(*(self._connection_loop(connection) for connection in self._connections))
+        finally:
+            await self.close()
+    
+    async def _connection_loop(self, connection: Connection) -> None:
+        """
+        维持单个连接：断开后按带抖动的指数退避重连，连接的断开与重连不影响其他连接
+        重连期间处理器任务、执行器与日志保持运行，出站消息排队等待重新对接
+        """
+        self._logger.debug(f"开始连接 {connection.url}", tag="connect")
+        while connection.retry_cnt <= self._max_retry and not self._stopped:
+            heartbeat_task: Optional[asyncio.Task] = None
             try:
-                async with websockets.connect(self._ws_url) as websocket:
-                    retry_cnt = 0
-                    self._ws = websocket
-                    self._logger.info(f"连接成功 {self._ws_url}", tag="connect")
+                async with websockets.connect(connection.url, **self._connect_options) as websocket:
+                    connection.attach(websocket)
+                    self._logger.info(f"连接成功 {connection.url}", tag="connect")
                     
                     msg_handler_task = asyncio.create_task(
-                        self.on_msg_handler(websocket)
+                        self.on_msg_handler(websocket, connection)
                     )
                     
                     async with self._on_msg_handler_lock:
                         try:
-                            await self.ready()
+                            await self.ready(connection)
+                            connection.mark_ready()
+                            if connection.connects > 1:
+                                self._logger.info(f"已恢复 {connection.url}，耗时 {connection.recover_last:.2f}s", tag="connect")
                             await self.on_create(websocket)
                         except RuntimeError as e:
                             msg_handler_task.cancel()
                             raise e
                     
+                    if self._heartbeat_interval:
+                        heartbeat_task = asyncio.create_task(self._heartbeat_loop(connection))
+                    
                     try:
                         await msg_handler_task
                     except asyncio.CancelledError:
                         pass
             
             except Exception as e:
-                retry_cnt += 1
-                wait = min(2 ** retry_cnt + random.random(), 60)
-                self._logger.error(f"连接异常，{wait:.1f}s 后第 {retry_cnt} 次重连\n", e, tag="connect")
-                await asyncio.sleep(wait)
+                if self._stopped:
+                    break
+                connection.retry_cnt += 1
+                wait = self._backoff(connection.retry_cnt)
+                self._logger.error(f"连接异常 {connection.url}，{wait:.1f}s 后第 {connection.retry_cnt} 次重连\n", e, tag="connect")
+            else:
+                wait = self._backoff(0)
+                if not self._stopped:
+                    self._logger.info(f"连接已关闭 {connection.url}，{wait:.1f}s 后重连", tag="connect")
             finally:
-                await self.close()
+                if heartbeat_task is not None:
+                    heartbeat_task.cancel()
+                connection.detach()
                 await self.on_close()
+            if not self._stopped and connection.retry_cnt <= self._max_retry:
+                await asyncio.sleep(wait)
+    
+    async def _heartbeat_loop(self, connection: Connection) -> None:
+        interval = self._heartbeat_interval
+        timeout = self._heartbeat_timeout or interval
+        monitor = connection.latency
+        loop = asyncio.get_running_loop()
+        while connection.connected():
+            await asyncio.sleep(interval)
+            start = loop.time()
+            try:
+                await self._send_ws_msg(Cmd.Heartbeat, None, True, timeout, connection=connection)
+            except TimeoutError:
+                misses = monitor.record_miss()
+                self._logger.warning(f"心跳超时 {connection.url}（连续 {misses} 次）", tag="heartbeat")
+                if misses >= self._heartbeat_max_misses:
+                    self._logger.error(f"连接 {connection.url} 无响应，强制重连", tag="heartbeat")
+                    connection.abort()
+                    return
+                continue
+            except (ConnectionError, RuntimeError):
+                return
+            monitor.record(loop.time() - start)
+    
+    async def _profile_report_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._profile_report_interval)
+            if self._profiler.report():
+                self._logger.info(f"处理器耗时排行\n{self._profiler.format_report()}", tag="profile")
+    
+    def _backoff(self, retry: int) -> float:
+        # 一半固定、一半随机，避免多个实例在同一时刻重连
+        ceiling = min(self._reconnect_max, self._reconnect_base * 2 ** retry)
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
     
-    def on_msg(self, regex=None):
+    def on_msg(self,
+               regex=None,
+               *,
+               max_concurrency: Optional[int] = None,
+               executor: Optional[str] = None,
+               timeout: Optional[float] = None,
+               msg_type: Optional[str | Iterable[str]] = None,
+               group: Optional[str | int | Iterable[str | int]] = None):
+        """
+        executor="thread" 在线程池中运行同步处理器；executor="process" 在进程池中运行，
+        处理器收到 Messenger 与 MatchSnapshot 的副本，返回值（str、str 列表或 Messenger）作为回复发送
+        timeout 为处理器的最长运行时间（秒），超时后不再等待其结果：
+        - 协程处理器被取消
+        - executor="process" 的处理器所在的进程池被结束并重建（见 ProcessRunner）
+        - 线程池中的同步处理器无法中止，只是不再等待，该工作线程在处理器返回前仍被占用
+        msg_type（Msg.Group / Friend / Temp / Guild 或其列表）与 group（群号或其列表）限定处理器只接收对应会话的消息，
+        在构建 Messenger 之前判断，不符合的消息不计入该处理器的并发与统计
+        """
         if regex:
             compiled_pattern = re.compile(regex)
-            if compiled_pattern in self._on_msg_regex_handlers:
+            if compiled_pattern in self._dispatcher:
                 raise AttributeError("Repeat regex")
         def decorator(func):
-            if not asyncio.iscoroutinefunction(func) and not self._allow_thread:
+            is_coroutine = asyncio.iscoroutinefunction(func)
+            if is_coroutine and executor is not None:
+                raise TypeError(f"Executor '{executor}' requires a sync function")
+            if not is_coroutine and executor is None and not self._allow_thread:
                 raise TypeError("Function must be async, or set `allow_thread` to `True`")
             rn = Plugin.get_function_required_params_num(func)
+            entry = HandlerEntry(
+                func, rn,
+                max_concurrency=max_concurrency, executor=executor, timeout=timeout, msg_type=msg_type, group=group,
+            )
+            if entry.msg_types is not None or entry.groups is not None:
+                self._route_filters = True
+            if executor == "process" and self._process_runner is None:
+                self._process_runner = ProcessRunner(self._process_workers, self._process_initializer, self._process_initargs)
             if regex:
-                self._on_msg_regex_handlers[compiled_pattern] = (func, rn)
+                self._dispatcher.add(compiled_pattern, entry)
             else:
-                self._on_all_msg_handlers.append((func, rn))
+                self._on_all_msg_handlers.append(entry)
             return func
         return decorator
     
+    def reload_modules(self, paths: Iterable[str]) -> list[str]:
+        """
+        重新导入 paths 对应的已导入模块，并替换这些模块注册的处理器；连接、缓存与线程池保持不变
+        未导入的文件被忽略；入口脚本、secplugin 自身或分片模式下无法进程内重载，抛出 RuntimeError
+        重新导入失败时恢复原处理器并抛出原异常
+        """
+        targets = {os.path.realpath(p) for p in paths}
+        modules = [
+            module for module in list(sys.modules.values())
+            if getattr(module, "__file__", None) and os.path.realpath(module.__file__) in targets
+        ]
+        if not modules:
+            return []
+        if self._shard_pool is not None:
+            raise RuntimeError("In-process reload is not supported with shards")
+        for module in modules:
+            if module.__name__ == "__main__" or module.__name__.partition(".")[0] == __package__:
+                raise RuntimeError(f"Module '{module.__name__}' can not be reloaded in process")
+
+        names = {module.__name__ for module in modules}
+        old_patterns = [(p, entry) for p, entry in self._dispatcher.items() if entry.func.__module__ in names]
+        old_all = [entry for entry in self._on_all_msg_handlers if entry.func.__module__ in names]
+
+        def unregister() -> None:
+            for p, entry in self._dispatcher.items():
+                if entry.func.__module__ in names:
+                    self._dispatcher.remove(p)
+            self._on_all_msg_handlers = [e for e in self._on_all_msg_handlers if e.func.__module__ not in names]
+
+        unregister()
+        try:
+            for module in modules:
+                importlib.reload(module)
+        except BaseException:
+            unregister()
+            for p, entry in old_patterns:
+                self._dispatcher.add(p, entry)
+            self._on_all_msg_handlers.extend(old_all)
+            raise
+        # 工作进程中仍是旧模块，重建进程池
+        if self._process_runner is not None and any(e.executor == "process" for _, e in old_patterns):
+            self._process_runner.shutdown(wait=False)
+        return sorted(names)
+    
+    async def _reload_changed(self, paths: list[str]) -> bool:
+        try:
+            reloaded = self.reload_modules(paths)
+        except Exception as e:
+            self._logger.error("进程内重载失败，重启进程", e, tag="reload")
+            return False
+        if reloaded:
+            self._logger.info(f"已重载 {', '.join(reloaded)}", tag="reload")
+        return True
+    
+    def get_codec(self) -> JsonCodec:
+        return self._codec
+
     def get_logger(self) -> Logger:
-        if not self._logger:
-            self._logger = Logger()
+        if not getattr(self, "_logger", None):
+            self._logger = Logger(**self._log_options)
+            self._logger.set_level(self._log_level)
         return self._logger
 
     def get_local_send_wait_timeout(self) -> float:
@@ -137,9 +466,69 @@ class Plugin:
     def set_local_send_wait_timeout(self, timeout: float) -> None:
         self._local_send_wait_timeout = timeout
 
+    def get_max_in_flight(self) -> int:
+        return self._max_in_flight
+
+    def set_max_in_flight(self, max_in_flight: int) -> None:
+        for connection in self._connections:
+            connection.rpc.set_max_in_flight(max_in_flight)
+        self._max_in_flight = max_in_flight
+
+    def get_in_flight(self) -> int:
+        return sum(connection.rpc.in_flight() for connection in self._connections)
+
+    def get_connections(self) -> list[Connection]:
+        return list(self._connections)
+
+    def get_connection_stats(self) -> list[dict[str, Any]]:
+        return [connection.stats() for connection in self._connections]
+
+    def get_latency_stats(self) -> list[dict[str, Any]]:
+        return [{"url": connection.url, **connection.latency.stats()} for connection in self._connections]
+
+    def get_metrics(self) -> Optional[dict[str, Any]]:
+        if self._metrics is None:
+            return None
+        return self._metrics.registry.snapshot()
+
+    def get_metrics_text(self) -> Optional[str]:
+        if self._metrics is None:
+            return None
+        return self._metrics.registry.to_prometheus()
+
+    def get_profile_report(self, top: Optional[int] = None) -> Optional[list[dict[str, Any]]]:
+        if self._profiler is None:
+            return None
+        return self._profiler.report(top)
+
+    def profile_handler(self, name: str, path: str, calls: int = 1) -> None:
+        """
+        对名为 name 的处理器接下来的 calls 次调用启用 cProfile，结束后写入 path（pstats 格式）
+        同一时刻只有一个处理器能启用 cProfile，与其他被分析的处理器并发执行的部分不计入结果
+        """
+        if self._profiler is None:
+            raise RuntimeError("Profiling is disabled, create Plugin with profile=True")
+        self._profiler.profile(name, path, calls)
+
+    def get_dispatch_stats(self) -> dict[str, Any]:
+        return self._dispatch_queue.stats()
+
+    def get_task_stats(self) -> dict[str, int]:
+        return self._task_group.stats()
+
+    def get_shard_stats(self) -> Optional[list[dict[str, Any]]]:
+        if self._shard_pool is None:
+            return None
+        return self._shard_pool.stats()
+
+    def get_scheduler_stats(self) -> Optional[dict[str, Any]]:
+        if self._scheduler is None:
+            return None
+        return self._scheduler.stats()
+
     def get_sender(self) -> Sender:
         if not self._sender:
-            self._sender = Sender(self)
+            self._sender = Sender(self, cache_ttl=self._cache_ttl)
         return self._sender
     
     def running(self) -> bool:
@@ -148,13 +537,50 @@ class Plugin:
     def closed(self) -> bool:
         return not self._running
     
-    async def ready(self):
+    def stop(self) -> None:
+        """
+        关闭当前连接且不再重连，run() 随后返回
+        可在任意线程调用：不在事件循环线程时经 call_soon_threadsafe 转交
+        """
+        self._stopped = True
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._close_connections()
+            return
+        try:
+            loop.call_soon_threadsafe(self._close_connections)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def _close_connections(self) -> None:
+        for connection in self._connections:
+            if connection.ws is not None:
+                asyncio.ensure_future(connection.ws.close())
+    
+    async def ready(self, connection: Optional[Connection] = None):
         self._running = True
-        resp = await self.send_ws_msg(Cmd.SyncOicq, {"pid": self._plugin_pid, "name": self._plugin_name, "token": self._plugin_token})
+        data = {"pid": self._plugin_pid, "name": self._plugin_name, "token": self._plugin_token}
+        if self._binary_codec is not None:
+            data["encodings"] = [self._binary_codec.name, "json"]
+            data["tags"] = self._binary_codec.tags
+        if connection is None:
+            connection = self._route(data)
+        resp = await self._send_ws_msg(Cmd.SyncOicq, data, connection=connection)
         if resp is not None and resp \
             and resp.get("data", None) is not None and resp.get("data", {}) \
             and resp.get("data", {}).get("status", False):
-            self._logger.info(f"对接成功", tag="SyncOicq")
+            # 对端在响应中确认 encoding 后，之后的出站帧改用二进制编码
+            if self._binary_codec is not None and resp["data"].get("encoding") == self._binary_codec.name:
+                connection.codec = self._binary_codec
+            encoding = connection.codec.name if connection.codec is not None else "json"
+            self._logger.info(f"对接成功（{encoding}）", tag="SyncOicq")
         else:
             self._logger.error(f"对接失败", tag="SyncOicq")
     
@@ -165,16 +591,27 @@ class Plugin:
         pass
     
     async def close(self):
+        """
+        最终关闭，仅在 run() 结束时调用一次；单个连接断开重连不会经过这里
+        """
         if self._reload:
             HotReload.disable()
+        for worker in self._dispatch_workers:
+            worker.cancel()
+        self._dispatch_workers.clear()
+        if self._profile_report_task is not None:
+            self._profile_report_task.cancel()
+            self._profile_report_task = None
+        if not await self._task_group.drain(self._drain_timeout):
+            self._logger.warning(f"处理器任务未在 {self._drain_timeout}s 内结束，已取消", tag="close")
+        if self._metrics_exporter is not None:
+            await self._metrics_exporter.stop()
         if self._logger:
             self._logger.shutdown()
         if self._allow_thread and self._executor is not None:
             self._executor.shutdown(wait=self._running)
-        for seq, future in list(self._pending_responses.items()):
-            if not future.done():
-                future.cancel()
-        self._pending_responses.clear()
+        for connection in self._connections:
+            connection.rpc.cancel_all()
         for task in asyncio.all_tasks():
             if task is not asyncio.current_task():
                 task.cancel()
@@ -183,9 +620,32 @@ class Plugin:
     async def on_close(self):
         pass
     
-    async def send_ws_msg(self, cmd: Cmd | str, data: dict | Messenger, rsp: bool = True, timeout: float = 0) -> Optional[dict]:
+    async def send_ws_msg(self,
+                          cmd: Cmd | str,
+                          data: dict | Messenger,
+                          rsp: bool = True,
+                          timeout: float = 0,
+                          priority: Priority = Priority.Normal
+    ) -> Optional[dict]:
+        if not self._running:
+            return
+        if self._shard_link is not None:
+            return await self._shard_link.send(cmd, data, rsp, timeout, priority)
+        if self._scheduler is not None and cmd == Cmd.SendOicqMsg and isinstance(data, Messenger):
+            return await self._scheduler.submit(data, rsp, timeout, priority)
+        return await self._send_ws_msg(cmd, data, rsp, timeout)
+    
+    async def _send_ws_msg(self,
+                           cmd: Cmd | str,
+                           data: dict | Messenger,
+                           rsp: bool = True,
+                           timeout: float = 0,
+                           connection: Optional[Connection] = None
+    ) -> Optional[dict]:
         if not self._running:
             return
+        if connection is None:
+            connection = self._route(data)
         
         cmd_value = cmd.value if isinstance(cmd, Cmd) else cmd
 
@@ -195,60 +655,132 @@ class Plugin:
         }
         if data:   
             if isinstance(data, Messenger):
-                payload["data"] = data.get_list()
+                payload["data"] = data.list
             else:
                 payload["data"] = data
         
-        self._seq += 1
-        seq = self._seq
+        if cmd_value != Cmd.SyncOicq and not connection.is_ready():
+            if self._stopped:
+                raise RuntimeError("WebSocket is not connected")
+            await connection.wait_ready(self._send_buffer_timeout, self._send_buffer_size)
+        
+        rpc = connection.rpc
+        seq = rpc.next_seq()
         payload["seq"] = seq
         
-        if self._ws is None:
+        if not connection.connected():
             raise RuntimeError("WebSocket is not connected")
-        await self._ws.send(json.dumps(payload))
         
-        if rsp:
-            if not timeout:
-                timeout = self._local_send_wait_timeout
-            async with self._on_send_wait_lock:
-                future = asyncio.get_event_loop().create_future()
-                self._pending_responses[seq] = future
-                
-                try:
-                    response = await asyncio.wait_for(future, timeout = timeout)
-                    return response
-                except asyncio.TimeoutError:
-                    self._pending_responses.pop(seq, None)
-                    raise TimeoutError(f"Response timeout for seq={seq}")
-                except asyncio.CancelledError:
-                    self._pending_responses.pop(seq, None)
-                    raise
-                finally:
-                    self._pending_responses.pop(seq, None)
+        metrics = self._metrics
+        if not rsp:
+            await connection.send_payload(payload, self._codec)
+            if metrics is not None:
+                metrics.frames_sent.labels(cmd_value).inc()
+            return
+        
+        if not timeout:
+            timeout = self._local_send_wait_timeout
+        if metrics is None:
+            return await rpc.call(seq, lambda: connection.send_payload(payload, self._codec), timeout)
+        metrics.frames_sent.labels(cmd_value).inc()
+        started = time.perf_counter()
+        try:
+            result = await rpc.call(seq, lambda: connection.send_payload(payload, self._codec), timeout)
+        except TimeoutError:
+            metrics.send_timeouts.labels(cmd_value).inc()
+            raise
+        metrics.response_seconds.labels(cmd_value).observe(time.perf_counter() - started)
+        return result
+    
+    def _route(self, data: dict | Messenger) -> Connection:
+        connections = self._connections
+        if len(connections) == 1:
+            return connections[0]
+        if isinstance(data, Messenger):
+            connection = self._account_routes.get(data.get_msg(Msg.Account, None))
+            if connection is not None:
+                return connection
+        for connection in connections:
+            if connection.connected():
+                return connection
+        return connections[0]
     
     async def on_unsupported_msg_handler(self, message: str):
         pass
     
-    async def on_msg_handler(self, websocket: WebSocketClientProtocol):
+    async def on_msg_handler(self, websocket: WebSocketClientProtocol, connection: Optional[Connection] = None):
+        if connection is None:
+            connection = self._connections[0]
+        recv = websocket.recv
+        recv_bytes = connection.recv_bytes
+        # 二进制编码的 loads 同样能解析 JSON 帧，协商前后无需切换
+        loads = (self._binary_codec or self._codec).loads
+        learn_routes = len(self._connections) > 1
+        metrics = self._metrics
         try:
-            async for message in websocket:
+            while True:
+                message = await (recv(decode=False) if recv_bytes else recv())
                 try:
-                    msg = json.loads(message)
-                except json.JSONDecodeError:
+                    if metrics is None:
+                        msg = loads(message)
+                    else:
+                        started = time.perf_counter()
+                        msg = loads(message)
+                        metrics.decode_seconds.observe(time.perf_counter() - started)
+                except ValueError:
                     msg = None
+                    if metrics is not None:
+                        metrics.frames_invalid.inc()
+                    if isinstance(message, bytes):
+                        message = message.decode("utf-8", "replace")
                     await self.on_msg_error(message)
                     await self.on_unsupported_msg_handler(message)
                 if msg:
+                    # 读循环只做解析与路由：响应直接唤醒等待方，推送消息交给分发队列
                     cmd = msg.get("cmd", None)
-                    messenger = Messenger(msg.get("data", []))
-                    self._logger.debug(message, tag="onMsg")
+                    if self._frame_log_sample and self._logger.is_enabled(logging.DEBUG):
+                        self._frame_log_count += 1
+                        if self._frame_log_count >= self._frame_log_sample:
+                            self._frame_log_count = 0
+                            if isinstance(message, bytes):
+                                # msgpack 帧记录解码后的内容，JSON 帧按原文记录
+                                message = message.decode("utf-8", "replace") if message[:1] == b"{" else str(msg)
+                            self._logger.debug(message, tag="onMsg", seq=msg.get("seq"))
+                    if metrics is not None:
+                        metrics.frames_received.labels(str(cmd)).inc()
                     if cmd == Cmd.Response:
-                        await self.on_resp_msg_handler(msg)
+                        await self.on_resp_msg_handler(msg, connection)
                     elif cmd == Cmd.PushOicqMsg:
-                        await self.do_msg_handler(messenger)
+                        data = msg.get("data", [])
+                        if learn_routes:
+                            self._learn_route(data, connection)
+                        if not await self._dispatch_queue.put(data, connection.rpc.in_flight):
+                            self._logger.debug(f"分发队列已满，丢弃消息（累计 {self._dispatch_queue.shed}）", tag="dispatch")
+        except ConnectionClosedOK:
+            pass
         except ConnectionClosedError as e:
             raise RuntimeError("WebSocket connection closed") from e
     
+    def _start_dispatch_workers(self) -> None:
+        for worker in self._dispatch_workers:
+            worker.cancel()
+        self._dispatch_workers = [
+            asyncio.create_task(self._dispatch_worker(), name=f"dispatch-worker-{i}")
+            for i in range(max(self._max_workers, 1))
+        ]
+    
+    async def _dispatch_worker(self) -> None:
+        while True:
+            data = await self._dispatch_queue.get()
+            try:
+                if self._sender is not None:
+                    self._sender.on_push(data)
+                await self._dispatch_data(data)
+            except Exception as e:
+                self._logger.error("消息分发异常", e, tag="dispatch")
+            finally:
+                self._dispatch_queue.task_done()
+    
     @staticmethod
     def get_function_required_params_num(callback: Callable[..., Any]) -> int:
         sig = inspect.signature(callback)
@@ -260,58 +792,233 @@ class Plugin:
             and param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD)
         )
     
-    async def on_resp_msg_handler(self, message: dict):
-        seq = message.get("seq")
-        if seq is not None and seq in self._pending_responses:
-            future = self._pending_responses.get(seq)
-            if future is None:
+    def _learn_route(self, data: list[dict[str, Any]], connection: Connection) -> None:
+        for map_dict in data:
+            if Msg.Account in map_dict:
+                account = map_dict[Msg.Account]
+                if account not in connection.accounts:
+                    connection.accounts.add(account)
+                    previous = self._account_routes.get(account)
+                    if previous is not None and previous is not connection:
+                        previous.accounts.discard(account)
+                    self._account_routes[account] = connection
                 return
-            if not future.done():
-                future.set_result(message)
+    
+    async def on_resp_msg_handler(self, message: dict, connection: Optional[Connection] = None):
+        if connection is None:
+            connection = self._connections[0]
+        resolved = connection.rpc.resolve(message)
+        if not resolved and self._metrics is not None:
+            self._metrics.responses_unmatched.inc()
+        if resolved is False:
+            self._logger.debug(f"Future for seq {message.get('seq')} already done", tag="resp")
+    
+    def _on_handler_error(self, name: str, e: BaseException) -> None:
+        if isinstance(e, asyncio.TimeoutError):
+            self._logger.warning(f"处理器 {name} 运行超时", tag="handler")
+            return
+        self._logger.error(f"处理器 {name} 异常", e, tag="handler")
+    
+    async def _start_process_runner(self) -> None:
+        try:
+            await self._process_runner.start()
+            self._logger.info("处理器进程池已就绪", tag="process")
+        except Exception as e:
+            self._logger.error("处理器进程池启动失败", e, tag="process")
+    
+    async def _run_in_process(self, entry: HandlerEntry, messenger: Messenger, matches: Optional[re.Match]) -> None:
+        result = await self._process_runner.run(entry.func, entry.rn, messenger, matches, entry.timeout)
+        if result is None:
+            return
+        sender = self.get_sender()
+        if isinstance(result, Messenger):
+            await sender.send_ws_msg(Cmd.SendOicqMsg, result, priority=Priority.Reply)
+        elif isinstance(result, (list, tuple)):
+            await sender.send_msg(messenger, *result)
+        else:
+            await sender.send_msg(messenger, str(result))
+    
+    def _spawn_handler(self, entry: HandlerEntry, messenger: Messenger, matches: Optional[re.Match] = None) -> None:
+        handler, rn = entry.func, entry.rn
+        if rn == 0:
+            args = ()
+        elif rn == 1 or matches is None:
+            args = (messenger,)
+        else:
+            args = (messenger, matches)
+        if entry.executor == "process":
+            factory = lambda: self._run_in_process(entry, messenger, matches if rn > 1 else None)
+        elif entry.is_coroutine:
+            factory = lambda: handler(*args)
+        else:
+            if not self._allow_thread and entry.executor is None:
+                raise RuntimeError("Sync function was not allowed (allow_thread=False)")
+            factory = lambda: asyncio.get_running_loop().run_in_executor(self._executor, handler, *args)
+        profiler = self._profiler
+        if profiler is not None:
+            name = handler.__name__
+            if entry.executor == "process":
+                remote = factory
+                factory = lambda: profiler.run_awaitable(name, remote())
+            elif entry.is_coroutine:
+                factory = lambda: profiler.run_coroutine(name, handler(*args))
             else:
-                self._logger.debug(f"Future for seq {seq} already done", tag="resp")
+                factory = lambda: profiler.run_sync(name, self._executor, handler, args)
+        # process 处理器的超时由 ProcessRunner 处理，以便回收仍在运行的工作进程
+        if entry.timeout is not None and entry.executor != "process":
+            call = factory
+            factory = lambda: asyncio.wait_for(call(), entry.timeout)
+        if self._metrics is not None:
+            timed = factory
+            factory = lambda: self._observe_handler(timed, handler.__name__)
+        if self._log_handler_time:
+            logged = factory
+            factory = lambda: self._log_handler(logged, handler.__name__, messenger)
+        if self._task_group.spawn(factory, entry.limiter, handler.__name__) is None:
+            self._logger.debug(f"处理器任务数已达上限，拒绝 {handler.__name__}", tag="handler")
+    
+    async def _observe_handler(self, call: Callable[[], Any], name: str) -> None:
+        metrics = self._metrics
+        started = time.perf_counter()
+        try:
+            await call()
+        except Exception:
+            metrics.handler_errors.labels(name).inc()
+            raise
+        finally:
+            metrics.handler_seconds.labels(name).observe(time.perf_counter() - started)
+    
+    async def _log_handler(self, call: Callable[[], Any], name: str, messenger: Messenger) -> None:
+        started = time.perf_counter()
+        level, result = logging.DEBUG, "ok"
+        try:
+            await call()
+        except BaseException as e:
+            level, result = logging.ERROR, type(e).__name__
+            raise
+        finally:
+            self._logger.log(
+                result,
+                level=level,
+                tag=f"handler:{name}",
+                account=messenger.get_msg(Msg.Account, None),
+                group=messenger.get_msg(Msg.GroupId, None),
+                elapsed=time.perf_counter() - started,
+            )
+    
+    def _match(self, text: str) -> list[tuple[HandlerEntry, re.Match]]:
+        metrics = self._metrics
+        if metrics is None:
+            return self._dispatcher.match(text)
+        started = time.perf_counter()
+        matched = self._dispatcher.match(text)
+        metrics.match_seconds.observe(time.perf_counter() - started)
+        return matched
+    
+    async def _dispatch_data(self, data: list[dict[str, Any]]) -> None:
+        if self._shard_pool is not None:
+            index = self._shard_pool.dispatch(data)
+            if invalidates_cache(data):
+                self._shard_pool.broadcast_invalidate(data, index)
+            return
+        # 子类重写了 do_msg_handler 时始终交给它处理
+        if not self._lazy_decode or type(self).do_msg_handler is not Plugin.do_msg_handler:
+            await self.do_msg_handler(Messenger(data))
+            return
+        route = RoutingInfo(data)
+        entries, matched = self._select(route, self._match(route.text))
+        if not matched and not entries:
+            return
+        self._run_handlers(Messenger(data), matched, entries)
+    
+    def _run_shard(self, index: int, inbox: Any, outbox: Any, parent_pid: int) -> None:
+        """
+        分片子进程入口（fork 后执行）
+        """
+        # Ctrl+C 由父进程统一处理
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self._shard_pool = None
+        self._shard_link = ShardLink(index, inbox, outbox, parent_pid, default_timeout=self._local_send_wait_timeout)
+        # 日志文件只由父进程写入与轮转
+        Logger.after_fork(self._shard_link.forward_log)
+        self._reload = False
+        try:
+            asyncio.run(self._serve_shard())
+        except Exception as e:
+            self._logger.error(f"分片 {index} 异常退出", e, tag="shard")
+        finally:
+            Logger.shutdown()
+    
+    async def _serve_shard(self) -> None:
+        # 父进程中的队列、信号量可能已绑定到父进程的事件循环，全部重建
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        self._task_group = HandlerTaskGroup(self._max_workers, self._max_pending_tasks, self._on_handler_error)
+        self._dispatch_queue = DispatchQueue(self._dispatch_queue_size, self._backpressure)
+        if self._metrics is not None:
+            # fork 时继承的是父进程的计数；子进程只记录自己的增量，随心跳交给父进程的端点
+            self._metrics = PluginMetrics()
+        if self._allow_thread:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        if self._process_runner is not None:
+            await self._start_process_runner()
+        self._start_dispatch_workers()
+        self._logger.info(f"分片 {self._shard_link.index} 已启动（pid={os.getpid()}）", tag="shard")
+        try:
+            await self._shard_link.serve(
+                self._dispatch_queue.put,
+                self._shard_report,
+                self._invalidate_cache,
+            )
+            await self._dispatch_queue.join()
+        finally:
+            for worker in self._dispatch_workers:
+                worker.cancel()
+            await self._task_group.drain(self._drain_timeout)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            if self._process_runner is not None:
+                self._process_runner.shutdown(wait=False)
+    
+    def _invalidate_cache(self, data: list[dict[str, Any]]) -> None:
+        if self._sender is not None:
+            self._sender.on_push(data)
+    
+    def _shard_report(self) -> dict[str, Any]:
+        report = {**self._dispatch_queue.stats(), **self._task_group.stats()}
+        if self._metrics is not None:
+            report["metrics"] = self._metrics.take_shard()
+        return report
+    
+    def _select(self,
+                route: RoutingInfo,
+                matched: list[tuple[HandlerEntry, re.Match]]
+    ) -> tuple[list[HandlerEntry], list[tuple[HandlerEntry, re.Match]]]:
+        """
+        按处理器的 msg_type / group 过滤，返回（无正则处理器，正则匹配的处理器）
+        """
+        entries = self._on_all_msg_handlers
+        if not self._route_filters:
+            return entries, matched
+        return [e for e in entries if e.accepts(route)], [(e, m) for e, m in matched if e.accepts(route)]
+    
+    def _run_handlers(self,
+                      messenger: Messenger,
+                      matched: list[tuple[HandlerEntry, re.Match]],
+                      entries: Optional[list[HandlerEntry]] = None
+    ) -> None:
+        for entry in self._on_all_msg_handlers if entries is None else entries:
+            self._spawn_handler(entry, messenger)
+        for entry, matches in matched:
+            self._spawn_handler(entry, messenger, matches)
     
     async def do_msg_handler(self, messenger: Messenger):
-        text = messenger.get_msg(Msg.Text)
-        async with self._semaphore:
-            for (handler, rn) in self._on_all_msg_handlers:
-                if asyncio.iscoroutinefunction(handler):
-                    if rn == 0:
-                        task = asyncio.create_task(handler())
-                    elif rn >= 1:
-                        task = asyncio.create_task(handler(messenger))
-                else:
-                    if not self._allow_thread:
-                        raise RuntimeError("Sync function was not allowed (allow_thread=False)")
-                    loop = asyncio.get_running_loop()
-                    if rn == 0:
-                        await loop.run_in_executor(self._executor, handler)
-                    elif rn >= 1:
-                        await loop.run_in_executor(self._executor, handler, messenger)
-            
-            for regex, (handler, rn) in self._on_msg_regex_handlers.items():
-                matches = re.fullmatch(regex, text)
-                if matches:
-                    if asyncio.iscoroutinefunction(handler):
-                        if rn == 0:
-                            task = asyncio.create_task(handler())
-                        elif rn == 1:
-                            task = asyncio.create_task(handler(messenger))
-                        elif rn >= 2:
-                            task = asyncio.create_task(handler(messenger, matches))
-                    else:
-                        if not self._allow_thread:
-                            raise RuntimeError("Sync function was not allowed (allow_thread=False)")
-                        loop = asyncio.get_running_loop()
-                        if rn == 0:
-                            await loop.run_in_executor(self._executor, handler)
-                        elif rn == 1:
-                            await loop.run_in_executor(self._executor, handler, messenger)
-                        elif rn >= 2:
-                            await loop.run_in_executor(self._executor, handler, messenger, matches)
+        route = RoutingInfo(messenger.list)
+        entries, matched = self._select(route, self._match(route.text))
+        self._run_handlers(messenger, matched, entries)
     
     def run(self,
-            url: Optional[str] = None,
+            url: Optional[str | list[str]] = None,
             pid: Optional[str] = None,
             name: Optional[str] = None,
             token: Optional[str] = None,
@@ -320,15 +1027,25 @@ class Plugin:
             allow_thread: Optional[bool] = None,
             reload: Optional[bool] = None,
             max_retry: Optional[int] = None,
+            max_in_flight: Optional[int] = None,
+            shards: Optional[int] = None,
             log_path: Optional[str] = None
     ) -> None:
-        self._ws_url = url or self._ws_url
+        if url:
+            self._ws_urls = [url] if isinstance(url, str) else list(url)
+            self._ws_url = self._ws_urls[0]
+            self._connections = [Connection(u, self._max_in_flight) for u in self._ws_urls]
+            self._account_routes.clear()
         if max_workers is not None:
             self._max_workers = max_workers
-            self._semaphore = asyncio.Semaphore(self._max_workers)
+            self._task_group.set_max_concurrency(self._max_workers)
         self._allow_thread = allow_thread or self._allow_thread
         self._reload = reload or self._reload
         self._max_retry = max_retry or self._max_retry
+        if max_in_flight is not None:
+            self.set_max_in_flight(max_in_flight)
+        if shards is not None:
+            self._shards = shards
         
         self._plugin_pid = pid or self._plugin_pid
         self._plugin_name = name or self._plugin_name
@@ -337,7 +1054,21 @@ class Plugin:
         if self._allow_thread:
             self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
         if log_path is not None or not hasattr(self, '_logger') or not self._logger:
-            self._logger = Logger(name = f"plugin_logger_{pid.replace('.', '_')}", path = log_path or self._log_path or "app.log")
+            self._logger = Logger(name = f"plugin_logger_{pid.replace('.', '_')}", path = log_path or self._log_path or "app.log", **self._log_options)
+            self._logger.set_level(self._log_level)
+
+        if self._shards > 0:
+            self._shard_pool = ShardPool(
+                self._shards,
+                self._run_shard,
+                self.send_ws_msg,
+                self._logger,
+                shard_by=self._shard_by,
+                heartbeat=self._shard_heartbeat,
+                heartbeat_timeout=self._shard_heartbeat_timeout,
+                on_metrics=self._metrics.merge_shard if self._metrics is not None else None,
+            )
+            self._shard_pool.start()
 
         try:
             asyncio.run(self.main())
@@ -345,3 +1076,8 @@ class Plugin:
             self._logger.info("已关闭", tag="close")
         except Exception as e:
             self._logger.error("异常：", e, tag="error")
+        finally:
+            if self._shard_pool is not None:
+                self._shard_pool.stop(self._drain_timeout)
+            if self._process_runner is not None:
+                self._process_runner.shutdown(wait=False)
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from .messenger import Messenger
+
+
+class MatchSnapshot:
+    """
+    re.Match 的可 pickle 快照，提供 group/groups/groupdict/span 等只读接口
+    """
+    __slots__ = ("string", "pos", "endpos", "lastindex", "lastgroup", "_groups", "_spans", "_groupindex")
+
+    def __init__(self, match: re.Match) -> None:
+        count = match.re.groups + 1
+        self.string: str = match.string
+        self.pos: int = match.pos
+        self.endpos: int = match.endpos
+        self.lastindex: Optional[int] = match.lastindex
+        self.lastgroup: Optional[str] = match.lastgroup
+        self._groups: tuple[Optional[str], ...] = tuple(match.group(i) for i in range(count))
+        self._spans: tuple[tuple[int, int], ...] = tuple(match.span(i) for i in range(count))
+        self._groupindex: dict[str, int] = dict(match.re.groupindex)
+
+    def _index(self, group: int | str) -> int:
+        if isinstance(group, str):
+            index = self._groupindex.get(group)
+        else:
+            index = group if 0 <= group < len(self._groups) else None
+        if index is None:
+            raise IndexError("no such group")
+        return index
+
+    def group(self, *groups: int | str) -> Any:
+        if not groups:
+            return self._groups[0]
+        if len(groups) == 1:
+            return self._groups[self._index(groups[0])]
+        return tuple(self._groups[self._index(g)] for g in groups)
+
+    def __getitem__(self, group: int | str) -> Optional[str]:
+        return self._groups[self._index(group)]
+
+    def groups(self, default: Any = None) -> tuple[Any, ...]:
+        return tuple(default if g is None else g for g in self._groups[1:])
+
+    def groupdict(self, default: Any = None) -> dict[str, Any]:
+        return {name: default if self._groups[i] is None else self._groups[i] for name, i in self._groupindex.items()}
+
+    def span(self, group: int | str = 0) -> tuple[int, int]:
+        return self._spans[self._index(group)]
+
+    def start(self, group: int | str = 0) -> int:
+        return self.span(group)[0]
+
+    def end(self, group: int | str = 0) -> int:
+        return self.span(group)[1]
+
+    def __repr__(self) -> str:
+        return f"<MatchSnapshot span={self._spans[0]!r} match={self._groups[0]!r}>"
+
+
+def _warmup() -> None:
+    pass
+
+
+def _invoke(func: Callable[..., Any], rn: int, data: list[dict[str, Any]], match: Optional[MatchSnapshot]) -> Any:
+    messenger = Messenger(data)
+    if rn == 0:
+        return func()
+    if rn == 1 or match is None:
+        return func(messenger)
+    return func(messenger, match)
+
+
+class ProcessRunner:
+    """
+    CPU 密集型同步处理器的进程池：消息与匹配结果以快照形式传入子进程，处理器及其返回值须可 pickle
+    initializer 在每个工作进程启动时执行一次，适合放置较重的 import 与模型加载
+    run() 超时时结束整个池的工作进程并在下次调用时重建（ProcessPoolExecutor 无法单独回收某个工作进程），
+    同一时刻在该池中运行的其他任务会以 BrokenProcessPool 失败
+    """
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 initializer: Optional[Callable[..., Any]] = None,
+                 initargs: tuple = ()
+    ) -> None:
+        self._max_workers: Optional[int] = max_workers
+        self._initializer: Optional[Callable[..., Any]] = initializer
+        self._initargs: tuple = initargs
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.restarts: int = 0
+        self.timeouts: int = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self._max_workers, initializer=self._initializer, initargs=self._initargs)
+        return self._pool
+
+    async def start(self) -> None:
+        """
+        预先拉起全部工作进程并执行 initializer，避免首条消息承担启动开销
+        """
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        workers = self._max_workers or os.cpu_count() or 1
+        await asyncio.gather(*(loop.run_in_executor(pool, _warmup) for _ in range(workers)))
+
+    async def run(self,
+                  func: Callable[..., Any],
+                  rn: int,
+                  messenger: Messenger,
+                  match: Optional[re.Match] = None,
+                  timeout: Optional[float] = None
+    ) -> Any:
+        pool = self._get_pool()
+        snapshot = MatchSnapshot(match) if match is not None else None
+        future = asyncio.get_running_loop().run_in_executor(pool, _invoke, func, rn, messenger.list, snapshot)
+        try:
+            if timeout is None:
+                return await future
+            return await asyncio.wait_for(future, timeout)
+        except BrokenProcessPool:
+            # 工作进程异常退出后整个池不可用，下次调用时重建
+            self._discard(pool)
+            raise
+        except asyncio.TimeoutError:
+            # 超时的任务仍在工作进程中运行，结束这些进程，避免失控的处理器逐渐占满整个池
+            self.timeouts += 1
+            self._discard(pool, terminate=True)
+            raise
+
+    def _discard(self, pool: ProcessPoolExecutor, terminate: bool = False) -> None:
+        if self._pool is not pool:
+            return
+        self._pool = None
+        self.restarts += 1
+        if terminate:
+            terminate_workers = getattr(pool, "terminate_workers", None)
+            if terminate_workers is not None:
+                # Python 3.14+
+                terminate_workers()
+                return
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
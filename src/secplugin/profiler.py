@@ -0,0 +1,219 @@
+from __future__ import annotations
+import asyncio
+import cProfile
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Coroutine, Generator, Optional
+
+from .logger import Logger
+
+# 3.12 起 cProfile 基于解释器全局的 sys.monitoring，同一时刻只能启用一个 Profile（跨线程也是）
+# 拿不到锁的这一步/这次调用不计入 cProfile，耗时统计不受影响
+_profile_lock = threading.Lock()
+
+
+class HandlerStats:
+    __slots__ = ("calls", "errors", "slow", "wall_total", "wall_max", "cpu_total", "await_total")
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.errors: int = 0
+        self.slow: int = 0
+        self.wall_total: float = 0
+        self.wall_max: float = 0
+        self.cpu_total: float = 0
+        self.await_total: float = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "slow": self.slow,
+            "wall_total": self.wall_total,
+            "wall_avg": self.wall_total / self.calls if self.calls else 0,
+            "wall_max": self.wall_max,
+            "cpu_total": self.cpu_total,
+            "await_total": self.await_total,
+        }
+
+
+class _ProfileTarget:
+    __slots__ = ("path", "remaining", "profile", "busy")
+
+    def __init__(self, path: str, calls: int) -> None:
+        self.path: str = path
+        self.remaining: int = calls
+        self.profile: cProfile.Profile = cProfile.Profile()
+        self.busy: bool = False
+
+
+class _StepTimer:
+    """
+    逐步驱动协程，累计每一步在事件循环上占用的墙钟时间与 CPU 时间；两次步进之间的时间即为 await 等待
+    """
+    __slots__ = ("_coro", "_profile", "busy", "cpu")
+
+    def __init__(self, coro: Coroutine[Any, Any, Any], profile: Optional[cProfile.Profile] = None) -> None:
+        self._coro = coro
+        self._profile: Optional[cProfile.Profile] = profile
+        self.busy: float = 0
+        self.cpu: float = 0
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        gen = self._coro.__await__()
+        profile = self._profile
+        value, error = None, None
+        while True:
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            profiling = profile is not None and _profile_lock.acquire(blocking=False)
+            if profiling:
+                profile.enable()
+            try:
+                yielded = gen.throw(error) if error is not None else gen.send(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                if profiling:
+                    profile.disable()
+                    _profile_lock.release()
+                self.busy += time.perf_counter() - wall
+                self.cpu += time.thread_time() - cpu
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class HandlerProfiler:
+    """
+    按处理器统计墙钟时间、CPU 时间与等待时间，超过 threshold 的单次调用记录警告
+    profile() 可对指定处理器接下来的若干次调用启用 cProfile，结束后写入文件
+    """
+    def __init__(self, get_logger: Callable[[], Logger], threshold: float = 1.0, top: int = 10) -> None:
+        # run() 可能替换 Plugin 的 Logger，每次记录时再取
+        self._get_logger: Callable[[], Logger] = get_logger
+        self._threshold: float = threshold
+        self._top: int = top
+        self._stats: dict[str, HandlerStats] = {}
+        self._targets: dict[str, _ProfileTarget] = {}
+
+    def profile(self, name: str, path: str, calls: int = 1) -> None:
+        if calls < 1:
+            raise ValueError("calls must be >= 1")
+        self._targets[name] = _ProfileTarget(path, calls)
+
+    def _acquire(self, name: str) -> Optional[_ProfileTarget]:
+        target = self._targets.get(name)
+        if target is None or target.busy:
+            return None
+        target.busy = True
+        return target
+
+    def _release(self, name: str, target: Optional[_ProfileTarget]) -> None:
+        if target is None:
+            return
+        target.busy = False
+        target.remaining -= 1
+        if target.remaining > 0:
+            return
+        self._targets.pop(name, None)
+        try:
+            target.profile.dump_stats(target.path)
+            self._get_logger().info(f"处理器 {name} 的 cProfile 结果已写入 {target.path}", tag="profile")
+        except OSError as e:
+            self._get_logger().error(f"处理器 {name} 的 cProfile 结果写入失败", e, tag="profile")
+
+    def _record(self, name: str, wall: float, cpu: float, awaited: float, failed: bool) -> None:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = HandlerStats()
+        stats.calls += 1
+        stats.wall_total += wall
+        stats.wall_max = max(stats.wall_max, wall)
+        stats.cpu_total += cpu
+        stats.await_total += awaited
+        if failed:
+            stats.errors += 1
+        if wall >= self._threshold:
+            stats.slow += 1
+            self._get_logger().warning(f"处理器 {name} 耗时 {wall:.3f}s（CPU {cpu:.3f}s，等待 {awaited:.3f}s）", tag="profile")
+
+    async def run_coroutine(self, name: str, coro: Coroutine[Any, Any, Any]) -> Any:
+        target = self._acquire(name)
+        timer = _StepTimer(coro, target.profile if target is not None else None)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await timer
+        except Exception:
+            failed = True
+            raise
+        finally:
+            wall = time.perf_counter() - started
+            self._record(name, wall, timer.cpu, max(wall - timer.busy, 0), failed)
+            self._release(name, target)
+
+    async def run_sync(self,
+                       name: str,
+                       executor: Optional[Executor],
+                       func: Callable[..., Any],
+                       args: tuple
+    ) -> Any:
+        target = self._acquire(name)
+        profile = target.profile if target is not None else None
+        measured = [0.0, 0.0]
+
+        def call() -> Any:
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            profiling = profile is not None and _profile_lock.acquire(blocking=False)
+            try:
+                return profile.runcall(func, *args) if profiling else func(*args)
+            finally:
+                if profiling:
+                    _profile_lock.release()
+                measured[0] = time.perf_counter() - wall
+                measured[1] = time.thread_time() - cpu
+
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, call)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # 线程池中的排队时间计入等待
+            wall = time.perf_counter() - started
+            self._record(name, wall, measured[1], max(wall - measured[0], 0), failed)
+            self._release(name, target)
+
+    async def run_awaitable(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """
+        在其他进程中执行的处理器只统计墙钟时间
+        """
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await awaitable
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(name, time.perf_counter() - started, 0, 0, failed)
+
+    def report(self, top: Optional[int] = None) -> list[dict[str, Any]]:
+        ranked = sorted(self._stats.items(), key=lambda item: item[1].wall_total, reverse=True)
+        return [{"handler": name, **stats.to_dict()} for name, stats in ranked[:top or self._top]]
+
+    def format_report(self, top: Optional[int] = None) -> str:
+        lines = [f"{'handler':<24} {'calls':>7} {'slow':>5} {'err':>5} {'wall s':>9} {'avg ms':>8} {'max ms':>8} {'cpu s':>8} {'await s':>8}"]
+        for row in self.report(top):
+            lines.append(
+                f"{row['handler']:<24} {row['calls']:>7} {row['slow']:>5} {row['errors']:>5} "
+                f"{row['wall_total']:>9.3f} {row['wall_avg'] * 1000:>8.1f} {row['wall_max'] * 1000:>8.1f} "
+                f"{row['cpu_total']:>8.3f} {row['await_total']:>8.3f}"
+            )
+        return "\n".join(lines)
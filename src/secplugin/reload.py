@@ -1,11 +1,13 @@
 import asyncio
+import fnmatch
+import hashlib
 import os
 import signal
 import sys
 import subprocess
 import time
 from pathlib import Path
-from typing import Optional, Set
+from typing import Awaitable, Callable, Iterable, Optional, Set
 
 try:
     from watchdog.observers import Observer
@@ -17,13 +19,114 @@ except ImportError:
     FileSystemEventHandler = None
 
 
+# 只有这些事件可能改变文件内容；计算指纹时打开文件产生的 opened / closed_no_write 事件必须忽略，否则形成回环
+_CONTENT_EVENTS = frozenset({"created", "modified", "moved", "deleted"})
+
 _RESTART_EXIT_CODE = 42
 _CHILD_WORKER_ENV_KEY = "_HOTRELOAD_CHILD_WORKER"
 
 
+# include 按文件名或相对路径匹配
+# exclude 按相对 root 的路径匹配（只命中 root 下这一层，如 build 不会排除 pkg/build）；
+# 以 **/ 开头的模式匹配任意一级的目录名或文件名
+DEFAULT_INCLUDE = ("*.py",)
+DEFAULT_EXCLUDE = (
+    "**/.*", "**/*~", "**/__pycache__", "**/site-packages", "**/node_modules",
+    "venv", "env", "build", "dist", "logs",
+)
+
+
+class _WatchScope:
+    """
+    监听范围与内容指纹：只关心 include/exclude 过滤后的文件，内容未变的事件（touch、保存未修改）被忽略
+    """
+    def __init__(self, root: Path, include: Iterable[str], exclude: Iterable[str]) -> None:
+        self.root: Path = root
+        self._include: tuple[str, ...] = tuple(include)
+        self._exclude: tuple[str, ...] = tuple(exclude)
+        self._hashes: dict[str, Optional[bytes]] = {}
+
+    def _relative(self, path: str) -> Optional[str]:
+        try:
+            return Path(path).resolve().relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def _excluded(self, relative: str) -> bool:
+        parts = relative.split("/")
+        for pattern in self._exclude:
+            if pattern.startswith("**/"):
+                name = pattern[3:]
+                if any(fnmatch.fnmatch(part, name) for part in parts):
+                    return True
+                continue
+            # 路径本身或它的某个上级目录
+            for i in range(1, len(parts) + 1):
+                if fnmatch.fnmatch("/".join(parts[:i]), pattern):
+                    return True
+        return False
+
+    def excluded(self, path: str) -> bool:
+        relative = self._relative(path)
+        return relative is None or (relative != "." and self._excluded(relative))
+
+    def matches(self, path: str) -> bool:
+        relative = self._relative(path)
+        if relative is None or self._excluded(relative):
+            return False
+        name = relative.rpartition("/")[2]
+        return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(relative, p) for p in self._include)
+
+    @staticmethod
+    def _digest(path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return hashlib.blake2b(f.read(), digest_size=16).digest()
+        except OSError:
+            return None
+
+    def remember(self, path: str) -> None:
+        self._hashes[path] = self._digest(path)
+
+    def changed(self, path: str) -> bool:
+        digest = self._digest(path)
+        if path in self._hashes and self._hashes[path] == digest:
+            return False
+        self._hashes[path] = digest
+        return True
+
+    def top_directories(self) -> list[Path]:
+        """
+        root 下第一层未被排除的目录，各自递归监听；root 本身只监听这一层
+        被排除的目录（如 venv、build）因此不会占用 inotify watch
+        """
+        directories = []
+        for entry in sorted(os.scandir(self.root), key=lambda entry: entry.name):
+            if entry.is_dir() and not self.excluded(entry.path):
+                directories.append(Path(entry.path))
+        return directories
+
+    def snapshot(self, directory: Path) -> None:
+        for current, dirs, files in os.walk(directory):
+            if self.excluded(current):
+                dirs[:] = []
+                continue
+            for name in files:
+                path = os.path.join(current, name)
+                if self.matches(path):
+                    self.remember(path)
+
+
 _ReloadEventHandler = None
 
-def _create_reload_handler(loop: asyncio.AbstractEventLoop, debounce_seconds: float):
+# 进程内重载回调：收到变化的文件列表，返回 False 时回退到整体重启
+ReloadCallback = Callable[[list[str]], Awaitable[bool]]
+
+def _create_reload_handler(loop: asyncio.AbstractEventLoop,
+                           debounce_seconds: float,
+                           scope: _WatchScope,
+                           on_change: Optional[ReloadCallback] = None,
+                           on_new_directory: Optional[Callable[[Path], None]] = None):
     class _ReloadEventHandlerImpl(FileSystemEventHandler):
         def __init__(self, loop: asyncio.AbstractEventLoop, debounce_seconds: float = 0.5):
             self._loop = loop
@@ -34,14 +137,25 @@ def _create_reload_handler(loop: asyncio.AbstractEventLoop, debounce_seconds: fl
             self._last_event_time = 0
         
         def on_any_event(self, event):
-            if not event.src_path.endswith('.py'):
+            if event.event_type not in _CONTENT_EVENTS:
                 return
-            
-            if event.is_directory or event.src_path.endswith('~') or '/.' in event.src_path:
+            if event.is_directory:
+                # root 下新建（或移入）的第一层目录需要单独加入监听
+                if on_new_directory is not None and event.event_type in ("created", "moved"):
+                    path = Path(getattr(event, "dest_path", "") or event.src_path)
+                    if path.parent == scope.root and not scope.excluded(str(path)):
+                        self._loop.call_soon_threadsafe(on_new_directory, path)
                 return
+            # 在观察线程中完成过滤与内容比对，不占用事件循环
+            for path in (event.src_path, getattr(event, "dest_path", "")):
+                if not path or not scope.matches(path) or not scope.changed(path):
+                    continue
+                self._last_event_time = time.time()
+                # watchdog 在观察线程中回调，计时器须在事件循环线程中设置
+                self._loop.call_soon_threadsafe(self._schedule, path)
 
-            self._last_event_time = time.time()
-            self._changed_files.add(event.src_path)
+        def _schedule(self, path: str):
+            self._changed_files.add(path)
             
             if self._pending_restart:
                 self._pending_restart.cancel()
@@ -49,7 +163,7 @@ def _create_reload_handler(loop: asyncio.AbstractEventLoop, debounce_seconds: fl
             self._pending_restart = self._loop.call_later(
                 self._debounce_seconds,
                 self._do_restart,
-                event.src_path
+                path
             )
 
         def _do_restart(self, path: str):
@@ -58,7 +172,24 @@ def _create_reload_handler(loop: asyncio.AbstractEventLoop, debounce_seconds: fl
             
             self._reload_triggered = True
             print(f"检测到文件变化: {path} (共 {len(self._changed_files)} 个文件)", flush=True)
-            self._loop.call_soon_threadsafe(_trigger_restart)
+            if on_change is None:
+                _trigger_restart()
+                return
+            changed = sorted(self._changed_files)
+            self._changed_files.clear()
+            self._loop.create_task(self._reload(changed), name="hot-reload")
+
+        async def _reload(self, changed: list[str]):
+            try:
+                ok = await on_change(changed)
+            except Exception:
+                ok = False
+            if not ok:
+                _trigger_restart()
+            self._reload_triggered = False
+            # 重载期间又有文件变化时再处理一轮
+            if self._changed_files:
+                self._schedule(next(iter(self._changed_files)))
     
     return _ReloadEventHandlerImpl(loop, debounce_seconds)
 
@@ -99,11 +230,21 @@ def _start_supervisor(root: Path, interval: float):
 
 class HotReload:
     _observer: Optional[Observer] = None
-    _task: Optional[asyncio.Task] = None
     _watching = False
+    directories: list[str] = []
 
     @staticmethod
-    def enable(root: Optional[Path] = None, interval: float = 0.8, debounce: float = 2.0) -> bool:
+    def enable(root: Optional[Path] = None,
+               interval: float = 0.8,
+               debounce: float = 2.0,
+               on_change: Optional[ReloadCallback] = None,
+               include: Iterable[str] = DEFAULT_INCLUDE,
+               exclude: Iterable[str] = DEFAULT_EXCLUDE) -> bool:
+        """
+        on_change 为空时任何匹配文件的内容变化都重启工作进程；否则先尝试进程内重载，失败时才重启
+        监听整个 root（exclude 过滤）：root 本身只看这一层，其下未被排除的目录各自递归监听，
+        之后新增的子包同样生效；监听完全由 watchdog 事件驱动，不在事件循环中轮询
+        """
         if HotReload._watching:
             return True
         
@@ -117,23 +258,31 @@ class HotReload:
         signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
         
         root = (root or Path.cwd()).resolve()
-        
+        scope = _WatchScope(root, include, exclude)
         observer = Observer()
-        handler = _create_reload_handler(asyncio.get_running_loop(), debounce)
-        observer.schedule(handler, str(root), recursive=True)
+
+        def watch(directory: Path, recursive: bool = True) -> None:
+            if str(directory) in HotReload.directories or not directory.is_dir():
+                return
+            if recursive:
+                scope.snapshot(directory)
+            observer.schedule(handler, str(directory), recursive=recursive)
+            HotReload.directories.append(str(directory))
+
+        handler = _create_reload_handler(asyncio.get_running_loop(), debounce, scope, on_change, watch)
+        HotReload.directories = []
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if os.path.isfile(path) and scope.matches(path):
+                scope.remember(path)
+        watch(root, recursive=False)
+        for directory in scope.top_directories():
+            watch(directory)
         observer.start()
         
         HotReload._observer = observer
         HotReload._watching = True
         
-        async def _dummy_watcher():
-            while HotReload._watching:
-                await asyncio.sleep(1)
-        
-        HotReload._task = asyncio.get_running_loop().create_task(
-            _dummy_watcher(), name="hot-reload-watcher"
-        )
-        
         return True
 
     @staticmethod
@@ -143,6 +292,4 @@ class HotReload:
             HotReload._observer.stop()
             HotReload._observer.join()
             HotReload._observer = None
-        if HotReload._task and not HotReload._task.done():
-            HotReload._task.cancel()
-            HotReload._task = None
+        HotReload.directories = []
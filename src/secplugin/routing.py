@@ -0,0 +1,50 @@
+from __future__ import annotations
+import json
+from typing import Any, Optional
+
+from .msg import Msg, chat_type
+
+_UNSET: Any = object()
+
+
+class RoutingInfo:
+    """
+    只提取分发所需字段的轻量视图，不构建 Messenger
+    text 在构造时提取（分发必需），msg_type / group_id 供处理器过滤（on_msg 的 msg_type= / group=），首次访问时才扫描
+    text 与 Messenger.get_msg(Msg.Text) 一致，msg_type 与 Messenger.get_msg_type 一致
+    """
+    __slots__ = ("data", "text", "_msg_type", "_group_id")
+
+    def __init__(self, data: list[dict[str, Any]]) -> None:
+        self.data: list[dict[str, Any]] = data
+        texts = []
+        for map_dict in data:
+            if Msg.Text in map_dict:
+                texts.append(map_dict[Msg.Text])
+        if not texts:
+            text = "0"
+        elif len(texts) == 1 and isinstance(texts[0], str):
+            text = texts[0] or "0"
+        else:
+            text = "".join([json.dumps(t) if isinstance(t, dict) else t for t in texts]) or "0"
+        self.text: str = text
+        self._msg_type: Optional[str] = _UNSET
+        self._group_id: Optional[str] = _UNSET
+
+    def _first(self, tag: str) -> Optional[str]:
+        for map_dict in self.data:
+            if tag in map_dict:
+                return map_dict[tag]
+        return None
+
+    @property
+    def msg_type(self) -> Optional[str]:
+        if self._msg_type is _UNSET:
+            self._msg_type = chat_type(self.data)
+        return self._msg_type
+
+    @property
+    def group_id(self) -> Optional[str]:
+        if self._group_id is _UNSET:
+            self._group_id = self._first(Msg.GroupId)
+        return self._group_id
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+
+class RpcChannel:
+    """
+    按 seq 复用的请求/响应通道：允许多个请求同时在途，由 max_in_flight 限制窗口大小
+    """
+    def __init__(self, max_in_flight: int = 64) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+        self._seq: int = 0
+        self._max_in_flight: int = max_in_flight
+        self._window: asyncio.Semaphore = asyncio.Semaphore(max_in_flight)
+        self._pending_responses: dict[int, asyncio.Future] = {}
+
+    def next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def get_max_in_flight(self) -> int:
+        return self._max_in_flight
+
+    def set_max_in_flight(self, max_in_flight: int) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+        # 已在途的请求释放到旧窗口，不影响新窗口计数
+        self._max_in_flight = max_in_flight
+        self._window = asyncio.Semaphore(max_in_flight)
+
+    def in_flight(self) -> int:
+        return len(self._pending_responses)
+
+    async def call(self, seq: int, send: Callable[[], Awaitable[Any]], timeout: float) -> dict:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        window = self._window
+        if window.locked():
+            try:
+                await asyncio.wait_for(window.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"In-flight window full, seq={seq} not sent")
+        else:
+            await window.acquire()
+        try:
+            # 先登记再发送，避免响应先于登记到达
+            future = loop.create_future()
+            self._pending_responses[seq] = future
+            try:
+                await send()
+                return await asyncio.wait_for(future, timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Response timeout for seq={seq}")
+            finally:
+                self._pending_responses.pop(seq, None)
+                if not future.done():
+                    future.cancel()
+        finally:
+            window.release()
+
+    def resolve(self, message: dict) -> Optional[bool]:
+        """
+        返回 None 表示没有等待该 seq 的请求，False 表示 future 已完成
+        """
+        seq = message.get("seq")
+        if seq is None:
+            return None
+        future = self._pending_responses.get(seq)
+        if future is None:
+            return None
+        if future.done():
+            return False
+        future.set_result(message)
+        return True
+
+    def fail_all(self, exc: BaseException) -> None:
+        """
+        连接断开时让已发出、等待响应的请求立即失败
+        """
+        for future in self._pending_responses.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending_responses.clear()
+
+    def cancel_all(self) -> None:
+        for future in self._pending_responses.values():
+            if not future.done():
+                future.cancel()
+        self._pending_responses.clear()
@@ -0,0 +1,263 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from .messenger import Messenger
+from .msg import Msg
+
+# 仅由这些 tag 与 Text 组成的消息才允许合并
+_BASE_TAGS = frozenset({
+    Msg.Account, Msg.Group, Msg.GroupId, Msg.Friend, Msg.Uin,
+    Msg.Temp, Msg.Guild, Msg.GuildId, Msg.ChannelId,
+})
+_MAX_BUCKETS = 4096
+
+
+class Priority(IntEnum):
+    Reply = 0  # 对收到消息的回复
+    Normal = 1
+    Broadcast = 2  # 群发、定时推送
+
+
+class RateLimit:
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate: float = rate
+        self.burst: int = burst if burst is not None else max(int(rate), 1)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, limit: RateLimit) -> None:
+        self.rate: float = limit.rate
+        self.capacity: float = float(limit.burst)
+        self.tokens: float = float(limit.burst)
+        self.updated: float = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """
+        距离可取得一个令牌还需等待的秒数
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class _Item:
+    __slots__ = ("messenger", "rsp", "timeout", "priority", "account", "target", "future", "enqueued")
+
+    def __init__(self, messenger: Messenger, rsp: bool, timeout: float, priority: Priority, future: asyncio.Future) -> None:
+        self.messenger: Messenger = messenger
+        self.rsp: bool = rsp
+        self.timeout: float = timeout
+        self.priority: Priority = priority
+        self.account: Optional[str] = messenger.get_msg(Msg.Account, None)
+        self.target: Optional[Hashable] = target_key(messenger)
+        self.future: asyncio.Future = future
+        self.enqueued: float = time.monotonic()
+
+
+def target_key(messenger: Messenger) -> Optional[Hashable]:
+    if messenger.has_msg(Msg.Group):
+        return (Msg.Group, messenger.get_msg(Msg.GroupId))
+    if messenger.has_msg(Msg.Friend):
+        return (Msg.Friend, messenger.get_msg(Msg.Uin))
+    if messenger.has_msg(Msg.Temp):
+        return (Msg.Temp, messenger.get_msg(Msg.GroupId), messenger.get_msg(Msg.Uin))
+    if messenger.has_msg(Msg.Guild):
+        return (Msg.Guild, messenger.get_msg(Msg.GuildId), messenger.get_msg(Msg.ChannelId))
+    return None
+
+
+def _text_only(messenger: Messenger) -> bool:
+    has_text = False
+    for map_dict in messenger.list:
+        for tag in map_dict:
+            if tag == Msg.Text:
+                has_text = True
+            elif tag not in _BASE_TAGS:
+                return False
+    return has_text
+
+
+class SendScheduler:
+    """
+    出站调度：按账号、按目标（群/好友/临时会话/频道）令牌桶限速，高优先级通道先发
+    coalesce_text 开启时，同一通道内发往同一目标的纯文本消息在排队期间合并为一条
+    """
+    def __init__(self,
+                 send: Callable[[Messenger, bool, float], Awaitable[Optional[dict]]],
+                 account_limit: Optional[RateLimit] = None,
+                 target_limit: Optional[RateLimit] = None,
+                 *,
+                 coalesce_text: bool = False,
+                 coalesce_max_chars: int = 2000
+    ) -> None:
+        self._send = send
+        self._account_limit: Optional[RateLimit] = account_limit
+        self._target_limit: Optional[RateLimit] = target_limit
+        self._coalesce_text: bool = coalesce_text
+        self._coalesce_max_chars: int = coalesce_max_chars
+        self._lanes: dict[Priority, deque[_Item]] = {p: deque() for p in Priority}
+        self._account_buckets: dict[Any, TokenBucket] = {}
+        self._target_buckets: dict[Any, TokenBucket] = {}
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._deliveries: set[asyncio.Task] = set()
+        self.sent: int = 0
+        self.coalesced: int = 0
+        self.wait_count: int = 0
+        self.wait_total: float = 0
+        self.wait_max: float = 0
+
+    async def submit(self, messenger: Messenger, rsp: bool = True, timeout: float = 0,
+                     priority: Priority = Priority.Normal) -> Optional[dict]:
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[Priority(priority)].append(_Item(messenger, rsp, timeout, priority, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name="send-scheduler")
+        self._wakeup.set()
+        return await future
+
+    def depth(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def _bucket(self, buckets: dict[Any, TokenBucket], limit: Optional[RateLimit], key: Any) -> Optional[TokenBucket]:
+        if limit is None or key is None:
+            return None
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= _MAX_BUCKETS:
+                # 清理已回满（长时间空闲）的桶
+                now = time.monotonic()
+                for stale in [k for k, b in buckets.items() if b.delay(now) == 0 and b.tokens >= b.capacity]:
+                    del buckets[stale]
+            bucket = buckets[key] = TokenBucket(limit)
+        return bucket
+
+    def _pick(self, now: float) -> tuple[Optional[_Item], float]:
+        """
+        返回可立即发送的条目；没有时返回最短等待时间
+        """
+        min_wait = float("inf")
+        for priority in Priority:
+            lane = self._lanes[priority]
+            blocked: set[Any] = set()
+            for item in lane:
+                key = (item.account, item.target)
+                # 同一目标保持先进先出
+                if key in blocked:
+                    continue
+                if item.future.done():
+                    lane.remove(item)
+                    return None, 0
+                account_bucket = self._bucket(self._account_buckets, self._account_limit, item.account)
+                target_bucket = self._bucket(self._target_buckets, self._target_limit, item.target)
+                wait = max(
+                    account_bucket.delay(now) if account_bucket else 0,
+                    target_bucket.delay(now) if target_bucket else 0,
+                )
+                if wait == 0:
+                    lane.remove(item)
+                    if account_bucket:
+                        account_bucket.take()
+                    if target_bucket:
+                        target_bucket.take()
+                    return item, 0
+                blocked.add(key)
+                min_wait = min(min_wait, wait)
+        return None, min_wait
+
+    def _coalesce(self, item: _Item) -> list[_Item]:
+        merged = [item]
+        if not self._coalesce_text or item.target is None or not _text_only(item.messenger):
+            return merged
+        lane = self._lanes[item.priority]
+        size = len(item.messenger.get_msg(Msg.Text, ""))
+        for other in list(lane):
+            if other.account != item.account or other.target != item.target:
+                continue
+            if other.future.done():
+                # 调用方已取消，不再发送
+                lane.remove(other)
+                continue
+            if other.rsp != item.rsp or not _text_only(other.messenger):
+                # 同一目标的非文本消息之后不能再越过它合并
+                break
+            text = other.messenger.get_msg(Msg.Text, "")
+            if size + len(text) + 1 > self._coalesce_max_chars:
+                break
+            lane.remove(other)
+            size += len(text) + 1
+            merged.append(other)
+        if len(merged) > 1:
+            messenger = Messenger.get_base_messenger(item.messenger)
+            messenger.add_msg(Msg.Text, "\n".join(m.messenger.get_msg(Msg.Text, "") for m in merged))
+            item.messenger = messenger
+            self.coalesced += len(merged) - 1
+        return merged
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.depth():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            item, wait = self._pick(time.monotonic())
+            if item is None:
+                if wait:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+            items = self._coalesce(item)
+            waited = time.monotonic() - item.enqueued
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            task = loop.create_task(self._deliver(item, items))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, item: _Item, items: list[_Item]) -> None:
+        try:
+            result = await self._send(item.messenger, item.rsp, item.timeout)
+        except BaseException as e:
+            for merged in items:
+                if not merged.future.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        merged.future.cancel()
+                    else:
+                        merged.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            self.sent += 1
+            for merged in items:
+                if not merged.future.done():
+                    merged.future.set_result(result)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "depth": self.depth(),
+            "lanes": {p.name: len(lane) for p, lane in self._lanes.items()},
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "wait_avg": self.wait_total / self.wait_count if self.wait_count else 0,
+            "wait_max": self.wait_max,
+        }
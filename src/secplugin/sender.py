@@ -1,3 +1,5 @@
+import asyncio
+import inspect
 import json
 import logging
 import re
@@ -6,8 +8,18 @@ from typing_extensions import Protocol
 
 from .msg import Msg
 from .cmd import Cmd
+from .cache import TTLCache
 from .logger import Logger
 from .messenger import Messenger
+from .scheduler import Priority
+
+# 收到这些事件时相关的管理员列表、群列表缓存失效
+_INVALIDATE_TAGS = frozenset({Msg.GroupModifyAdmin, Msg.GroupMemberJoin, Msg.GroupMemberExit})
+
+
+def invalidates_cache(data: list[dict[str, Any]]) -> bool:
+    return any(not _INVALIDATE_TAGS.isdisjoint(map_dict) for map_dict in data)
+
 
 class AbstractSender(Protocol):
     def running(self) -> bool:
@@ -19,19 +31,117 @@ class AbstractSender(Protocol):
     def get_local_send_wait_timeout(self) -> float:
         ...
     
-    async def send_ws_msg(self, cmd: Cmd | str, data: dict | Messenger, rsp: bool = True, timeout: float = 0) -> Optional[dict]:
+    async def send_ws_msg(self, cmd: Cmd | str, data: dict | Messenger, rsp: bool = True, timeout: float = 0,
+                          priority: Priority = Priority.Normal) -> Optional[dict]:
+        """
+        priority 为可选参数：不接受它的旧实现仍可使用，Sender 不会传入
+        """
         ...
 
+
+def _accepts_priority(send_ws_msg: Any) -> bool:
+    try:
+        parameters = inspect.signature(send_ws_msg).parameters
+    except (TypeError, ValueError):
+        return False
+    return "priority" in parameters or any(p.kind is p.VAR_KEYWORD for p in parameters.values())
+
+
 class Sender:
-    def __init__(self, abstract_sender: AbstractSender) -> None:
+    def __init__(self, abstract_sender: AbstractSender, *, cache_ttl: float = 60, cache_maxsize: int = 1024) -> None:
         self._sender: AbstractSender = abstract_sender
         self._logger: Logger = abstract_sender.get_logger()
+        self._cache: TTLCache = TTLCache(cache_maxsize, cache_ttl)
+        # 只在实现声明了 priority 参数时传入，兼容不支持优先级的 AbstractSender 实现
+        self._accepts_priority: bool = _accepts_priority(abstract_sender.send_ws_msg)
+
+    async def _send_ws_msg(self,
+                           cmd: Cmd | str,
+                           data: dict | Messenger,
+                           rsp: bool = True,
+                           priority: Priority = Priority.Normal
+    ) -> Optional[dict]:
+        if self._accepts_priority:
+            return await self._sender.send_ws_msg(cmd, data, rsp, priority=priority)
+        return await self._sender.send_ws_msg(cmd, data, rsp)
 
     def running(self) -> bool:
         return self._sender.running()
+
+    def get_cache_stats(self) -> dict[str, Any]:
+        return self._cache.stats()
+
+    def invalidate_cache(self, account: Optional[str] = None, group_id: Optional[str] = None) -> None:
+        """
+        都为 None 时清空全部缓存；只给 account 时清除该账号的所有查询
+        """
+        if account is None and group_id is None:
+            self._cache.invalidate()
+            return
+        account = str(account) if account is not None else None
+        group_id = str(group_id) if group_id is not None else None
+        self._cache.invalidate_where(
+            lambda key: (account is None or key[1] == account)
+                        and (group_id is None or key[0] != "admin" or key[2] == group_id)
+        )
+
+    def on_push(self, data: list[dict[str, Any]]) -> None:
+        """
+        按推送事件使相关缓存失效；分片模式下父进程会把这类事件同时广播给其他分片
+        """
+        if not self._cache.enabled() or not len(self._cache) or not invalidates_cache(data):
+            return
+        messenger = Messenger(data)
+        account = messenger.get_msg(Msg.Account, None)
+        group_id = messenger.get_msg(Msg.GroupId, None)
+        self._cache.invalidate(("admin", account, group_id))
+        if not messenger.has_msg(Msg.GroupModifyAdmin):
+            # 成员进出群可能是机器人自身，群列表一并失效
+            self._cache.invalidate(("group_list", account))
+
+    async def send_batch(self,
+                         messengers: List[Messenger],
+                         *,
+                         interval: float = 0,
+                         rsp: bool = True,
+                         priority: Priority = Priority.Reply
+    ) -> list[dict]:
+        """
+        流水线发送多条消息：按顺序发出全部帧后并发等待响应，结果与输入顺序一致，失败项为 {}
+        interval 为相邻两帧的最小发送间隔（秒）
+        """
+        if not self.running():
+            raise RuntimeError("Plugin has not running")
+
+        async def send_one(index: int, messenger: Messenger) -> dict:
+            if interval > 0 and index:
+                await asyncio.sleep(interval * index)
+            try:
+                result = await self._send_ws_msg(Cmd.SendOicqMsg, messenger, rsp, priority=priority)
+            except Exception as e:
+                self._logger.error(e, tag="send_batch")
+                return {}
+            return result if result else {}
+
+        return list(await asyncio.gather(*(send_one(i, m) for i, m in enumerate(messengers))))
+
+    @staticmethod
+    def _split_parts(reply: Messenger, tag: str, values: tuple) -> List[Messenger]:
+        parts = []
+        for value in values:
+            part = Messenger([dict(map_dict) for map_dict in reply.list])
+            part.add_msg(tag, value)
+            parts.append(part)
+        return parts
+
+    async def _query_data(self, reply: Messenger) -> Optional[Any]:
+        res = await self._send_ws_msg(Cmd.SendOicqMsg, reply, rsp = True, priority=Priority.Reply)
+        if res is None:
+            return None
+        return res.get("data", [])
     
-    async def send_ws_msg(self, cmd: Cmd | str, messenger: Messenger, rsp: bool = True) -> Any:
-        return await self._sender.send_ws_msg(cmd, messenger, rsp)
+    async def send_ws_msg(self, cmd: Cmd | str, messenger: Messenger, rsp: bool = True, priority: Priority = Priority.Normal) -> Any:
+        return await self._send_ws_msg(cmd, messenger, rsp, priority=priority)
 
     async def set_group_member_nick(self,
                                     messenger_or_qun: Messenger | str,
@@ -52,7 +162,7 @@ class Sender:
             reply.add_msg(Msg.GroupMemberNickModify) \
                  .add_msg(Msg.Uin, uin) \
                  .add_msg(Msg.Nick, nick)
-            await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply, rsp=False)
+            await self._send_ws_msg(Cmd.SendOicqMsg, reply, rsp=False)
         except Exception as e:
             self._logger.error(e, tag="set_group_member_nick")
 
@@ -68,7 +178,7 @@ class Sender:
                 reply.add_msg(Msg.Group)
                 reply.add_msg(Msg.GroupId, str(messenger_or_qun))
             reply.add_msg(Msg.Withdraw, msgId)
-            await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply, rsp=False)
+            await self._send_ws_msg(Cmd.SendOicqMsg, reply, rsp=False)
         except Exception as e:
             self._logger.error(e, tag="withdraw")
 
@@ -84,7 +194,7 @@ class Sender:
                 case Msg.JSON_QQ:
                     for i in range(min(len(args), 5)):
                         reply.add_msg(arguments[i], args[i])
-            return await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
+            return await self._send_ws_msg(Cmd.SendOicqMsg, reply, priority=Priority.Reply)
         except Exception as e:
             self._logger.error(e, tag="send_json_card")
 
@@ -102,10 +212,13 @@ class Sender:
                 reply.add_msg(Msg.Group)
                 reply.add_msg(Msg.GroupId, str(messenger_or_qun))
             reply.add_msg(Msg.GroupMemberListGetAdmin)
-            operators = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply, rsp = True)
+            if reply.has_msg(Msg.Group):
+                key = ("admin", reply.get_msg(Msg.Account), reply.get_msg(Msg.GroupId))
+                operators = await self._cache.get_or_load(key, lambda: self._query_data(reply))
+            else:
+                operators = await self._query_data(reply)
             if operators is None:
                 return False
-            operators = operators.get("data", [])
             if uin and uin in operators:
                 return True
             return False
@@ -123,15 +236,21 @@ class Sender:
                 reply = Messenger()
                 reply.add_msg(Msg.Account, messenger_or_account)
                 reply.add_msg(Msg.GroupListGet)
-            group_list = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply, rsp = True)
+            if reply.has_msg(Msg.GroupListGet):
+                key = ("group_list", reply.get_msg(Msg.Account))
+                group_list = await self._cache.get_or_load(key, lambda: self._query_data(reply))
+            else:
+                group_list = await self._query_data(reply)
             if group_list is None:
                 return []
-            return group_list.get("data", [])
+            # 缓存中的列表为所有调用方共享，返回副本
+            return list(group_list)
         except Exception as e:
             self._logger.error(e, tag="get_group_list")
             return []
 
-    async def send_msg(self, messenger: Messenger, *text: str, reply_msg_id: int = 0, in_one: bool = False) -> dict | list[dict]:
+    async def send_msg(self, messenger: Messenger, *text: str, reply_msg_id: int = 0, in_one: bool = False,
+                       priority: Priority = Priority.Reply) -> dict | list[dict]:
         if not self.running():
             raise RuntimeError("Plugin has not running")
         try:
@@ -142,24 +261,15 @@ class Sender:
                 if in_one:
                     for u in text:
                         reply.add_msg(Msg.Text, u)
-                    res = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
+                    res = await self._send_ws_msg(Cmd.SendOicqMsg, reply, priority=priority)
                     if res is None:
                         return {}
                     return res
                 else:
-                    res = []
-                    for u in text:
-                        if reply.has_msg(Msg.Text):
-                            reply.del_msg(Msg.Text)
-                        reply.add_msg(Msg.Text, u)
-                        result = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
-                        if result is None:
-                            result = {}
-                        res.append(result)
-                    return res
+                    return await self.send_batch(self._split_parts(reply, Msg.Text, text), priority=priority)
             elif text:
                 reply.add_msg(Msg.Text, text[0])
-                res = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
+                res = await self._send_ws_msg(Cmd.SendOicqMsg, reply, priority=priority)
                 if res is None:
                     return {}
                 return res
@@ -169,18 +279,20 @@ class Sender:
             self._logger.error(e, tag = "send_text")
             return {}
 
-    async def send_reply_msg(self, messenger: 'Messenger', *text: str, reply_msg_id: int = 0) -> dict | list[dict]:
+    async def send_reply_msg(self, messenger: 'Messenger', *text: str, reply_msg_id: int = 0,
+                             priority: Priority = Priority.Reply) -> dict | list[dict]:
         if not self.running():
             raise RuntimeError("Plugin has not running")
         try:
             if not reply_msg_id:
                 reply_msg_id = messenger.get_msg(Msg.MsgId)
-            return await self.send_msg(messenger, *text, reply_msg_id = reply_msg_id)
+            return await self.send_msg(messenger, *text, reply_msg_id = reply_msg_id, priority = priority)
         except Exception as e:
             self._logger.error(e, tag="send_reply_msg")
             return {}
 
-    async def send_card(self, messenger: Messenger, *json: tuple[str], in_one: bool = True) -> dict | list[dict]:
+    async def send_card(self, messenger: Messenger, *json: tuple[str], in_one: bool = True,
+                        priority: Priority = Priority.Reply) -> dict | list[dict]:
         if not self.running():
             raise RuntimeError("Plugin has not running")
         try:
@@ -189,24 +301,15 @@ class Sender:
                 if in_one:
                     for u in json:
                         reply.add_msg(Msg.Json, u)
-                    res = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
+                    res = await self._send_ws_msg(Cmd.SendOicqMsg, reply, priority=priority)
                     if res is None:
                         return {}
                     return res
                 else:
-                    res = []
-                    for u in json:
-                        if reply.has_msg(Msg.Json):
-                            reply.del_msg(Msg.Json)
-                        reply.add_msg(Msg.Json, u)
-                        result = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
-                        if result is None:
-                            result = {}
-                        res.append(result)
-                    return res
+                    return await self.send_batch(self._split_parts(reply, Msg.Json, json), priority=priority)
             elif json:
                 reply.add_msg(Msg.Json, json[0])
-                res = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
+                res = await self._send_ws_msg(Cmd.SendOicqMsg, reply, priority=priority)
                 if res is None:
                     return {}
                 return res
@@ -216,7 +319,8 @@ class Sender:
             self._logger.error(e, tag = "send_card")
             return {}
 
-    async def send_img(self, messenger: Messenger, *url: tuple[str], in_one: bool = True) -> dict | list[dict]:
+    async def send_img(self, messenger: Messenger, *url: tuple[str], in_one: bool = True,
+                       priority: Priority = Priority.Reply) -> dict | list[dict]:
         if not self.running():
             raise RuntimeError("Plugin has not running")
         try:
@@ -225,24 +329,15 @@ class Sender:
                 if in_one:
                     for u in url:
                         reply.add_msg(Msg.Img, u)
-                    res = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
+                    res = await self._send_ws_msg(Cmd.SendOicqMsg, reply, priority=priority)
                     if res is None:
                         return {}
                     return res
                 else:
-                    res = []
-                    for u in url:
-                        if reply.has_msg(Msg.Img):
-                            reply.del_msg(Msg.Img)
-                        reply.add_msg(Msg.Img, u)
-                        result = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
-                        if result is None:
-                            result = {}
-                        res.append(result)
-                    return res
+                    return await self.send_batch(self._split_parts(reply, Msg.Img, url), priority=priority)
             elif url:
                 reply.add_msg(Msg.Img, url[0])
-                res = await self._sender.send_ws_msg(Cmd.SendOicqMsg, reply)
+                res = await self._send_ws_msg(Cmd.SendOicqMsg, reply, priority=priority)
                 if res is None:
                     return {}
                 return res
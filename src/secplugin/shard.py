@@ -0,0 +1,601 @@
+from __future__ import annotations
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+import zlib
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import recv_handle, send_handle
+from typing import Any, Awaitable, Callable, Optional
+
+from .cmd import Cmd
+from .logger import Logger
+from .messenger import Messenger
+from .msg import Msg
+
+# 父子进程间的消息类型
+_PUSH = "push"
+_SEND = "send"
+_RSP = "rsp"
+_PING = "ping"
+_PONG = "pong"
+_STOP = "stop"
+_LOG = "log"
+_INVALIDATE = "invalidate"
+
+# 模板进程的控制指令
+_SPAWN = "spawn"
+_REAP = "reap"
+_CLOSE: Any = object()
+
+# 子进程等待父进程回复的额外余量（秒）：父进程侧发送窗口与响应各自最多等待 timeout
+_RSP_GRACE = 5.0
+
+
+def shard_index(data: list[dict[str, Any]], shards: int, shard_by: str = Msg.GroupId) -> int:
+    """
+    按 shard_by 对应的值（缺失时退回 Account）计算稳定的分片下标，同一群/账号的消息始终落在同一分片
+    """
+    key = None
+    for map_dict in data:
+        if shard_by in map_dict:
+            key = map_dict[shard_by]
+            break
+    if key is None:
+        for map_dict in data:
+            if Msg.Account in map_dict:
+                key = map_dict[Msg.Account]
+                break
+    if key is None:
+        return 0
+    # 内置 hash 在各进程间随机化，这里用 crc32
+    return zlib.crc32(str(key).encode("utf-8")) % shards
+
+
+class _Channel:
+    """
+    单向管道的一端：put 不阻塞（由后台线程写入），get 支持超时（超时抛出 queue.Empty），对端关闭后抛出 EOFError
+    与 multiprocessing.Queue 不同，管道的文件描述符可以在进程启动后经模板进程交给新的分片
+    """
+    def __init__(self, conn: Connection) -> None:
+        self._conn: Connection = conn
+        self._buffer: queue.SimpleQueue = queue.SimpleQueue()
+        self._feeder: Optional[threading.Thread] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def put(self, obj: Any) -> None:
+        if self._feeder is None:
+            with self._lock:
+                if self._feeder is None:
+                    self._feeder = threading.Thread(target=self._feed, name="shard-feeder", daemon=True)
+                    self._feeder.start()
+        self._buffer.put(obj)
+
+    def _feed(self) -> None:
+        while True:
+            obj = self._buffer.get()
+            if obj is _CLOSE:
+                return
+            try:
+                self._conn.send(obj)
+            except (OSError, ValueError):
+                # 对端已退出
+                return
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        if timeout is not None and not self._conn.poll(timeout):
+            raise queue.Empty
+        return self._conn.recv()
+
+    def close(self, timeout: float = 1) -> None:
+        """
+        等待已 put 的数据写完（至多 timeout 秒）后关闭
+        """
+        if self._feeder is not None:
+            self._buffer.put(_CLOSE)
+            self._feeder.join(timeout)
+        self._conn.close()
+
+
+def _run_forked(target: Callable[[int, Any, Any, int], None], index: int, fd_in: int, fd_out: int) -> None:
+    inbox = _Channel(Connection(fd_in, writable=False))
+    outbox = _Channel(Connection(fd_out, readable=False))
+    code = 1
+    try:
+        target(index, inbox, outbox, os.getppid())
+        code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        # 子进程以 os._exit 结束，不会执行 atexit，先把发往父进程的数据（包括日志）写完
+        outbox.close(5)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def _template_main(target: Callable[[int, Any, Any, int], None], control: Connection, parent_control: Connection) -> None:
+    """
+    模板进程：在父进程启动事件循环之前 fork 出来，之后所有分片（包括重启）都由它 fork，
+    避免从已有多个线程的父进程中 fork；处理器无法 pickle，因此不能改用 spawn / forkserver
+    父进程关闭控制管道后退出，分片随即发现父进程变化并结束
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # fork 时继承的父进程一端，不关闭就收不到 EOF
+    parent_control.close()
+    exited: dict[int, int] = {}
+    while True:
+        try:
+            msg = control.recv()
+        except (EOFError, OSError):
+            return
+        if msg[0] == _SPAWN:
+            fd_in = recv_handle(control)
+            fd_out = recv_handle(control)
+            pid = os.fork()
+            if pid == 0:
+                control.close()
+                _run_forked(target, msg[1], fd_in, fd_out)
+            os.close(fd_in)
+            os.close(fd_out)
+            control.send(pid)
+        elif msg[0] == _REAP:
+            while True:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if pid == 0:
+                    break
+                exited[pid] = os.waitstatus_to_exitcode(status)
+            control.send(exited)
+            exited = {}
+
+
+class _ShardProcess:
+    """
+    由模板进程 fork 的分片进程，提供 ShardPool 用到的 multiprocessing.Process 接口
+    退出状态由模板进程回收，经 ShardPool._reap 更新 exitcode
+    """
+    def __init__(self, pid: int, reap: Callable[[], None]) -> None:
+        self.pid: int = pid
+        self.exitcode: Optional[int] = None
+        self._reap: Callable[[], None] = reap
+
+    def is_alive(self) -> bool:
+        if self.exitcode is None:
+            self._reap()
+        return self.exitcode is None
+
+    def _signal(self, signum: int) -> None:
+        if self.exitcode is None:
+            try:
+                os.kill(self.pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self) -> None:
+        self._signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self._signal(signal.SIGKILL)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_alive():
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(0.02)
+
+
+class ShardPool:
+    """
+    父进程侧：持有 N 个 worker 进程，按稳定 key 把推送消息分发到固定分片，并代理分片的出站请求
+    分片在 heartbeat_timeout 内未响应心跳（事件循环被阻塞或进程退出）时会被重启
+    分片进程由 start() 时 fork 的模板进程创建（fork 期间暂停日志监听线程），重启时不会从运行中的（多线程）父进程 fork
+    健康检查中与模板进程的往返、等待旧进程退出都在线程中执行，不阻塞事件循环
+    """
+    def __init__(self,
+                 shards: int,
+                 target: Callable[[int, Any, Any, int], None],
+                 send: Callable[..., Awaitable[Optional[dict]]],
+                 logger: Logger,
+                 *,
+                 shard_by: str = Msg.GroupId,
+                 heartbeat: float = 5,
+                 heartbeat_timeout: float = 30,
+                 on_metrics: Optional[Callable[[dict[str, Any]], None]] = None
+    ) -> None:
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("Sharded mode requires the 'fork' start method")
+        self._ctx = multiprocessing.get_context("fork")
+        self._shards: int = shards
+        self._target = target
+        self._send = send
+        self._logger: Logger = logger
+        self._shard_by: str = shard_by
+        self._heartbeat: float = heartbeat
+        self._heartbeat_timeout: float = heartbeat_timeout
+        # 子进程随心跳上报的指标增量交给 on_metrics 累加到父进程
+        self._on_metrics: Optional[Callable[[dict[str, Any]], None]] = on_metrics
+        self._processes: list[Any] = [None] * shards
+        self._inboxes: list[Any] = [None] * shards
+        self._outboxes: list[Any] = [None] * shards
+        self._last_seen: list[float] = [0.0] * shards
+        self._reports: list[dict[str, Any]] = [{} for _ in range(shards)]
+        self._dispatched: list[int] = [0] * shards
+        self._restarts: list[int] = [0] * shards
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # attach 之前收到的子进程消息暂存于此，绑定事件循环后依次处理
+        self._early: list[tuple[int, Any, tuple]] = []
+        self._attach_lock: threading.Lock = threading.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        self._requests: set[asyncio.Task] = set()
+        self._template: Optional[Any] = None
+        self._control: Optional[Connection] = None
+        # 控制管道是一问一答，事件循环线程与执行器线程都会使用
+        self._control_lock: threading.Lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        须在事件循环启动前调用：此时 fork 模板进程，父进程中尽量没有其他线程
+        """
+        control, child_control = self._ctx.Pipe(duplex=True)
+        self._template = self._ctx.Process(
+            target=_template_main,
+            args=(self._target, child_control, control),
+            name="secplugin-shard-template",
+            daemon=True,
+        )
+        # 监听线程可能正持有队列或 handler 的锁，fork 期间先停下，模板进程中不留这些锁
+        Logger.pause()
+        try:
+            self._template.start()
+        finally:
+            Logger.resume()
+        child_control.close()
+        self._control = control
+        for index in range(self._shards):
+            self._spawn(index)
+
+    def _spawn(self, index: int) -> None:
+        self._install(index, *self._fork(index))
+
+    def _fork(self, index: int) -> tuple[_ShardProcess, _Channel, _Channel]:
+        """
+        请模板进程 fork 一个分片（阻塞，重启时在线程中调用）
+        """
+        in_read, in_write = self._ctx.Pipe(duplex=False)
+        out_read, out_write = self._ctx.Pipe(duplex=False)
+        try:
+            with self._control_lock:
+                self._control.send((_SPAWN, index))
+                send_handle(self._control, in_read.fileno(), self._template.pid)
+                send_handle(self._control, out_write.fileno(), self._template.pid)
+                pid = self._control.recv()
+        except (EOFError, OSError, AttributeError) as e:
+            in_write.close()
+            out_read.close()
+            raise RuntimeError("Shard template process has exited") from e
+        finally:
+            in_read.close()
+            out_write.close()
+        return _ShardProcess(pid, self._reap), _Channel(in_write), _Channel(out_read)
+
+    def _install(self, index: int, process: _ShardProcess, inbox: _Channel, outbox: _Channel) -> None:
+        self._processes[index] = process
+        self._inboxes[index] = inbox
+        self._outboxes[index] = outbox
+        self._last_seen[index] = time.monotonic()
+        threading.Thread(target=self._read, args=(index, inbox, outbox), name=f"shard-reader-{index}", daemon=True).start()
+
+    def _reap(self) -> None:
+        """
+        向模板进程查询已退出的分片并更新 exitcode；模板进程不在时视为全部退出
+        """
+        try:
+            with self._control_lock:
+                self._control.send((_REAP,))
+                exited = self._control.recv()
+        except (EOFError, OSError, AttributeError):
+            exited = None
+        for process in self._processes:
+            if process is None or process.exitcode is not None:
+                continue
+            if exited is None:
+                process.exitcode = -1
+            elif process.pid in exited:
+                process.exitcode = exited[process.pid]
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        绑定父进程事件循环并启动健康检查
+        """
+        with self._attach_lock:
+            self._loop = loop
+            early, self._early = self._early, []
+        if self._health_task is not None:
+            self._health_task.cancel()
+        now = time.monotonic()
+        self._last_seen = [now] * self._shards
+        self._health_task = loop.create_task(self._health(), name="shard-health")
+        for item in early:
+            loop.call_soon(self._on_message, *item)
+
+    def dispatch(self, data: list[dict[str, Any]]) -> int:
+        index = shard_index(data, self._shards, self._shard_by)
+        self._inboxes[index].put((_PUSH, data))
+        self._dispatched[index] += 1
+        return index
+
+    def broadcast_invalidate(self, data: list[dict[str, Any]], skip: int) -> None:
+        """
+        使缓存失效的推送只分发给一个分片，其余分片也需要据此清除各自的缓存
+        """
+        for index, inbox in enumerate(self._inboxes):
+            if index != skip and inbox is not None:
+                inbox.put((_INVALIDATE, data))
+
+    def _read(self, index: int, inbox: Any, outbox: Any) -> None:
+        while True:
+            try:
+                msg = outbox.get()
+            except (EOFError, OSError):
+                # 分片进程已退出
+                outbox.close()
+                return
+            if msg[0] == _LOG:
+                # 子进程的日志直接交给父进程的日志队列，不经过事件循环
+                Logger.handle_forwarded(msg[1])
+                continue
+            with self._attach_lock:
+                loop = self._loop
+                if loop is None:
+                    self._early.append((index, inbox, msg))
+                    continue
+            try:
+                loop.call_soon_threadsafe(self._on_message, index, inbox, msg)
+            except RuntimeError:
+                # 事件循环已关闭
+                return
+
+    def _on_message(self, index: int, inbox: Any, msg: tuple) -> None:
+        if inbox is not self._inboxes[index]:
+            # 来自已被替换的旧进程
+            return
+        self._last_seen[index] = time.monotonic()
+        kind = msg[0]
+        if kind == _SEND:
+            task = asyncio.get_running_loop().create_task(self._forward(inbox, *msg[1:]))
+            self._requests.add(task)
+            task.add_done_callback(self._requests.discard)
+        elif kind == _PONG:
+            report = msg[1]
+            metrics = report.pop("metrics", None)
+            if metrics and self._on_metrics is not None:
+                self._on_metrics(metrics)
+            self._reports[index] = report
+
+    async def _forward(self,
+                       inbox: Any,
+                       req_id: int,
+                       cmd: str,
+                       data: Any,
+                       is_messenger: bool,
+                       rsp: bool,
+                       timeout: float,
+                       priority: int
+    ) -> None:
+        # 被取消（CancelledError 不是 Exception）时也要回复，否则子进程一直等待
+        result, error = None, ("CancelledError", "request cancelled by the parent process")
+        try:
+            if is_messenger:
+                data = Messenger(data)
+            result = await self._send(cmd, data, rsp, timeout, priority)
+            error = None
+        except Exception as e:
+            error = (type(e).__name__, str(e))
+        finally:
+            if req_id:
+                inbox.put((_RSP, req_id, result, error))
+
+    async def _health(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self._heartbeat)
+            await loop.run_in_executor(None, self._reap)
+            now = time.monotonic()
+            for index, process in enumerate(self._processes):
+                if process.exitcode is not None:
+                    reason = f"进程已退出（exitcode={process.exitcode}）"
+                elif now - self._last_seen[index] > self._heartbeat_timeout:
+                    reason = f"{self._heartbeat_timeout}s 内无心跳响应"
+                else:
+                    self._inboxes[index].put((_PING,))
+                    continue
+                self._logger.warning(f"分片 {index} {reason}，正在重启", tag="shard")
+                try:
+                    await self._restart(index)
+                except RuntimeError as e:
+                    self._logger.error(f"分片 {index} 重启失败", e, tag="shard")
+
+    async def _restart(self, index: int) -> None:
+        # 旧进程退出后管道关闭，旧的读线程随之结束
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._kill, self._processes[index], 1)
+        self._inboxes[index].close(0)
+        self._restarts[index] += 1
+        self._reports[index] = {}
+        self._install(index, *await loop.run_in_executor(None, self._fork, index))
+
+    @staticmethod
+    def _kill(process: Any, timeout: float) -> None:
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join(timeout)
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        通知各分片处理完已收到的消息后退出，超时未退出的强制结束
+        """
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for inbox in self._inboxes:
+            if inbox is not None:
+                inbox.put((_STOP,))
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(max(deadline - time.monotonic(), 0))
+            self._kill(process, 1)
+        for inbox in self._inboxes:
+            if inbox is not None:
+                inbox.close(0)
+        if self._control is not None:
+            # 模板进程读到 EOF 后退出
+            self._control.close()
+            self._control = None
+            self._template.join(timeout)
+        self._loop = None
+
+    def stats(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "pid": process.pid,
+                # 以最近一次健康检查的结果为准，不在调用方线程中查询模板进程
+                "alive": process.exitcode is None,
+                "dispatched": self._dispatched[index],
+                "restarts": self._restarts[index],
+                **self._reports[index],
+            }
+            for index, process in enumerate(self._processes)
+        ]
+
+
+class ShardLink:
+    """
+    子进程侧：从父进程接收推送消息，出站请求经父进程的连接发送
+    父进程退出后子进程随之结束
+    """
+    def __init__(self,
+                 index: int,
+                 inbox: Any,
+                 outbox: Any,
+                 parent_pid: int,
+                 idle_timeout: float = 5,
+                 default_timeout: float = 15
+    ) -> None:
+        self.index: int = index
+        self._inbox = inbox
+        self._outbox = outbox
+        self._parent_pid: int = parent_pid
+        self._idle_timeout: float = idle_timeout
+        # timeout=0 时父进程使用的默认等待时间，用于计算子进程侧的截止时间
+        self._default_timeout: float = default_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._futures: dict[int, asyncio.Future] = {}
+        self._seq: int = 0
+        self._stopped: Optional[asyncio.Event] = None
+        self._report: Callable[[], dict[str, Any]] = dict
+        self._invalidate: Optional[Callable[[list[dict[str, Any]]], None]] = None
+
+    async def serve(self,
+                    on_push: Callable[[Any, Callable[[], bool]], Awaitable[Any]],
+                    report: Callable[[], dict[str, Any]],
+                    invalidate: Optional[Callable[[list[dict[str, Any]]], None]] = None
+    ) -> None:
+        """
+        运行直到父进程发出停止指令或退出
+        invalidate 处理父进程广播的缓存失效事件（推送本身分发给了其他分片）
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._report = report
+        self._invalidate = invalidate
+        threading.Thread(target=self._read, args=(on_push,), name="shard-inbox", daemon=True).start()
+        await self._stopped.wait()
+
+    def _read(self, on_push: Callable[[Any, Callable[[], bool]], Awaitable[Any]]) -> None:
+        loop = self._loop
+        while True:
+            try:
+                msg = self._inbox.get(timeout=self._idle_timeout)
+            except queue.Empty:
+                if os.getppid() == self._parent_pid:
+                    continue
+                msg = (_STOP,)
+            except (EOFError, OSError):
+                msg = (_STOP,)
+            if msg[0] == _PUSH:
+                # 分发队列满时在此阻塞，背压传回父进程；有请求在等待响应时不阻塞，否则读不到排在后面的响应
+                asyncio.run_coroutine_threadsafe(on_push(msg[1], self._awaiting), loop).result()
+                continue
+            loop.call_soon_threadsafe(self._on_message, msg)
+            if msg[0] == _STOP:
+                return
+
+    def _awaiting(self) -> bool:
+        return bool(self._futures)
+
+    def forward_log(self, item: dict[str, Any]) -> None:
+        """
+        子进程的日志记录交给父进程写入（由日志监听线程调用）
+        """
+        self._outbox.put((_LOG, item))
+
+    def _on_message(self, msg: tuple) -> None:
+        kind = msg[0]
+        if kind == _RSP:
+            _, req_id, result, error = msg
+            future = self._futures.get(req_id)
+            if future is None or future.done():
+                return
+            if error is None:
+                future.set_result(result)
+            elif error[0] == "TimeoutError":
+                future.set_exception(TimeoutError(error[1]))
+            else:
+                future.set_exception(RuntimeError(f"{error[0]}: {error[1]}"))
+        elif kind == _PING:
+            self._outbox.put((_PONG, self._report()))
+        elif kind == _INVALIDATE:
+            if self._invalidate is not None:
+                self._invalidate(msg[1])
+        elif kind == _STOP:
+            self._stopped.set()
+
+    async def send(self, cmd: Cmd | str, data: dict | Messenger, rsp: bool, timeout: float, priority: int) -> Optional[dict]:
+        cmd_value = cmd.value if isinstance(cmd, Cmd) else cmd
+        is_messenger = isinstance(data, Messenger)
+        payload = data.list if is_messenger else data
+        if not rsp:
+            self._outbox.put((_SEND, 0, cmd_value, payload, is_messenger, rsp, timeout, int(priority)))
+            return None
+        self._seq += 1
+        req_id = self._seq
+        future = self._loop.create_future()
+        self._futures[req_id] = future
+        try:
+            self._outbox.put((_SEND, req_id, cmd_value, payload, is_messenger, rsp, timeout, int(priority)))
+            # 父进程总会回复；截止时间只是兜底，防止父进程异常时处理器永远挂起
+            deadline = 2 * (timeout or self._default_timeout) + _RSP_GRACE
+            try:
+                return await asyncio.wait_for(future, deadline)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"No reply from the parent process within {deadline}s")
+        finally:
+            self._futures.pop(req_id, None)
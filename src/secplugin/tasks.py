@@ -0,0 +1,108 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+
+class HandlerTaskGroup:
+    """
+    处理器任务组：所有处理器任务都经由这里创建并持有引用
+    max_concurrency 限制同时运行的任务数，max_pending 限制已创建但未结束的任务总数，超出即拒绝
+    """
+    def __init__(self,
+                 max_concurrency: int = 4,
+                 max_pending: int = 1024,
+                 on_error: Optional[Callable[[str, BaseException], Any]] = None
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self._max_concurrency: int = max_concurrency
+        self._max_pending: int = max_pending
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self._on_error: Optional[Callable[[str, BaseException], Any]] = on_error
+        self.queued: int = 0
+        self.running: int = 0
+        self.rejected: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+
+    def get_max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    def set_max_concurrency(self, max_concurrency: int) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self._max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def spawn(self,
+              factory: Callable[[], Awaitable[Any]],
+              limiter: Optional[asyncio.Semaphore] = None,
+              name: Optional[str] = None
+    ) -> Optional[asyncio.Task]:
+        """
+        factory 在拿到执行名额后才被调用，被拒绝的任务不会创建协程；返回 None 表示已拒绝
+        """
+        if len(self._tasks) >= self._max_pending:
+            self.rejected += 1
+            return None
+        self.queued += 1
+        task = asyncio.create_task(self._run(factory, limiter, name or "handler"))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, factory: Callable[[], Awaitable[Any]], limiter: Optional[asyncio.Semaphore], name: str) -> None:
+        started = False
+        semaphore = self._semaphore
+        try:
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                async with semaphore:
+                    self.queued -= 1
+                    self.running += 1
+                    started = True
+                    try:
+                        await factory()
+                        self.completed += 1
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        self.failed += 1
+                        if self._on_error is not None:
+                            self._on_error(name, e)
+                    finally:
+                        self.running -= 1
+            finally:
+                if limiter is not None:
+                    limiter.release()
+        finally:
+            if not started:
+                self.queued -= 1
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待在途任务结束，超时后取消剩余任务；返回是否全部正常结束
+        """
+        if not self._tasks:
+            return True
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        return not pending
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "max_concurrency": self._max_concurrency,
+            "queued": self.queued,
+            "running": self.running,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from secplugin.cache import TTLCache
+
+
+def test_concurrent_loads_collapse():
+    async def main():
+        cache = TTLCache()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return ["admin"]
+
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(3)))
+        assert results == [["admin"]] * 3
+        assert len(calls) == 1
+        assert await cache.get_or_load("k", loader) == ["admin"]
+        assert cache.stats()["hits"] == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_loader_hands_over_to_waiter():
+    async def main():
+        cache = TTLCache()
+        started = asyncio.Event()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            started.set()
+            await asyncio.sleep(0.01)
+            return ["admin"]
+
+        leader = asyncio.create_task(cache.get_or_load("k", loader))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_load("k", loader)) for _ in range(2)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await asyncio.gather(*waiters) == [["admin"], ["admin"]]
+        assert len(calls) == 2
+        assert cache.get("k") == ["admin"]
+
+    asyncio.run(main())
+
+
+def test_loader_error_reaches_waiters_and_is_not_cached():
+    async def main():
+        cache = TTLCache()
+
+        async def loader():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert cache.get("k") is None
+
+    asyncio.run(main())
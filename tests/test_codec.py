@@ -0,0 +1,57 @@
+import pytest
+
+from secplugin.codec import JsonCodec, MsgpackCodec, MsgspecCodec, OrjsonCodec, get_codec, msgpack, msgspec, orjson
+from secplugin.msg import Msg
+
+FRAME = {
+    "cmd": "PushOicqMsg",
+    "seq": 7,
+    "data": [{Msg.Account: "10000"}, {Msg.Group: "Group", Msg.GroupId: "100000"}, {Msg.Text: "你好 \\n \"x\""}],
+}
+
+TEXT_CODECS = [
+    JsonCodec,
+    pytest.param(OrjsonCodec, marks=pytest.mark.skipif(orjson is None, reason="orjson not installed")),
+    pytest.param(MsgspecCodec, marks=pytest.mark.skipif(msgspec is None, reason="msgspec not installed")),
+]
+
+
+def test_default_codec_is_stdlib():
+    assert type(get_codec()) is JsonCodec
+    assert isinstance(get_codec("auto"), JsonCodec)
+    with pytest.raises(ValueError):
+        get_codec("yaml")
+
+
+@pytest.mark.parametrize("codec_type", TEXT_CODECS)
+def test_round_trip(codec_type):
+    codec = codec_type()
+    assert codec.loads(codec.dumps(FRAME)) == FRAME
+    assert codec.loads(codec.dumps_text(FRAME)) == FRAME
+
+
+@pytest.mark.parametrize("codec_type", TEXT_CODECS)
+def test_matches_stdlib_on_unsupported_values(codec_type):
+    codec, stdlib = codec_type(), JsonCodec()
+    for obj in ({1: "a"}, {"n": 2 ** 70}):
+        assert codec.loads(codec.dumps(obj)) == stdlib.loads(stdlib.dumps(obj))
+        assert codec.dumps_text(obj) == stdlib.dumps_text(obj)
+
+
+@pytest.mark.parametrize("codec_type", TEXT_CODECS)
+def test_invalid_frame_raises_value_error(codec_type):
+    with pytest.raises(ValueError):
+        codec_type().loads(b"{not json")
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack not installed")
+def test_msgpack_round_trip_and_json_frames():
+    codec = MsgpackCodec()
+    encoded = codec.dumps(FRAME)
+    assert isinstance(encoded, bytes) and encoded[:1] != b"{"
+    assert codec.loads(encoded) == FRAME
+    # 协商前的 JSON 帧同样能解析
+    assert codec.loads(JsonCodec().dumps(FRAME)) == FRAME
+    assert codec.loads(JsonCodec().dumps_text(FRAME)) == FRAME
+    with pytest.raises(ValueError):
+        codec.loads(b"\xc1")
@@ -0,0 +1,56 @@
+from secplugin import Messenger, Msg
+
+
+def _messenger() -> Messenger:
+    return Messenger().add_msg(Msg.Account, "10000").add_msg(Msg.Friend).add_msg(Msg.Uin, "20000")
+
+
+def test_shared_segment_deleted_by_copy():
+    a = _messenger()
+    assert a.get_msg(Msg.Uin) == "20000"
+    b = Messenger(a)
+    b.del_msg(Msg.Uin)
+    assert a.get_msg(Msg.Uin) == "0"
+    assert a.get_list(Msg.Uin) == []
+    assert not a.has_msg(Msg.Uin)
+    assert a.size(Msg.Uin) == 0
+
+
+def test_segment_popped_in_place():
+    m = _messenger()
+    assert m.get_list(Msg.Account) == ["10000"]
+    m.get_list()[0].pop(Msg.Account)
+    assert m.get_msg(Msg.Account) == "0"
+    assert m.get_list(Msg.Account) == []
+    assert not m.has_msg(Msg.Account)
+
+
+def test_index_rebuilt_after_miss():
+    m = _messenger().add_msg(Msg.Text, "a").add_msg(Msg.Text, "b")
+    assert m.get_msg(Msg.Text) == "ab"
+    m.get_list()[-1].pop(Msg.Text)
+    assert m.get_msg(Msg.Text) == "a"
+    m.add_msg(Msg.Text, "c")
+    assert m.get_list(Msg.Text) == ["a", "c"]
+
+
+def test_tag_added_through_shared_segment():
+    a = Messenger([{Msg.Text: "a"}, {Msg.Uin: "1"}])
+    assert a.get_msg(Msg.Uin) == "1"
+    Messenger(a).add_msg(Msg.Uin, "2")
+    assert a.list == [{Msg.Text: "a", Msg.Uin: "2"}, {Msg.Uin: "1"}]
+    assert a.get_list(Msg.Uin) == ["2", "1"]
+    assert a.get_msg(Msg.Uin) == "21"
+    assert a.size(Msg.Uin) == 2
+
+
+def test_tag_added_in_place():
+    m = Messenger([{Msg.Text: "a"}, {Msg.Text: "b"}])
+    assert m.get_msg(Msg.Uin) == "0"
+    assert m.get_list(Msg.Text) == ["a", "b"]
+    segments = m.get_list()
+    segments[1][Msg.Uin] = "3"
+    assert m.get_list(Msg.Uin) == ["3"]
+    segments[0][Msg.Uin] = "4"
+    assert m.get_msg(Msg.Uin) == "43"
+    assert m.has_msg(Msg.Uin)
@@ -0,0 +1,45 @@
+from secplugin.msg import Msg, TAG_CODES, TAGS, tag_code
+
+
+# msgpack 编码中 tag 的编号即在此表中的下标：只能在末尾追加，不能插入、删除或调整顺序
+PINNED_TAGS = (
+    "AtAll", "AtUin", "AtName", "Id", "Ok", "No", "Op", "OpUid", "All", "Get", "Gif", "Img", "Ptt",
+    "Uid", "Uin", "Url", "Xml", "Code", "Info", "Json", "Text", "Temp", "Time", "Type", "Emoid",
+    "Flash", "MsgId", "Reply", "Title", "Value", "Audio", "Video", "Width", "Bubble", "Height",
+    "Notice", "People", "Refresh", "UinName", "UinNick", "Typeface", "Withdraw", "OpName", "OpNick",
+    "Agree", "Refuse", "Ignore", "Account", "Open", "Close", "MD5", "Size", "Offset", "Add",
+    "Remove", "Seq", "Cmd", "Dat", "ProgressPush", "PokeID", "PokeIDSub", "PokeMsg", "PokeSize",
+    "Dice", "WindowJitter", "FlashWord", "FingerGuess", "HeadPortrait", "AppId", "Emoy", "Emoq",
+    "EmoReply", "RedPacket", "TransferMoney", "GrayTip", "SecSession", "InstantAction", "SelfTouch",
+    "Ark", "Embed", "Markdown", "Keyboard", "File", "Unknown", "Permission", "BlackList", "Profile",
+    "Skey", "Age", "Gender", "Nick", "Name", "JoinTime", "LastSpeakTime", "Level", "Location",
+    "System", "Online", "Goline", "GolineRetry", "Offline", "Heartbeat", "OntimeTask", "GolineMode",
+    "CallbackMode", "Mail", "Qzone", "Debug", "CacheNewFile", "Unauthorized", "WebScanCodeLogin",
+    "MultiMsg", "MultiMsgGet", "MultiMsgPut", "Friend", "FriendListDisable", "FriendListGet",
+    "FriendBeatABeat", "FriendMsgCacheGet", "FriendNotify", "Group", "Owner", "GroupId",
+    "GroupName", "GroupListDisable", "GroupListGet", "GroupListGetName", "GroupMemberListGet",
+    "GroupMemberListGetAdmin", "GroupMemberListGetInactive", "GroupMemberListGetProhibit",
+    "GroupMemberListGetInfo", "GroupMemberJoin", "GroupMemberExit", "GroupMemberNickModify",
+    "GroupMemberInvitation", "GroupModifyAdmin", "GroupModifySpecialTitle", "GroupNotify",
+    "GroupProhibit", "GroupMsgCacheGet", "GroupMsgAnonymous", "GroupAnonymous", "GroupMusic",
+    "GroupBeatABeat", "GroupEssence", "GroupDissolut", "GroupClockin", "GroupFile",
+    "GroupFileListGet", "GroupFileUpload", "GroupFileCreate", "GroupFileRemove",
+    "GroupFileRemoveFolder", "GroupFileMove", "GroupFileRename", "Guild", "TinyId", "GuildId",
+    "GuildCode", "ChannelId", "GuildType", "GuildName", "ChannelName", "GuildMsgCacheGet",
+    "GuildMemberExit", "GuildEssence", "FavoriteCard", "FavoriteCardListGet", "UserInfoGet",
+    "UserInfoModify", "UserJoinGroup", "UserExitGroup", "UserAddFriend", "UserDelFriend",
+    "CustomJson", "JSON_KG", "JSON_WY", "JSON_QQ", "JSON_KW", "JSON_JSHU", "JSON_BAIDU", "JSON_YK",
+    "JSON_IQY", "JSON_BD", "JSON_BL", "JSON_KS", "JSON_MG", "JSON_QQLLQ", "JSON_QQKJ", "JSON_5SING",
+    "PrintR", "PrintG", "PrintB", "PrintY", "PrintW",
+)
+
+
+def test_tag_codes_are_pinned():
+    assert TAGS[:len(PINNED_TAGS)] == PINNED_TAGS
+    assert all(TAG_CODES[tag] == code for code, tag in enumerate(PINNED_TAGS))
+
+
+def test_non_tag_constants_have_no_code():
+    assert tag_code(Msg.GM_PA) is None
+    assert tag_code(Msg.CM_WS) is None
+    assert tag_code(Msg.Text) == TAG_CODES[Msg.Text]
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from secplugin.pipeline import Backpressure, DispatchQueue
+
+
+def test_block_keeps_order_and_joins():
+    async def main():
+        queue = DispatchQueue(2, Backpressure.Block)
+        got = []
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                got.append(item)
+                queue.task_done()
+
+        for i in range(3):
+            assert await queue.put(i, lambda: True)
+        assert queue.stats()["overflow"] == 1
+        task = asyncio.create_task(worker())
+        await asyncio.wait_for(queue.join(), 1)
+        task.cancel()
+        assert got == [0, 1, 2]
+        assert queue.qsize() == 0
+
+    asyncio.run(main())
+
+
+def test_block_waits_when_nothing_is_awaited():
+    async def main():
+        queue = DispatchQueue(1, Backpressure.Block)
+        await queue.put(0)
+        await queue.put(1)
+        blocked = asyncio.create_task(queue.put(2))
+        await asyncio.sleep(0.1)
+        assert not blocked.done()
+        assert await queue.get() == 0
+        assert await asyncio.wait_for(blocked, 1)
+        assert [await queue.get(), await queue.get()] == [1, 2]
+
+    asyncio.run(main())
+
+
+def test_block_reader_reaches_response_behind_pushes():
+    # 处理器等待的响应排在多条推送之后：读循环不能卡在 put 上
+    async def main():
+        queue = DispatchQueue(1, Backpressure.Block)
+        response = asyncio.get_running_loop().create_future()
+        pending = {1: response}
+        frames = [("push", 0), ("push", 1), ("push", 2), ("push", 3), ("rsp", 1)]
+
+        async def worker():
+            while True:
+                await queue.get()
+                if not response.done():
+                    await response
+                queue.task_done()
+
+        async def reader():
+            for kind, value in frames:
+                if kind == "rsp":
+                    pending.pop(value).set_result(True)
+                else:
+                    await queue.put(value, lambda: bool(pending))
+
+        task = asyncio.create_task(worker())
+        await asyncio.wait_for(reader(), 1)
+        await asyncio.wait_for(queue.join(), 1)
+        task.cancel()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("policy, kept, counter", [
+    (Backpressure.Shed, [0, 1], "shed"),
+    (Backpressure.DropOldest, [1, 2], "dropped"),
+])
+def test_lossy_policies(policy, kept, counter):
+    async def main():
+        queue = DispatchQueue(2, policy)
+        results = [await queue.put(i) for i in range(3)]
+        assert results == [True, True, policy is not Backpressure.Shed]
+        assert [await queue.get(), await queue.get()] == kept
+        assert queue.stats()[counter] == 1
+
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from secplugin import Msg, Plugin
+from secplugin.dispatcher import HandlerEntry
+from secplugin.routing import RoutingInfo
+
+
+def _group(group_id: str, text: str) -> list[dict]:
+    return [{Msg.Account: "10000"}, {Msg.Group: "Group", Msg.GroupId: group_id}, {Msg.Uin: "20000"}, {Msg.Text: text}]
+
+
+def _friend(text: str) -> list[dict]:
+    return [{Msg.Account: "10000"}, {Msg.Friend: "Friend"}, {Msg.Uin: "20000"}, {Msg.Text: text}]
+
+
+def test_routing_info_fields():
+    route = RoutingInfo(_group("100", "hi"))
+    assert (route.text, route.msg_type, route.group_id) == ("hi", Msg.Group, "100")
+    route = RoutingInfo(_friend("hi"))
+    assert (route.msg_type, route.group_id) == (Msg.Friend, None)
+    assert RoutingInfo([{Msg.Account: "1"}]).text == "0"
+
+
+def test_entry_filters():
+    entry = HandlerEntry(lambda: None, 0, msg_type=Msg.Group, group=[100, "200"])
+    assert entry.accepts(RoutingInfo(_group("100", "x")))
+    assert entry.accepts(RoutingInfo(_group("200", "x")))
+    assert not entry.accepts(RoutingInfo(_group("300", "x")))
+    assert not entry.accepts(RoutingInfo(_friend("x")))
+    assert HandlerEntry(lambda: None, 0).accepts(RoutingInfo(_friend("x")))
+    with pytest.raises(ValueError):
+        HandlerEntry(lambda: None, 0, msg_type="Channel")
+
+
+def test_plugin_selects_handlers_by_route():
+    plugin = Plugin("ws://127.0.0.1:1", reload=False, log_path=os.devnull)
+
+    @plugin.on_msg(r"ping.*")
+    async def anywhere(m, g):
+        pass
+
+    @plugin.on_msg(r"ping (\d+)", msg_type=Msg.Group, group="100")
+    async def group_only(m, g):
+        pass
+
+    @plugin.on_msg(msg_type=[Msg.Friend, Msg.Temp])
+    async def private(m):
+        pass
+
+    def select(data):
+        route = RoutingInfo(data)
+        entries, matched = plugin._select(route, plugin._match(route.text))
+        return sorted(e.func.__name__ for e in entries), sorted(e.func.__name__ for e, _ in matched)
+
+    assert select(_group("100", "ping 1")) == ([], ["anywhere", "group_only"])
+    assert select(_group("200", "ping 1")) == ([], ["anywhere"])
+    assert select(_friend("ping 1")) == (["private"], ["anywhere"])